@@ -1,6 +1,11 @@
 import pandas as pd
 from pathlib import Path
 import argparse
+from src.loader import load_table
+
+# Prediction columns used below; only these are read from a CSV or Parquet output
+PRED_COLUMNS = ['product_id', 'product_name', 'is_pv_module', 'Reasoning', 'Confidence', 'power_watts',
+                'total_power_watts', 'classified_by', 'cascade_stage']
 
 
 def calculate_metrics(y_true, y_pred):
@@ -32,9 +37,28 @@ def calculate_metrics(y_true, y_pred):
     }
 
 
+def print_source_breakdown(merged, column='classified_by', title='METRICS PER CLASSIFIER'):
+    """Metrics per classifier (e.g. the rule-based fast path on its own) or per cascade stage"""
+    print(f"""
+╔══════════════════════════════════════════════════════════════╗
+║{title:^62}║
+╠══════════════════════════════════════════════════════════════╣""")
+    for source, group in merged.groupby(merged[column].astype('string').fillna('unknown')):
+        m = calculate_metrics(group['truth_val'].tolist(), group['pred_val'].tolist())
+        share = len(group) / len(merged) * 100
+        lines = [
+            f"  {str(source)[:24]:<24} {len(group):>6} rows ({share:5.1f}%)",
+            f"  ├─ Accuracy:  {m['accuracy']*100:6.2f}%   Precision: {m['precision']*100:6.2f}%",
+            f"  └─ Recall:    {m['recall']*100:6.2f}%   Errors:    {m['false_positives'] + m['false_negatives']}",
+        ]
+        for line in lines:
+            print(f"║{line:<62}║")
+    print("╚══════════════════════════════════════════════════════════════╝")
+
+
 def evaluate():
     parser = argparse.ArgumentParser(description='Evaluate PV module classification results')
-    parser.add_argument('--pred', type=str, default='data/output.csv', help='Predictions CSV file')
+    parser.add_argument('--pred', type=str, default='data/output.csv', help='Predictions file (CSV or Parquet)')
     parser.add_argument('--truth', type=str, default='data/Testdaten Mit Loesung CSV.csv', help='Ground truth CSV file')
     parser.add_argument('--save-errors', type=str, default='data/evaluation_errors.csv', help='Save errors to file')
     args = parser.parse_args()
@@ -46,23 +70,15 @@ def evaluate():
     
     # Load Predictions
     try:
-        df_pred = pd.read_csv(pred_file, sep=';', dtype={'product_id': str})
+        df_pred = load_table(pred_file, usecols=PRED_COLUMNS, required=['product_id', 'is_pv_module'])
     except Exception as e:
         print(f"❌ Error loading predictions: {e}")
         return
 
     # Load Ground Truth
     try:
-        with open(truth_file, 'r', encoding='utf-8', errors='ignore') as f:
-            first_line = f.readline().strip()
-        skip = 1 if "Tabelle" in first_line else 0
-        
-        df_truth = pd.read_csv(truth_file, sep=None, engine='python', skiprows=skip, dtype={'product_id': str})
-        
-        # Apply ID Logic
-        if "service_id" in df_truth.columns and "product_id" in df_truth.columns:
-            df_truth["product_id"] = df_truth["product_id"].fillna(df_truth["service_id"])
-            df_truth["product_id"] = df_truth["product_id"].astype(str).str.replace(r'\.0$', '', regex=True)
+        # Only the ID columns and the label are parsed
+        df_truth = load_table(truth_file, usecols=['product_id', 'is_pv_module'], required=['product_id', 'is_pv_module'])
 
     except Exception as e:
         print(f"❌ Error loading truth: {e}")
@@ -109,6 +125,12 @@ def evaluate():
 ║  └─ Actual PV:       {merged['truth_val'].sum():<39} ║
 ╚══════════════════════════════════════════════════════════════╝""")
     
+    if 'classified_by' in merged.columns:
+        print_source_breakdown(merged)
+    if 'cascade_stage' in merged.columns and merged['cascade_stage'].notna().any():
+        stages = 'Stufe ' + merged['cascade_stage'].astype('Int64').astype('string')
+        print_source_breakdown(merged.assign(stage=stages), column='stage', title='METRICS PER CASCADE STAGE')
+    
     # Show errors
     diffs = merged[merged['pred_val'] != merged['truth_val']]
     
@@ -116,7 +138,7 @@ def evaluate():
         print(f"\n⚠️  Found {len(diffs)} Discrepancies:\n")
         for i, row in diffs.iterrows():
             print(f"🛑 ID: {row['product_id']}")
-            print(f"   Name:     {row.get('product_name', row.get('supply_product_name', 'N/A'))[:60]}...")
+            print(f"   Name:     {str(row.get('product_name', row.get('supply_product_name', 'N/A')))[:60]}...")
             print(f"   Pred:     {'PV Module' if row['pred_val'] == 1 else 'Not PV Module'} ({row['pred_val']})")
             print(f"   Truth:    {'PV Module' if row['truth_val'] == 1 else 'Not PV Module'} ({row['truth_val']})")
             if 'Reasoning' in row:
@@ -1,254 +1,125 @@
-import os
-import sys
-import time
 import argparse
-from pathlib import Path
 from dotenv import load_dotenv
-from src.processor import CSVProcessor
-from src.llm_client import LLMClient
-import pandas as pd
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from threading import Lock
+from src.pipeline import PipelineConfig, PipelineError, JOURNAL_DEFAULT, run_pipeline, load_ground_truth, score_predictions, truth_path
+from src.cascade import DEFAULT_THRESHOLD
+from src.loader import output_paths
+from src.similarity import DEFAULT_THRESHOLD as SIMILARITY_THRESHOLD
 
 # Load env vars
 load_dotenv()
 
 
-def process_single_batch(client: LLMClient, batch: list, batch_num: int, total: int, lock: Lock) -> tuple:
-    """Process a single batch and return results with batch number"""
-    try:
-        results = client.classify_batch(batch)
-        with lock:
-            print(f"   ✓ Batch {batch_num}/{total} fertig ({len(results)} Ergebnisse)")
-        return batch_num, results, None
-    except Exception as e:
-        with lock:
-            print(f"   ❌ Fehler in Batch {batch_num}: {e}")
-        return batch_num, [], str(e)
-
-
 def main():
     parser = argparse.ArgumentParser(description='LLM-basierte PV-Modul Klassifizierung')
     parser.add_argument('--batch-size', type=int, default=10, help='Anzahl Produkte pro Batch (default: 10)')
     parser.add_argument('--parallel', type=int, default=1, help='Anzahl paralleler Workers (default: 1, max empfohlen: 5)')
     parser.add_argument('--provider', type=str, default='openai', choices=['openai', 'zhipuai'], help='LLM Provider (openai oder zhipuai)')
     parser.add_argument('--model', type=str, default='gpt-4o-mini', help='Model Name (z.B. gpt-4o-mini oder glm-4-plus)')
+    parser.add_argument('--base-url', type=str, default=None, help='OpenAI-kompatibler Endpoint statt des Providers, z.B. der lokale Mock-Server: http://127.0.0.1:8089/v1 (python -m src.mock_server)')
     parser.add_argument('--input', type=str, default='data/Testdaten ohne Loesung - mit head spalte.csv', help='Input CSV Datei')
-    parser.add_argument('--output', type=str, default='data/output.csv', help='Output CSV Datei')
+    parser.add_argument('--output', type=str, default='data/output.csv', help='Output Datei')
+    parser.add_argument('--output-format', type=str, default='csv', choices=['csv', 'parquet', 'both'], help='Format des Outputs: csv (sep=;), parquet (typisierte Spalten, braucht pyarrow) oder beides; die Endung von --output wird angepasst')
     parser.add_argument('--limit', type=int, default=None, help='Max. Anzahl Zeilen zum Verarbeiten (für Tests)')
     parser.add_argument('--test-file', type=str, default=None, help='Ground Truth CSV Datei (Standard: Input Datei wenn is_pv_module vorhanden)')
+    parser.add_argument('--dedup', action='store_true', help='Identische Produkte (gleiche Namen/Beschreibungen/Hersteller/EAN) nur einmal klassifizieren')
+    parser.add_argument('--fast-path', action='store_true', help='Eindeutige Zeilen (Dienstleistungen, Zubehör, Module mit Wp, kein PV-Bezug) regelbasiert ohne LLM klassifizieren')
+    parser.add_argument('--similar-from', type=str, default=None, help='Bereits klassifizierte Output-CSVs (kommasepariert) als Ähnlichkeits-Index: fast identische Produktnamen übernehmen das Label, Leistung wird lokal extrahiert')
+    parser.add_argument('--similarity-threshold', type=float, default=SIMILARITY_THRESHOLD, help=f'Min. Kosinus-Ähnlichkeit für --similar-from (default: {SIMILARITY_THRESHOLD}, siehe scripts/similarity_agreement.py)')
+    parser.add_argument('--cache', type=str, default=None, help='SQLite Ergebnis-Cache (z.B. data/cache.sqlite). Bereits klassifizierte Produkte werden nicht erneut gesendet')
+    parser.add_argument('--cache-max-entries', type=int, default=None, help='Max. Einträge im Cache (älteste zuletzt genutzte werden entfernt)')
+    parser.add_argument('--cache-max-age-days', type=float, default=None, help='Max. Alter von Cache-Einträgen in Tagen')
+    parser.add_argument('--rpm', type=int, default=None, help='Requests pro Minute (Standard: RATE_LIMITS des Modells)')
+    parser.add_argument('--tpm', type=int, default=None, help='Tokens pro Minute (Standard: RATE_LIMITS des Modells)')
+    parser.add_argument('--on-failure', type=str, default='drop', choices=['drop', 'bisect'], help='Fehlgeschlagene Batches verwerfen (drop) oder halbieren bis zur fehlerhaften Zeile (bisect)')
+    parser.add_argument('--shape-input', action='store_true', help='Prompt-Input verkleinern: Spalten-Allowlist, HTML zu Text, Duplikate entfernen, lange Felder kürzen')
+    parser.add_argument('--shape-columns', type=str, default=None, help='Komma-getrennte Spalten-Allowlist für --shape-input (Standard: src/shaping.py DEFAULT_COLUMNS)')
+    parser.add_argument('--shape-max-chars', type=int, default=300, help='Max. Zeichen pro Feld für --shape-input (default: 300)')
+    parser.add_argument('--output-schema', type=str, default='full', choices=['full', 'compact'], help='Antwortformat: full (product_id, Name, Begründung) oder compact (Zeilen-Nummern, nur Label/Confidence/Leistung)')
+    parser.add_argument('--reasoning', action='store_true', help='Bei --output-schema compact trotzdem eine kurze Begründung anfordern')
+    parser.add_argument('--stream', action='store_true', help='Antworten streamen: Ergebnisse inkrementell parsen, bei abgeschnittenen Antworten fertige Zeilen behalten und nur den Rest erneut anfragen')
+    parser.add_argument('--few-shot', action='store_true', help='Statische Beispiele nach dem System-Prompt mitsenden (verlängert den cachebaren Prompt-Prefix über 1024 Tokens)')
+    parser.add_argument('--power-extraction', type=str, default='llm', choices=['llm', 'local', 'check'], help='Leistung/Menge: llm (Modell extrahiert), local (Modell liefert nur Label, Leistung regex-basiert via src/power.py) oder check (LLM-Werte lokal gegenprüfen)')
+    parser.add_argument('--engine', type=str, default='threads', choices=['threads', 'async'], help='Ausführung: threads (ThreadPool) oder async (asyncio, --parallel = max. gleichzeitige Requests)')
+    parser.add_argument('--pool-size', type=int, default=None, help='Max. HTTP-Verbindungen im gemeinsamen Pool (Standard: aus --parallel abgeleitet)')
+    parser.add_argument('--http2', action='store_true', help='HTTP/2 verwenden (benötigt httpx[http2])')
+    parser.add_argument('--connect-timeout', type=float, default=10.0, help='Timeout für Verbindungsaufbau in Sekunden (default: 10)')
+    parser.add_argument('--read-timeout', type=float, default=1200.0, help='Timeout für die Antwort in Sekunden (default: 1200, GPT-5 Reasoning)')
+    parser.add_argument('--hedge-percentile', type=float, default=None, help='Hedging: läuft ein Request länger als dieses Latenz-Perzentil (z.B. 95), wird ein Duplikat gesendet und das schnellere Ergebnis genommen')
+    parser.add_argument('--metrics', type=str, default=None, help='Telemetrie-Export: schreibt <Pfad>.json (p50/p95/p99) und <Pfad>.prom (Prometheus), z.B. data/metrics')
+    parser.add_argument('--journal', type=str, nargs='?', const=JOURNAL_DEFAULT, default=None, metavar='PFAD', help='Checkpoint-Journal (SQLite), jeder fertige Batch wird sofort gespeichert (ohne Pfad: <output>.journal.sqlite)')
+    parser.add_argument('--resume', action='store_true', help='Abgebrochenen Lauf fortsetzen: Ergebnisse aus dem Journal übernehmen, nur fehlende product_ids verarbeiten')
+    parser.add_argument('--route', type=str, default=None, help='Mehrere Backends kombinieren, z.B. "openai:gpt-4o-mini,zhipuai:glm-4.5-air": Batches nach Latenz/Fehlerrate/Preis verteilen, bei Fehlern auf das nächste Backend ausweichen')
+    parser.add_argument('--route-cost-weight', type=float, default=1.0, help='Gewicht des Preises (USD pro 1M Tokens) gegenüber der Latenz (Sekunden) bei --route (default: 1.0)')
+    parser.add_argument('--cascade', type=str, default=None, help='Modell-Kaskade: stärkere Stufen als provider:model (kommasepariert), z.B. "openai:gpt-5.2". --model/--route ist die günstige erste Stufe; unsichere Zeilen werden eskaliert')
+    parser.add_argument('--cascade-threshold', type=float, default=DEFAULT_THRESHOLD, help=f'Zeilen mit Confidence unter diesem Wert (oder widersprüchlicher Leistung) an die nächste Stufe (default: {DEFAULT_THRESHOLD})')
+    parser.add_argument('--mode', type=str, default='sync', choices=['sync', 'batch-job', 'stream'], help='sync (Chat-Completions direkt), batch-job (asynchroner Batch-API Job: halber Preis, ohne Rate Limits, Ergebnis innerhalb 24h) oder stream (CSV in Chunks lesen, Output fortlaufend schreiben, konstanter Speicher)')
+    parser.add_argument('--chunk-size', type=int, default=5000, help='Für --mode stream: Zeilen pro gelesenem CSV-Chunk (default: 5000)')
+    parser.add_argument('--max-in-flight', type=int, default=None, help='Für --mode stream: max. gelesene, noch nicht geschriebene Batches (default: 2 × --parallel)')
+    parser.add_argument('--batch-backend', type=str, default='api', choices=['api', 'local'], help='Für --mode batch-job: api (Provider Batch-API) oder local (dateibasierter Offline-Ersatz mit Mock-Antworten)')
+    parser.add_argument('--batch-dir', type=str, default='data/batch_jobs', help='Verzeichnis für Request-Dateien und den Job-Status (state.json)')
+    parser.add_argument('--poll-interval', type=float, default=60.0, help='Sekunden zwischen Statusabfragen des Batch-Jobs (default: 60)')
     args = parser.parse_args()
 
-    print("🚀 Starte Solar-Modul Klassifizierung mit Leistungsextraktion")
-    print(f"   Model: {args.model}")
-    print(f"   Batch-Size: {args.batch_size}")
-    print(f"   Parallel Workers: {args.parallel}")
-    
-    # User provided files
-    input_file = args.input
-    output_file = args.output
-    # User provided files
-    input_file = args.input
-    output_file = args.output
-    
-    # Determined test file (Ground Truth)
-    # If a specific test file is not provided, we will check if the input file has ground truth later
-    test_file = args.test_file if args.test_file else None
-    
-    # Check API Key
-    if args.provider == 'openai' and not os.getenv("OPENAI_API_KEY"):
-        print("❌ OPENAI_API_KEY not found in .env. Please set it.")
-        return
-    elif args.provider == 'zhipuai' and not (os.getenv("ZHIPUAI_API_KEY") or os.getenv("ZAI_API_KEY")):
-        print("❌ ZHIPUAI_API_KEY (or ZAI_API_KEY) not found in .env. Please set it.")
-        return
-
-    # 1. Initialize Processor
-    processor = CSVProcessor(input_file, output_file)
+    config = PipelineConfig(**vars(args))
     try:
-        df_input = processor.load_csv()
-        if args.limit:
-            df_input = df_input.head(args.limit)
-            print(f"⚠️  Limitiert auf {args.limit} Zeilen (Test-Modus)")
-        print(f"✅ {len(df_input)} Produkte geladen aus {input_file}")
-    except Exception as e:
-        print(f"❌ Fehler beim Laden der CSV: {e}")
+        result = run_pipeline(config)
+    except PipelineError as e:
+        print(f"❌ {e}")
         return
-
-    # 2. Initialize Client
-    try:
-        client = LLMClient(provider=args.provider, model=args.model)
-    except Exception as e:
-        print(f"❌ Fehler beim Initialisieren des LLM Clients: {e}")
+    except KeyboardInterrupt:
+        if args.journal or args.resume:
+            print("\n⛔ Abgebrochen. Fertige Batches stehen im Journal, fortsetzen mit --resume")
+        else:
+            print("\n⛔ Abgebrochen. Mit --journal lassen sich abgebrochene Läufe fortsetzen")
         return
-
-    # 3. Process Batches
-    all_results = []
-    batches = list(processor.create_batches(df_input, batch_size=args.batch_size))
-    total_batches = len(batches)
-    
-    if total_batches == 0:
-        print("⚠️ Keine Batches zu verarbeiten.")
+    if result.batches == 0 and result.final_df is None:
         return
-
-    print(f"📦 Starte Verarbeitung von {total_batches} Batches...")
-    start_time = time.time()
-
-    if args.parallel > 1:
-        # Parallel processing
-        print(f"   ⚡ Parallele Verarbeitung mit {args.parallel} Workers")
-        lock = Lock()
-        results_dict = {}
-        
-        with ThreadPoolExecutor(max_workers=args.parallel) as executor:
-            futures = {
-                executor.submit(process_single_batch, client, batch, i+1, total_batches, lock): i
-                for i, batch in enumerate(batches)
-            }
-            
-            for future in as_completed(futures):
-                batch_num, results, error = future.result()
-                if results:
-                    results_dict[batch_num] = results
-        
-        # Combine results in order
-        for batch_num in sorted(results_dict.keys()):
-            for res in results_dict[batch_num]:
-                all_results.append(res.model_dump(by_alias=True))
-    else:
-        # Sequential processing
-        for i, batch in enumerate(batches, 1):
-            print(f"   Batch {i}/{total_batches}: {len(batch)} Produkte...")
-            try:
-                results = client.classify_batch(batch)
-                for res in results:
-                    all_results.append(res.model_dump(by_alias=True))
-                print(f"   ✓ Batch {i} fertig")
-            except Exception as e:
-                print(f"   ❌ Fehler in Batch {i}: {e}")
-    
-    elapsed_time = time.time() - start_time
-    print(f"⏱️  Verarbeitung abgeschlossen in {elapsed_time:.1f}s")
-            
-    # 4. Merge & Save Output
-    if all_results:
-        results_df = pd.DataFrame(all_results)
-        
-        # Ensure ID types match for merging
-        df_input['product_id'] = df_input['product_id'].astype(str)
-        results_df['product_id'] = results_df['product_id'].astype(str)
-        
-        # Columns to drop from input before merge (to avoid _x _y suffixes)
-        cols_to_drop = ['is_pv_module', 'Reasoning', 'Confidence', 'power_watts', 'quantity', 'total_power_watts', 'power_source']
-        df_input_clean = df_input.drop(columns=[c for c in cols_to_drop if c in df_input.columns])
-        
-        # Deduplicate results by product_id
-        result_cols = ['product_id', 'is_pv_module', 'Reasoning', 'Confidence', 'power_watts', 'quantity', 'total_power_watts', 'power_source']
-        available_cols = [c for c in result_cols if c in results_df.columns]
-        results_subset = results_df[available_cols].drop_duplicates(subset=['product_id'])
-        
-        final_df = pd.merge(df_input_clean, results_subset, on='product_id', how='left')
-        
-        # Convert boolean to 1/0 to match test data format
-        final_df['is_pv_module'] = final_df['is_pv_module'].apply(lambda x: 1 if x is True else 0 if x is False else None)
-
-        final_df.to_csv(output_file, index=False, sep=';')
-        print(f"💾 Ergebnisse gespeichert: {output_file}")
-        
-        # Power extraction summary
-        if 'power_watts' in final_df.columns and 'total_power_watts' in final_df.columns:
-            pv_modules = final_df[final_df['is_pv_module'] == 1]
-            total_power = pv_modules['total_power_watts'].sum()
-            modules_with_power = pv_modules['power_watts'].notna().sum()
-            
-            print(f"\n⚡ LEISTUNGSEXTRAKTION:")
-            print(f"   PV-Module klassifiziert:  {len(pv_modules)}")
-            print(f"   Davon mit Leistung:       {modules_with_power}")
-            print(f"   Gesamt-Leistung:          {total_power/1000:.2f} kWp")
-    else:
-        print("⚠️ Keine Ergebnisse zum Speichern.")
+    client, metrics, final_df = result.client, result.metrics, result.final_df
 
     # 5. Print API Usage Report
     print(client.get_usage_report())
+    if args.metrics:
+        metrics.write(args.metrics)
+        print(f"📈 Metriken gespeichert: {args.metrics}.json, {args.metrics}.prom")
 
     # 6. Evaluation
-    test_path = Path(test_file) if test_file else Path(input_file)
-    
-    # If using input file, check if it has the label column
-    if not test_file:
-         # Check if input df has ground truth
-         if 'is_pv_module' in df_input.columns:
-             print("\n📊 Nutze Input-Datei als Ground Truth für Evaluation...")
-         else:
-             print("\n⚠️ Keine Test-Datei angegeben und Input hat keine 'is_pv_module' Spalte. Skipping Evaluation.")
-             return
+    test_path = truth_path(config, result.df_input)
+    if test_path is None:
+        print("\n⚠️ Keine Test-Datei angegeben und Input hat keine 'is_pv_module' Spalte. Skipping Evaluation.")
+        return
+    if final_df is None and args.mode == 'stream':
+        # The output was never held in memory
+        print(f"\n📊 Evaluation des Streaming-Outputs: python evaluate.py --pred {output_paths(args.output, 'csv')[0]} --truth \"{test_path}\"")
+        return
+    if not args.test_file:
+        print("\n📊 Nutze Input-Datei als Ground Truth für Evaluation...")
 
-    if test_path.exists() and all_results:
+    if test_path.exists() and final_df is not None:
         print("\n📊 Starte Evaluation gegen Testdaten...")
         try:
-            # Load test file
-            with open(test_path, 'r', encoding='utf-8', errors='ignore') as f:
-                first_line = f.readline().strip()
-            skip_rows = 1 if "Tabelle" in first_line else 0
-            
-            test_df = pd.read_csv(test_path, skiprows=skip_rows, sep=None, engine='python')
-            
-            # Apply same ID logic to Test Data
-            if "service_id" in test_df.columns and "product_id" in test_df.columns:
-                test_df["product_id"] = test_df["product_id"].fillna(test_df["service_id"])
-                test_df["product_id"] = test_df["product_id"].astype(str).str.replace(r'\.0$', '', regex=True)
-            
-            # Ensure proper string types
-            test_df['product_id'] = test_df['product_id'].astype(str)
-            final_df['product_id'] = final_df['product_id'].astype(str)
-            
-            # Rename truth column
-            test_subset = test_df[['product_id', 'is_pv_module']].rename(columns={'is_pv_module': 'ground_truth'})
-            
-            merged_eval = pd.merge(final_df, test_subset, on='product_id', how='inner')
-            
-            if merged_eval.empty:
+            scores, merged_eval = score_predictions(final_df, load_ground_truth(test_path))
+
+            if not scores:
                 print("⚠️ Keine übereinstimmenden IDs zwischen Output und Testdaten gefunden.")
             else:
-                # Drop NaN
-                merged_eval = merged_eval.dropna(subset=['is_pv_module', 'ground_truth'])
-                
-                # Convert to int for comparison
-                merged_eval['pred'] = merged_eval['is_pv_module'].astype(int)
-                merged_eval['truth'] = merged_eval['ground_truth'].astype(int)
-                
-                # Calculate metrics
-                total = len(merged_eval)
-                correct = (merged_eval['pred'] == merged_eval['truth']).sum()
-                
-                tp = ((merged_eval['pred'] == 1) & (merged_eval['truth'] == 1)).sum()
-                fp = ((merged_eval['pred'] == 1) & (merged_eval['truth'] == 0)).sum()
-                fn = ((merged_eval['pred'] == 0) & (merged_eval['truth'] == 1)).sum()
-                tn = ((merged_eval['pred'] == 0) & (merged_eval['truth'] == 0)).sum()
-                
-                accuracy = correct / total * 100 if total > 0 else 0
-                precision = tp / (tp + fp) * 100 if (tp + fp) > 0 else 0
-                recall = tp / (tp + fn) * 100 if (tp + fn) > 0 else 0
-                f1 = 2 * (precision * recall) / (precision + recall) if (precision + recall) > 0 else 0
-                
                 print(f"""
 ╔══════════════════════════════════════════════════════════════╗
 ║                    EVALUATION RESULTS                        ║
 ╠══════════════════════════════════════════════════════════════╣
-║  Total Samples:      {total:<39} ║
-║  Correct:            {correct:<39} ║
+║  Total Samples:      {scores['total']:<39} ║
+║  Correct:            {scores['correct']:<39} ║
 ╠══════════════════════════════════════════════════════════════╣
 ║  METRICS                                                     ║
-║  ├─ Accuracy:        {accuracy:.2f}%{'':<34} ║
-║  ├─ Precision:       {precision:.2f}%{'':<34} ║
-║  ├─ Recall:          {recall:.2f}%{'':<34} ║
-║  └─ F1 Score:        {f1:.2f}%{'':<34} ║
+║  ├─ Accuracy:        {scores['accuracy']:.2f}%{'':<34} ║
+║  ├─ Precision:       {scores['precision']:.2f}%{'':<34} ║
+║  ├─ Recall:          {scores['recall']:.2f}%{'':<34} ║
+║  └─ F1 Score:        {scores['f1']:.2f}%{'':<34} ║
 ╠══════════════════════════════════════════════════════════════╣
 ║  CONFUSION MATRIX                                            ║
-║  ├─ True Positives:  {tp:<39} ║
-║  ├─ False Positives: {fp:<39} ║
-║  ├─ False Negatives: {fn:<39} ║
-║  └─ True Negatives:  {tn:<39} ║
+║  ├─ True Positives:  {scores['tp']:<39} ║
+║  ├─ False Positives: {scores['fp']:<39} ║
+║  ├─ False Negatives: {scores['fn']:<39} ║
+║  └─ True Negatives:  {scores['tn']:<39} ║
 ╚══════════════════════════════════════════════════════════════╝""")
                 
                 # Show errors
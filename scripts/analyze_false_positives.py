@@ -1,5 +1,11 @@
+import os
+import sys
 import pandas as pd
 
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from src.loader import load_table
+
+# CSV or Parquet (main.py --output-format parquet)
 PRED_FILE = "data/output_eval_1k_v3.csv"
 TRUTH_FILE = "data/subset_1k.csv"
 
@@ -7,8 +13,8 @@ def main():
     print("🔍 Analyzing False Positives...")
     
     try:
-        pred_df = pd.read_csv(PRED_FILE, sep=';')
-        truth_df = pd.read_csv(TRUTH_FILE)
+        pred_df = load_table(PRED_FILE, usecols=['product_id', 'is_pv_module', 'Reasoning'])
+        truth_df = load_table(TRUTH_FILE, usecols=['product_id', 'is_pv_module', 'product_text'])
     except Exception as e:
         print(f"❌ Error loading files: {e}")
         return
@@ -0,0 +1,95 @@
+"""
+CSV Loader Benchmark
+====================
+Times the old ingestion (sep=None, Python engine, header read twice) against
+src/loader.py (sniffed layout, C engine, ID dtypes) and, if installed, the
+pyarrow engine - once for the full export and once for the ground-truth
+columns only (usecols). Missing subsets are generated from the labelled test
+file by repeating its rows.
+
+    python scripts/benchmark_csv_loader.py
+    python scripts/benchmark_csv_loader.py --files data/subset_1k.csv,data/subset_10k.csv --repeats 5
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from src.loader import load_table, normalize, pyarrow_available
+
+SOURCE_FILE = "data/Testdaten Mit Loesung CSV.csv"
+
+
+def legacy_load(path, usecols=None):
+    """Ingestion as it was before src/loader.py"""
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        first_line = f.readline().strip()
+    skip_rows = 1 if "Tabelle" in first_line else 0
+    df = normalize(pd.read_csv(path, skiprows=skip_rows, sep=None, engine='python'))
+    return df[usecols] if usecols else df
+
+
+def synthesize(rows: int, directory: str) -> str:
+    base = legacy_load(SOURCE_FILE)
+    df = pd.concat([base] * (rows // len(base) + 1), ignore_index=True).head(rows)
+    df['product_id'] = [f"S{i}" for i in range(rows)]
+    path = os.path.join(directory, f"synthetic_{rows}.csv")
+    df.to_csv(path, index=False, sep=';')
+    return path
+
+
+def timed(fn, repeats: int) -> float:
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark: alter CSV-Import vs. src/loader.py')
+    parser.add_argument('--files', type=str, default='data/subset_1k.csv,data/subset_10k.csv', help='Komma-getrennte CSV-Dateien')
+    parser.add_argument('--repeats', type=int, default=3, help='Wiederholungen pro Messung (Median)')
+    args = parser.parse_args()
+
+    truth_cols = ['product_id', 'is_pv_module']
+    with tempfile.TemporaryDirectory() as tmp:
+        files = []
+        for path in args.files.split(','):
+            path = path.strip()
+            if not os.path.exists(path):
+                digits = ''.join(ch for ch in os.path.basename(path) if ch.isdigit())
+                rows = int(digits) * (1000 if 'k' in os.path.basename(path).lower() else 1) if digits else 1000
+                print(f"⚠️  {path} fehlt, nutze synthetische Datei mit {rows} Zeilen aus {SOURCE_FILE}")
+                path = synthesize(rows, tmp)
+            files.append(path)
+
+        print(f"\n{'Datei':<32} | {'Zeilen':>7} | {'Variante':<22} | {'Zeit (s)':>8} | {'Speedup':>7}")
+        print("-" * 90)
+        for path in files:
+            rows = len(load_table(path))
+            variants = [
+                ("alt (python, alle)", lambda: legacy_load(path)),
+                ("loader C (alle)", lambda: load_table(path)),
+                ("alt (python, truth)", lambda: legacy_load(path, truth_cols)),
+                ("loader C (usecols)", lambda: load_table(path, usecols=truth_cols)),
+            ]
+            if pyarrow_available():
+                variants.append(("loader pyarrow (alle)", lambda: load_table(path, engine='pyarrow')))
+            baseline = None
+            for name, fn in variants:
+                seconds = timed(fn, args.repeats)
+                if name.startswith("alt"):
+                    baseline = seconds
+                print(f"{os.path.basename(path)[:32]:<32} | {rows:>7} | {name:<22} | {seconds:>8.3f} | "
+                      f"{baseline / seconds if seconds else 0:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
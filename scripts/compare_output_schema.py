@@ -0,0 +1,132 @@
+"""
+Output Schema Comparison: full vs compact
+=========================================
+Measures completion tokens and latency of the full response schema
+(echoed product_id/product_name/Reasoning) against --output-schema compact.
+
+Live (calls the API for both schemas on the same rows):
+    python scripts/compare_output_schema.py --provider openai --model gpt-4o-mini --limit 200 --batch-size 50
+
+Offline (estimates completion tokens from an already classified output file):
+    python scripts/compare_output_schema.py --offline data/output_eval_1k_zai.csv
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.processor import CSVProcessor
+from src.llm_client import LLMClient
+from src.loader import load_table
+
+try:
+    import tiktoken
+    _ENCODER = tiktoken.get_encoding("o200k_base")
+except ImportError:
+    _ENCODER = None
+
+
+def count_tokens(text: str) -> int:
+    """Exact with tiktoken, else the usual ~4 chars per token estimate"""
+    if _ENCODER is not None:
+        return len(_ENCODER.encode(text))
+    return len(text) // 4
+
+
+def _value(row, col):
+    value = row.get(col)
+    return None if pd.isnull(value) else value
+
+
+def offline_estimate(path: str, batch_size: int):
+    df = load_table(path)
+    df = df.dropna(subset=['is_pv_module'])
+    print(f"📖 {len(df)} klassifizierte Zeilen aus {path}")
+
+    totals = {"full": 0, "compact": 0, "compact+reasoning": 0}
+    records = df.to_dict('records')
+    for start in range(0, len(records), batch_size):
+        batch = records[start:start + batch_size]
+        full, compact, compact_reasoning = [], [], []
+        for alias, row in enumerate(batch, 1):
+            power = {k: _value(row, k) for k in ('power_watts', 'quantity', 'total_power_watts', 'power_source')}
+            power = {k: (int(v) if isinstance(v, float) else v) for k, v in power.items()}
+            full.append({
+                "product_id": row['product_id'],
+                "product_name": str(row.get('product_name', ''))[:50],
+                "is_pv_module": bool(row['is_pv_module']),
+                "Confidence": _value(row, 'Confidence'),
+                "Reasoning": str(row.get('Reasoning', ''))[:100],
+                **power,
+            })
+            short = {"i": alias, "pv": int(row['is_pv_module']), "c": _value(row, 'Confidence')}
+            short.update({key: power[col] for key, col in (("w", "power_watts"), ("q", "quantity"),
+                                                           ("t", "total_power_watts"), ("s", "power_source"))
+                          if power[col] is not None})
+            compact.append(short)
+            compact_reasoning.append({**short, "why": str(row.get('Reasoning', ''))[:60]})
+        totals["full"] += count_tokens(json.dumps({"results": full}, ensure_ascii=False, indent=2))
+        totals["compact"] += count_tokens(json.dumps({"r": compact}, ensure_ascii=False, separators=(',', ':')))
+        totals["compact+reasoning"] += count_tokens(
+            json.dumps({"r": compact_reasoning}, ensure_ascii=False, separators=(',', ':')))
+
+    method = "tiktoken" if _ENCODER is not None else "~4 Zeichen/Token"
+    print(f"\n📊 Geschätzte Completion-Tokens ({method}, Batch {batch_size}):")
+    for schema, tokens in totals.items():
+        print(f"   {schema:<18} {tokens:>9,} gesamt | {tokens / len(df):6.1f} pro Zeile | "
+              f"{tokens / totals['full'] * 100:5.1f}% von full")
+
+
+def live_compare(args):
+    processor = CSVProcessor(args.input, "unused.csv")
+    df = processor.load_csv().head(args.limit)
+    batches = list(processor.create_batches(df, batch_size=args.batch_size))
+    print(f"📦 {len(df)} Zeilen in {len(batches)} Batches")
+
+    summary = []
+    for schema in ("full", "compact"):
+        client = LLMClient(provider=args.provider, model=args.model, output_schema=schema)
+        latencies = []
+        rows_answered = 0
+        for batch in batches:
+            start = time.perf_counter()
+            rows_answered += len(client.classify_batch(batch))
+            latencies.append(time.perf_counter() - start)
+        latencies = pd.Series(latencies)
+        summary.append({
+            "schema": schema,
+            "rows_answered": rows_answered,
+            "completion_tokens": client.usage.completion_tokens,
+            "completion_tokens_per_row": round(client.usage.completion_tokens / max(rows_answered, 1), 1),
+            "latency_mean_s": round(latencies.mean(), 2),
+            "latency_p95_s": round(latencies.quantile(0.95), 2),
+            "cost_usd": round(client.usage.total_cost_usd, 5),
+        })
+
+    print("\n📊 ERGEBNIS")
+    print(pd.DataFrame(summary).to_string(index=False))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Vergleich full vs compact Output-Schema')
+    parser.add_argument('--offline', type=str, default=None, help='Klassifizierte Output-Datei (CSV oder Parquet) für eine Schätzung ohne API')
+    parser.add_argument('--provider', type=str, default='openai', choices=['openai', 'zhipuai'])
+    parser.add_argument('--model', type=str, default='gpt-4o-mini')
+    parser.add_argument('--input', type=str, default='data/Testdaten ohne Loesung - mit head spalte.csv')
+    parser.add_argument('--limit', type=int, default=100)
+    parser.add_argument('--batch-size', type=int, default=50)
+    args = parser.parse_args()
+
+    if args.offline:
+        offline_estimate(args.offline, args.batch_size)
+    else:
+        live_compare(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Similarity Reuse: Agreement vs. Threshold
+=========================================
+Leave-one-out check of src/similarity.py on an already classified file:
+every row is matched against all *other* rows, and the label of its
+nearest neighbour is compared with the row's own label. Prints coverage
+(rows that would skip the LLM) and agreement per threshold, with and
+without exact name duplicates.
+
+    python scripts/similarity_agreement.py
+    python scripts/similarity_agreement.py --file data/output_eval_1k_zai.csv --thresholds 0.8,0.9,0.95
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.similarity import SimilarityIndex, similarity_text, DEFAULT_DIM, DEFAULT_THRESHOLD
+from src.power import PowerExtractor
+from src.loader import load_table
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Agreement der Ähnlichkeits-Wiederverwendung je Schwelle')
+    parser.add_argument('--file', type=str, default='data/output_eval_1k_zai.csv', help='Klassifizierte Output-Datei (CSV oder Parquet)')
+    parser.add_argument('--thresholds', type=str, default='0.8,0.85,0.9,0.92,0.95,0.97,0.99')
+    parser.add_argument('--dim', type=int, default=DEFAULT_DIM, help=f'Hash-Dimensionen (default: {DEFAULT_DIM})')
+    args = parser.parse_args()
+    thresholds = [float(t) for t in args.thresholds.split(',')]
+
+    df = load_table(args.file)
+    df = df[pd.to_numeric(df['is_pv_module'], errors='coerce').isin([0, 1])].reset_index(drop=True)
+    records = df.to_dict('records')
+    labels = df['is_pv_module'].astype(float).astype(int).to_numpy()
+    texts = [similarity_text(r) for r in records]
+    print(f"📖 {len(df)} klassifizierte Zeilen aus {args.file} ({labels.sum()} PV)")
+
+    started = time.perf_counter()
+    index = SimilarityIndex(dim=args.dim)
+    vectors = index.vectorize(texts)
+    sims = vectors @ vectors.T
+    np.fill_diagonal(sims, -1.0)
+    best = sims.argmax(axis=1)
+    scores = sims[np.arange(len(df)), best]
+    print(f"⏱️  Index + {len(df)}x{len(df)} Ähnlichkeiten in {time.perf_counter() - started:.2f}s")
+
+    agree = labels[best] == labels
+    has_text = np.array([bool(t) for t in texts])
+    exact = np.array([bool(t) and texts[b] == t for t, b in zip(texts, best)])
+
+    # Power re-extracted locally for rows that would take over a PV label
+    reused = df.assign(is_pv_module=labels[best])
+    local = PowerExtractor().fill(reused)['power_watts']
+    llm_power = pd.to_numeric(df['power_watts'], errors='coerce')
+    power_known = (labels == 1) & (labels[best] == 1) & llm_power.notna().to_numpy()
+    power_agree = (pd.to_numeric(local, errors='coerce') == llm_power).to_numpy()
+
+    print(f"\n{'Schwelle':>8} | {'Abdeckung':>15} | {'Agreement':>17} | {'ohne exakte Dup.':>23} | {'Leistung gleich':>15}")
+    print("-" * 92)
+    for t in thresholds:
+        hit = has_text & (scores >= t)
+        fuzzy = hit & ~exact
+        power_rows = hit & power_known
+        coverage = f"{hit.sum():>5} ({hit.mean() * 100:5.1f}%)"
+        agreement = f"{agree[hit].mean() * 100:6.2f}% ({(~agree & hit).sum()} F)" if hit.any() else "-"
+        fuzzy_agreement = f"{fuzzy.sum():>4}: {agree[fuzzy].mean() * 100:6.2f}% ({(~agree & fuzzy).sum()} F)" \
+            if fuzzy.any() else "-"
+        power = f"{power_agree[power_rows].mean() * 100:6.2f}%" if power_rows.any() else "-"
+        marker = "  ← default" if t == DEFAULT_THRESHOLD else ""
+        print(f"{t:>8.2f} | {coverage:>15} | {agreement:>17} | {fuzzy_agreement:>23} | {power:>15}{marker}")
+
+    disagreements = has_text & (scores >= min(thresholds)) & ~agree
+    if disagreements.any():
+        print(f"\n⚠️  Abweichende Nachbarn (Schwelle {min(thresholds)}):")
+        for i in np.flatnonzero(disagreements)[:10]:
+            print(f"   {scores[i]:.3f}  [{labels[i]}] {texts[i][:50]}")
+            print(f"          [{labels[best[i]]}] {texts[best[i]][:50]}")
+
+
+if __name__ == '__main__':
+    main()
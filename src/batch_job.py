@@ -0,0 +1,220 @@
+import os
+import json
+import hashlib
+import time
+import shutil
+import uuid
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+from .models import ClassificationResult
+from .mock_llm import mock_completion
+
+# Discount of the provider batch APIs on input and output tokens
+BATCH_DISCOUNT = 0.5
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+ENDPOINTS = {"openai": "/v1/chat/completions", "zhipuai": "/v4/chat/completions"}
+
+
+class ProviderBatchBackend:
+    """Batch endpoint of the provider SDK (OpenAI and ZhipuAI share the files/batches API)"""
+
+    def __init__(self, sdk_client, provider: str):
+        self.client = sdk_client
+        self.endpoint = ENDPOINTS[provider]
+
+    def submit(self, request_file: str) -> str:
+        with open(request_file, "rb") as f:
+            uploaded = self.client.files.create(file=f, purpose="batch")
+        job = self.client.batches.create(input_file_id=uploaded.id, endpoint=self.endpoint,
+                                         completion_window="24h")
+        return job.id
+
+    def status(self, job_id: str) -> Dict[str, Any]:
+        job = self.client.batches.retrieve(job_id)
+        counts = getattr(job, "request_counts", None)
+        return {
+            "status": job.status,
+            "output_file_id": getattr(job, "output_file_id", None),
+            "error_file_id": getattr(job, "error_file_id", None),
+            "completed": getattr(counts, "completed", None),
+            "total": getattr(counts, "total", None),
+        }
+
+    def download(self, file_id: str) -> str:
+        return self.client.files.content(file_id).content.decode("utf-8")
+
+
+class LocalBatchBackend:
+    """File-based stand-in for the batch endpoint, answers with src/mock_llm.py.
+
+    Jobs live in `root/<job_id>/`; a job completes on its first status poll.
+    """
+
+    def __init__(self, root: str = "data/batch_jobs", endpoint: str = ENDPOINTS["openai"]):
+        self.root = root
+        self.endpoint = endpoint
+
+    def submit(self, request_file: str) -> str:
+        job_id = f"batch_local_{uuid.uuid4().hex[:12]}"
+        job_dir = os.path.join(self.root, job_id)
+        os.makedirs(job_dir, exist_ok=True)
+        shutil.copy(request_file, os.path.join(job_dir, "input.jsonl"))
+        return job_id
+
+    def status(self, job_id: str) -> Dict[str, Any]:
+        job_dir = os.path.join(self.root, job_id)
+        output = os.path.join(job_dir, "output.jsonl")
+        if not os.path.exists(output):
+            self._run(job_dir)
+        with open(output, encoding="utf-8") as f:
+            total = sum(1 for _ in f)
+        return {"status": "completed", "output_file_id": output, "error_file_id": None,
+                "completed": total, "total": total}
+
+    def download(self, file_id: str) -> str:
+        with open(file_id, encoding="utf-8") as f:
+            return f.read()
+
+    @staticmethod
+    def _run(job_dir: str):
+        with open(os.path.join(job_dir, "input.jsonl"), encoding="utf-8") as src, \
+                open(os.path.join(job_dir, "output.jsonl"), "w", encoding="utf-8") as dst:
+            for line in src:
+                request = json.loads(line)
+                completion = mock_completion(request["body"])
+                dst.write(json.dumps({
+                    "id": f"batch_req_{uuid.uuid4().hex[:12]}",
+                    "custom_id": request["custom_id"],
+                    "response": {"status_code": 200, "body": completion},
+                    "error": None,
+                }, ensure_ascii=False) + "\n")
+
+
+class BatchJobRunner:
+    """Runs all batches as one asynchronous provider batch job.
+
+    Renders one chat-completion request per batch to a JSONL file, submits it,
+    persists the job ID in `state_file` (a rerun resumes polling the same job),
+    then downloads and validates the output with the client's normal parser.
+    """
+
+    def __init__(self, client, backend, work_dir: str = "data/batch_jobs", poll_interval: float = 60.0):
+        self.client = client
+        self.backend = backend
+        self.work_dir = work_dir
+        self.state_file = os.path.join(work_dir, "state.json")
+        self.poll_interval = poll_interval
+
+    def render(self, batches: List[List[Dict[str, Any]]], path: str) -> Dict[str, List[str]]:
+        """Writes the request file; returns custom_id -> product_ids of that batch"""
+        index = {}
+        with open(path, "w", encoding="utf-8") as f:
+            for num, batch in enumerate(batches, 1):
+                custom_id = f"batch-{num:05d}"
+                index[custom_id] = [str(item.get("product_id")) for item in batch]
+                f.write(json.dumps({"custom_id": custom_id, "method": "POST", "url": self.backend.endpoint,
+                                    "body": self.client._build_request(batch)}, ensure_ascii=False) + "\n")
+        return index
+
+    def fingerprint(self, batches: List[List[Dict[str, Any]]]) -> str:
+        """Hash of the batched product_ids, model and prompt/schema; a pending job is only resumed if it matches"""
+        source = {"model": self.client.model, "prompt_hash": self.client.prompt_hash,
+                  "output_schema": self.client.output_schema,
+                  "batches": [[str(item.get("product_id")) for item in batch] for batch in batches]}
+        return hashlib.sha256(json.dumps(source, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def _load_state(self) -> Optional[Dict[str, Any]]:
+        if not os.path.exists(self.state_file):
+            return None
+        with open(self.state_file, encoding="utf-8") as f:
+            state = json.load(f)
+        return None if state.get("consumed") else state
+
+    def _save_state(self, state: Dict[str, Any]):
+        with open(self.state_file, "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=2)
+
+    def submit(self, batches: List[List[Dict[str, Any]]]) -> Dict[str, Any]:
+        """Submit a new job, or return the pending one from an earlier run"""
+        os.makedirs(self.work_dir, exist_ok=True)
+        state = self._load_state()
+        fingerprint = self.fingerprint(batches)
+        if state is not None and state.get("fingerprint") == fingerprint:
+            print(f"♻️  Setze Batch-Job {state['job_id']} fort (eingereicht {state['submitted_at']})")
+            return state
+        if state is not None:
+            # Compact answers refer to rows by position, so another input or prompt cannot reuse the job
+            print(f"⚠️  Offener Batch-Job {state['job_id']} gehört zu anderem Input/Modell/Prompt, reiche neu ein")
+        request_file = os.path.join(self.work_dir, f"requests_{time.strftime('%Y%m%d_%H%M%S')}.jsonl")
+        index = self.render(batches, request_file)
+        job_id = self.backend.submit(request_file)
+        state = {"job_id": job_id, "request_file": request_file, "batches": index,
+                 "model": self.client.model, "fingerprint": fingerprint, "submitted_at": time.strftime("%Y-%m-%d %H:%M:%S")}
+        self._save_state(state)
+        print(f"📤 Batch-Job {job_id} eingereicht ({len(index)} Requests, {request_file})")
+        return state
+
+    def wait(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        while True:
+            status = self.backend.status(state["job_id"])
+            if status["status"] in TERMINAL_STATUSES:
+                return status
+            progress = f" ({status['completed']}/{status['total']})" if status.get("total") else ""
+            print(f"   ⏳ Batch-Job {state['job_id']}: {status['status']}{progress}, "
+                  f"nächste Abfrage in {self.poll_interval:.0f}s")
+            time.sleep(self.poll_interval)
+
+    def collect(self, state: Dict[str, Any], status: Dict[str, Any],
+                records: List[Dict[str, Any]]) -> List[ClassificationResult]:
+        """Validate the job output into results; `records` are the rows that were rendered"""
+        if status["status"] != "completed" or not status.get("output_file_id"):
+            # A dead job must not be resumed by the next run
+            state["consumed"] = True
+            self._save_state(state)
+            raise RuntimeError(f"Batch-Job {state['job_id']} beendet mit Status '{status['status']}'")
+
+        by_id = {str(item.get("product_id")): item for item in records}
+        results = []
+        seen = set()
+        for line in self.backend.download(status["output_file_id"]).splitlines():
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            custom_id = entry["custom_id"]
+            batch_ids = state["batches"].get(custom_id)
+            if batch_ids is None:
+                print(f"   ⚠️  {custom_id}: unbekannte Request-ID, übersprungen")
+                continue
+            seen.add(custom_id)
+            batch = [by_id[pid] for pid in batch_ids if pid in by_id]
+            response = entry.get("response") or {}
+            if entry.get("error") or response.get("status_code") != 200:
+                print(f"   ❌ {custom_id}: {entry.get('error') or response.get('status_code')}")
+                self.client.usage.add(rows_failed=len(batch))
+                continue
+            body = response["body"]
+            usage = SimpleNamespace(**body["usage"])
+            self.client._update_usage(SimpleNamespace(usage=usage), len(batch), discount=BATCH_DISCOUNT)
+            try:
+                parsed = self.client._parse_content(body["choices"][0]["message"]["content"], batch)
+            except Exception as e:
+                print(f"   ❌ {custom_id}: {e}")
+                self.client.usage.add(errors=1, rows_failed=len(batch))
+                continue
+            missing = set(batch_ids) - {r.product_id for r in parsed}
+            self.client.usage.add(rows_unanswered=len(missing))
+            results.extend(r for r in parsed if r.product_id in by_id)
+
+        # Requests without an output line (error file only)
+        for custom_id in set(state["batches"]) - seen:
+            self.client.usage.add(rows_failed=len(state["batches"][custom_id]))
+
+        state["consumed"] = True
+        self._save_state(state)
+        return results
+
+    def run(self, batches: List[List[Dict[str, Any]]]) -> List[ClassificationResult]:
+        state = self.submit(batches)
+        status = self.wait(state)
+        return self.collect(state, status, [item for batch in batches for item in batch])
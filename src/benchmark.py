@@ -0,0 +1,276 @@
+"""In-process benchmark harness: a grid of PipelineConfig runs with timings, cost and F1"""
+import io
+import json
+import time
+import sys
+import platform
+import argparse
+import itertools
+import subprocess
+import contextlib
+import statistics
+from dataclasses import dataclass, field, asdict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+from .processor import CSVProcessor
+from .metrics import MetricsRegistry
+from .mock_server import MockServerConfig, serve
+from .pipeline import PipelineConfig, PipelineError, run_pipeline, load_ground_truth, score_predictions
+
+# Relative drop in rows/s (or rise in p95 latency / cost) flagged as a regression
+REGRESSION_TOLERANCE = 0.10
+# F1 points a run may lose against the baseline
+F1_TOLERANCE = 0.5
+# Columns of the summary table and of the regression comparison
+SUMMARY_FIELDS = ["rows_per_second", "wall_seconds", "latency_p50", "latency_p95", "latency_p99",
+                  "prompt_tokens", "completion_tokens", "cached_prompt_tokens", "cost_usd",
+                  "errors", "rows_failed", "precision", "recall", "f1"]
+
+
+@dataclass
+class BenchmarkSpec:
+    """What to run: input, repetitions, fixed options and the grid axes"""
+    input: str
+    limit: Optional[int] = None
+    truth: Optional[str] = None
+    warmup: int = 0
+    repeats: int = 1
+    base: Dict[str, Any] = field(default_factory=dict)
+    grid: Dict[str, List[Any]] = field(default_factory=dict)
+    mock: Optional[Dict[str, Any]] = None
+
+    @classmethod
+    def from_file(cls, path) -> "BenchmarkSpec":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(**json.load(f))
+
+    def cases(self) -> List[Dict[str, Any]]:
+        """One PipelineConfig override dict per grid point (cartesian product of the axes)"""
+        axes = list(self.grid.items())
+        cases = []
+        for values in itertools.product(*(v for _, v in axes)):
+            case = dict(self.base)
+            for name, value in zip((n for n, _ in axes), values):
+                if name == "backend":
+                    case["provider"], case["model"] = value.split(":", 1)
+                else:
+                    case[name] = value
+            cases.append(case)
+        return cases
+
+
+def case_label(case: Dict[str, Any], fixed=()) -> str:
+    """Backend, batch size and concurrency plus the other grid axes (options in `fixed` are left out)"""
+    return (f"{case.get('provider', 'openai')}:{case.get('model', 'gpt-4o-mini')} "
+            f"b{case.get('batch_size', 10)} p{case.get('parallel', 1)}"
+            + "".join(f" {k}={v}" for k, v in sorted(case.items())
+                      if k not in ("provider", "model", "batch_size", "parallel", "base_url", *fixed)))
+
+
+def run_case(case: Dict[str, Any], df_input: pd.DataFrame, truth: Optional[pd.DataFrame],
+             input_path: str, label: Optional[str] = None, verbose: bool = False) -> Dict[str, Any]:
+    """Run the pipeline once for one grid point and return its measurements"""
+    config = PipelineConfig(**{**case, "input": input_path, "output": None, "limit": None, "metrics": None})
+    metrics = MetricsRegistry()
+    record: Dict[str, Any] = {"label": label or case_label(case), "provider": config.provider, "model": config.model,
+                              "batch_size": config.batch_size, "parallel": config.parallel,
+                              "engine": config.engine, "rows": len(df_input), "error": None}
+    log = io.StringIO()
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(sys.stdout if verbose else log):
+            result = run_pipeline(config, df_input=df_input, metrics=metrics)
+    except PipelineError as e:
+        record["error"] = str(e)
+        return record
+    wall = time.perf_counter() - start
+
+    usage = result.client.usage
+    latency = metrics.histogram_summary("request_latency_seconds")
+    record.update({
+        "wall_seconds": round(wall, 3),
+        "rows_per_second": round(len(df_input) / wall, 3) if wall > 0 else 0.0,
+        "requests": latency["count"],
+        "latency_p50": round(latency["p50"], 3),
+        "latency_p95": round(latency["p95"], 3),
+        "latency_p99": round(latency["p99"], 3),
+        "prompt_tokens": usage.prompt_tokens,
+        "completion_tokens": usage.completion_tokens,
+        "cached_prompt_tokens": usage.cached_prompt_tokens,
+        # All stages of a router/cascade book their cost into the shared registry
+        "cost_usd": round(metrics.counter("cost_usd_total"), 6),
+        "errors": int(metrics.counter("errors_total")),
+        "retries": int(metrics.counter("retries_total")),
+        "rows_failed": usage.rows_failed + usage.rows_unanswered,
+        "rows_answered": int(result.final_df["is_pv_module"].notna().sum()) if result.final_df is not None else 0,
+    })
+    if truth is not None and result.final_df is not None:
+        scores, _ = score_predictions(result.final_df, truth)
+        record.update({k: round(scores[k], 2) for k in ("precision", "recall", "f1", "accuracy")} if scores else {})
+    return record
+
+
+def run_benchmark(spec: BenchmarkSpec, verbose: bool = False) -> List[Dict[str, Any]]:
+    """All runs of the spec (warm-up runs are executed but not returned)"""
+    df_input = CSVProcessor(spec.input).load_csv()
+    if spec.limit:
+        df_input = df_input.head(spec.limit)
+    truth = None
+    truth_file = spec.truth or (spec.input if "is_pv_module" in df_input.columns else None)
+    if truth_file:
+        truth = load_ground_truth(truth_file)
+
+    httpd = None
+    cases = spec.cases()
+    if spec.mock is not None:
+        httpd, _ = serve(MockServerConfig(**spec.mock), port=0)
+        base_url = "http://127.0.0.1:%d/v1" % httpd.server_address[1]
+        cases = [{**case, "base_url": base_url} for case in cases]
+
+    records = []
+    try:
+        for case in cases:
+            label = case_label(case, fixed=[k for k in spec.base if k not in spec.grid])
+            for i in range(spec.warmup + spec.repeats):
+                warmup = i < spec.warmup
+                record = run_case(case, df_input, truth, spec.input, label=label, verbose=verbose)
+                status = f"❌ {record['error']}" if record["error"] else \
+                    f"{record['wall_seconds']:.1f}s, {record['rows_per_second']:.1f} Zeilen/s, F1 {record.get('f1', '-')}"
+                print(f"   {'Warm-up' if warmup else f'Lauf {i - spec.warmup + 1}/{spec.repeats}'} {label}: {status}")
+                if not warmup:
+                    records.append({**record, "repeat": i - spec.warmup + 1})
+    finally:
+        if httpd is not None:
+            httpd.shutdown()
+    return records
+
+
+def summarize(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Median of every measurement over the repeats of a grid point"""
+    summary = []
+    for label in dict.fromkeys(r["label"] for r in records):
+        runs = [r for r in records if r["label"] == label and not r["error"]]
+        row = {"label": label, "runs": len(runs),
+               "failed_runs": sum(1 for r in records if r["label"] == label and r["error"])}
+        for name in SUMMARY_FIELDS:
+            values = [r[name] for r in runs if r.get(name) is not None]
+            row[name] = round(statistics.median(values), 4) if values else None
+        summary.append(row)
+    return summary
+
+
+def compare(summary: List[Dict[str, Any]], baseline: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Per grid point: relative change of speed/latency/cost and F1 delta against a previous summary"""
+    previous = {row["label"]: row for row in baseline}
+    deltas = []
+    for row in summary:
+        old = previous.get(row["label"])
+        if old is None:
+            continue
+
+        def change(name):
+            if row.get(name) is None or not old.get(name):
+                return None
+            return (row[name] - old[name]) / old[name]
+
+        delta = {"label": row["label"], "rows_per_second": change("rows_per_second"),
+                 "latency_p95": change("latency_p95"), "cost_usd": change("cost_usd"),
+                 "f1": row["f1"] - old["f1"] if row.get("f1") is not None and old.get("f1") is not None else None}
+        delta["regression"] = bool(
+            (delta["rows_per_second"] is not None and delta["rows_per_second"] < -REGRESSION_TOLERANCE)
+            or (delta["latency_p95"] is not None and delta["latency_p95"] > REGRESSION_TOLERANCE)
+            or (delta["cost_usd"] is not None and delta["cost_usd"] > REGRESSION_TOLERANCE)
+            or (delta["f1"] is not None and delta["f1"] < -F1_TOLERANCE))
+        deltas.append(delta)
+    return deltas
+
+
+def environment() -> Dict[str, Any]:
+    """Version and host info stored with every report"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                timeout=10).stdout.strip() or None
+    except Exception:
+        commit = None
+    return {"timestamp": datetime.now().isoformat(timespec="seconds"), "git_commit": commit,
+            "python": platform.python_version(), "platform": platform.platform()}
+
+
+def write_report(prefix, spec: BenchmarkSpec, records: List[Dict[str, Any]],
+                 summary: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """<prefix>.json (spec, environment, runs, summary) and <prefix>.csv (one row per run)"""
+    report = {"environment": environment(), "spec": asdict(spec), "runs": records, "summary": summary}
+    Path(prefix).parent.mkdir(parents=True, exist_ok=True)
+    with open(f"{prefix}.json", "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    pd.DataFrame(records).to_csv(f"{prefix}.csv", index=False, sep=';')
+    return report
+
+
+def format_summary(summary: List[Dict[str, Any]]) -> str:
+    def fmt(value, spec):
+        return "-".rjust(int(spec.split(".")[0])) if value is None else format(value, spec)
+
+    lines = [f"{'Lauf':<40} | {'Zeilen/s':>8} | {'p50 s':>6} | {'p95 s':>6} | {'Tokens':>9} | {'Kosten $':>8} | "
+             f"{'Fehler':>6} | {'F1 %':>6}", "-" * 112]
+    for row in summary:
+        tokens = None if row["prompt_tokens"] is None else row["prompt_tokens"] + (row["completion_tokens"] or 0)
+        lines.append(f"{row['label'][:40]:<40} | {fmt(row['rows_per_second'], '8.2f')} | "
+                     f"{fmt(row['latency_p50'], '6.2f')} | {fmt(row['latency_p95'], '6.2f')} | "
+                     f"{fmt(tokens, '9.0f')} | {fmt(row['cost_usd'], '8.4f')} | "
+                     f"{fmt(row['errors'], '6.0f')} | {fmt(row['f1'], '6.2f')}")
+    return "\n".join(lines)
+
+
+def format_comparison(deltas: List[Dict[str, Any]]) -> str:
+    def pct(value):
+        return "-" if value is None else f"{value * 100:+.1f}%"
+
+    lines = [f"{'Lauf':<40} | {'Zeilen/s':>8} | {'p95':>8} | {'Kosten':>8} | {'F1 Δ':>6}", "-" * 84]
+    for d in deltas:
+        f1 = "-" if d["f1"] is None else f"{d['f1']:+.2f}"
+        lines.append(f"{d['label'][:40]:<40} | {pct(d['rows_per_second']):>8} | {pct(d['latency_p95']):>8} | "
+                     f"{pct(d['cost_usd']):>8} | {f1:>6}" + ("  ⚠️ Regression" if d["regression"] else ""))
+    return "\n".join(lines)
+
+
+def run_and_report(spec: BenchmarkSpec, out, baseline: Optional[str] = None,
+                   verbose: bool = False) -> Dict[str, Any]:
+    """Run the spec, write <out>.json/.csv and print the summary (and the comparison with `baseline`)"""
+    print(f"🏁 Benchmark: {len(spec.cases())} Konfigurationen × {spec.repeats} Läufe (+{spec.warmup} Warm-up) "
+          f"auf {spec.input}" + (" gegen Mock-Server" if spec.mock is not None else ""))
+    records = run_benchmark(spec, verbose=verbose)
+    summary = summarize(records)
+    report = write_report(out, spec, records, summary)
+
+    print(f"\n🏆 BENCHMARK (Median über {spec.repeats} Läufe)")
+    print(format_summary(summary))
+    print(f"\n📄 Ergebnisse gespeichert: {out}.json, {out}.csv")
+    if baseline:
+        with open(baseline, "r", encoding="utf-8") as f:
+            report["comparison"] = compare(summary, json.load(f)["summary"])
+        print(f"\n📈 Vergleich mit {baseline}")
+        print(format_comparison(report["comparison"]))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark der Klassifizierungs-Pipeline über ein Raster von Konfigurationen')
+    parser.add_argument('spec', type=str, help='JSON-Spezifikation (input, limit, warmup, repeats, base, grid, mock)')
+    parser.add_argument('--out', type=str, default=None, help='Ergebnis-Präfix für .json/.csv (default: data/benchmarks/<Zeitstempel>)')
+    parser.add_argument('--baseline', type=str, default=None, help='Früherer Benchmark-JSON zum Vergleich, Exit-Code 1 bei Regression')
+    parser.add_argument('--verbose', action='store_true', help='Ausgabe der Pipeline nicht unterdrücken')
+    args = parser.parse_args()
+
+    out = args.out or f"data/benchmarks/{datetime.now():%Y%m%d_%H%M%S}"
+    report = run_and_report(BenchmarkSpec.from_file(args.spec), out, baseline=args.baseline, verbose=args.verbose)
+    if any(d["regression"] for d in report.get("comparison", [])):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
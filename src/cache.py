@@ -0,0 +1,121 @@
+import json
+import time
+import sqlite3
+import hashlib
+from pathlib import Path
+from threading import Lock
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .models import ClassificationResult
+
+# SQLite limits the number of bound parameters per statement
+SQLITE_MAX_PARAMS = 500
+
+
+def select_in(conn: sqlite3.Connection, sql: str, values: Iterable[Any], extra: Tuple = ()) -> List[tuple]:
+    """Rows of `sql` for all `values`, run in chunks that fill its `{placeholders}`; `extra` follows each chunk"""
+    unique_values = list(dict.fromkeys(values))
+    rows = []
+    for i in range(0, len(unique_values), SQLITE_MAX_PARAMS):
+        chunk = unique_values[i:i + SQLITE_MAX_PARAMS]
+        rows.extend(conn.execute(sql.format(placeholders=",".join("?" * len(chunk))), (*chunk, *extra)).fetchall())
+    return rows
+
+
+class ResultCache:
+    """Persistent SQLite cache for validated classification results.
+
+    Entries are content-addressed: the key covers the normalized product
+    fields, provider, model and a hash of the system prompt, so editing the
+    prompt or switching models never serves stale labels.
+    """
+
+    def __init__(self, path: str, max_entries: Optional[int] = None, max_age_days: Optional[float] = None):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        # One connection shared by all workers, serialized by a lock
+        self._lock = Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                result TEXT NOT NULL,
+                source_quantity INTEGER,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+        self.evict()
+
+    @staticmethod
+    def make_key(signature: str, provider: str, model: str, prompt_hash: str) -> str:
+        """Combine product signature and request configuration into one cache key"""
+        raw = "\x1f".join([signature, provider, model, prompt_hash])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: List[str]) -> Dict[str, Tuple[ClassificationResult, Optional[int]]]:
+        """Look up several keys at once. Returns {key: (result, source_quantity)}"""
+        found = {}
+        if not keys:
+            return found
+        now = time.time()
+        min_created = now - self.max_age_days * 86400 if self.max_age_days else 0
+
+        with self._lock:
+            rows = select_in(self._conn, "SELECT key, result, source_quantity FROM results "
+                                         "WHERE key IN ({placeholders}) AND created_at >= ?", keys, (min_created,))
+            for key, result_json, source_quantity in rows:
+                found[key] = (ClassificationResult(**json.loads(result_json)), source_quantity)
+            if found:
+                self._conn.executemany(
+                    "UPDATE results SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found],
+                )
+                self._conn.commit()
+        return found
+
+    def put_many(self, entries: List[Tuple[str, ClassificationResult, Optional[int]]]):
+        """Store (key, result, source_quantity) tuples, replacing older entries"""
+        if not entries:
+            return
+        now = time.time()
+        rows = [(key, json.dumps(result.model_dump(by_alias=True)), source_quantity, now, now)
+                for key, result, source_quantity in entries]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO results (key, result, source_quantity, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+
+    def evict(self) -> int:
+        """Drop entries older than max_age_days, then least recently used ones above max_entries"""
+        removed = 0
+        with self._lock:
+            if self.max_age_days:
+                cutoff = time.time() - self.max_age_days * 86400
+                removed += self._conn.execute("DELETE FROM results WHERE created_at < ?", (cutoff,)).rowcount
+            if self.max_entries:
+                removed += self._conn.execute(
+                    "DELETE FROM results WHERE key IN ("
+                    "  SELECT key FROM results ORDER BY last_used DESC LIMIT -1 OFFSET ?"
+                    ")",
+                    (self.max_entries,),
+                ).rowcount
+            self._conn.commit()
+        return removed
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def close(self):
+        self.evict()
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,200 @@
+import time
+from dataclasses import dataclass
+from threading import Lock
+from typing import Any, Dict, List, Tuple
+
+import pandas as pd
+
+from .models import ClassificationResult
+from .power import PowerExtractor
+
+# Results below this confidence go to the next stage
+DEFAULT_THRESHOLD = 0.9
+
+
+@dataclass
+class CascadeStage:
+    """One model of the cascade with the rows it saw and the time it spent"""
+    client: Any
+    rows: int = 0
+    calls: int = 0
+    seconds: float = 0.0
+
+    @property
+    def name(self) -> str:
+        provider = getattr(self.client, "provider", None)
+        return f"{provider}/{self.client.model}" if provider else self.client.model
+
+    @property
+    def cost_usd(self) -> float:
+        return self.client.usage.total_cost_usd
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+
+class ModelCascade:
+    """Cheap model first, uncertain rows escalated to stronger models.
+
+    Every batch goes to the first stage. Rows it did not answer, answered
+    below `threshold` confidence, or answered with inconsistent power fields
+    (total != power x quantity, or power_watts disagreeing with src/power.py)
+    are re-sent to the next stage. A stage's answer replaces the earlier one;
+    if a stage fails, the earlier answer stays. `cascade_stage` and
+    `classified_by` record which stage and model produced each row.
+
+    Each stage keeps its own UsageStats so cost and throughput can be
+    reported per stage; `usage` is the first stage's.
+    """
+
+    def __init__(self, clients: List[Any], threshold: float = DEFAULT_THRESHOLD, check_power: bool = True):
+        if len(clients) < 2:
+            raise ValueError("Kaskade braucht mindestens zwei Stufen")
+        self.stages = [CascadeStage(client) for client in clients]
+        self.threshold = threshold
+        self.check_power = check_power
+        self.usage = clients[0].usage
+        self._power = PowerExtractor()
+        self._lock = Lock()
+
+    @property
+    def model(self) -> str:
+        return " → ".join(stage.name for stage in self.stages)
+
+    @property
+    def cache(self):
+        return self.stages[0].client.cache
+
+    def _power_conflicts(self, results: List[ClassificationResult], by_id: Dict[str, Dict[str, Any]]) -> set:
+        """product_ids whose power fields contradict each other or the local extraction"""
+        conflicts = {r.product_id for r in results
+                     if r.power_watts and r.quantity and r.total_power_watts
+                     and r.total_power_watts != r.power_watts * r.quantity}
+        pv = [r for r in results if r.is_pv_module and r.product_id in by_id]
+        if pv:
+            df = pd.DataFrame([{**by_id[r.product_id], "is_pv_module": 1, "power_watts": r.power_watts} for r in pv])
+            status = self._power.cross_check(df)
+            conflicts.update(r.product_id for r, s in zip(pv, status) if s == "mismatch")
+        return conflicts
+
+    def _split_doubtful(self, results: List[ClassificationResult],
+                        by_id: Dict[str, Dict[str, Any]]) -> Tuple[List[ClassificationResult], List[ClassificationResult]]:
+        conflicts = self._power_conflicts(results, by_id) if self.check_power else set()
+        confident, doubtful = [], []
+        for r in results:
+            (doubtful if r.confidence < self.threshold or r.product_id in conflicts else confident).append(r)
+        return confident, doubtful
+
+    def _escalation(self, results: List[ClassificationResult], batch: List[Dict[str, Any]],
+                    by_id: Dict[str, Dict[str, Any]]):
+        """(kept results, results that may be replaced, items for the next stage)"""
+        confident, doubtful = self._split_doubtful(results, by_id)
+        answered = {r.product_id for r in results}
+        missing = [item for item in batch if str(item.get("product_id")) not in answered]
+        return confident, doubtful, [by_id[r.product_id] for r in doubtful] + missing
+
+    def _record(self, level: int, items: List[Dict[str, Any]], started: float,
+                results: List[ClassificationResult]) -> List[ClassificationResult]:
+        stage = self.stages[level]
+        with self._lock:
+            stage.calls += 1
+            stage.rows += len(items)
+            stage.seconds += time.perf_counter() - started
+        return [r.model_copy(update={"cascade_stage": level + 1}) for r in results]
+
+    @staticmethod
+    def _merge(kept, doubtful, better) -> List[ClassificationResult]:
+        replaced = {r.product_id for r in better}
+        return kept + better + [r for r in doubtful if r.product_id not in replaced]
+
+    def split_cached(self, records: List[Dict[str, Any]]) -> tuple:
+        """Cache lookup along the cascade: doubtful first-stage hits are looked up in the next stage.
+
+        Rows without a confident hit are returned as pending and run through the whole cascade.
+        """
+        results, pending = self.stages[0].client.split_cached(records)
+        results = [r.model_copy(update={"cascade_stage": 1}) for r in results]
+        by_id = {str(item.get("product_id")): item for item in records}
+        for level, stage in enumerate(self.stages[1:], 2):
+            confident, doubtful = self._split_doubtful(results, by_id)
+            if not doubtful:
+                break
+            hits, misses = stage.client.split_cached([by_id[r.product_id] for r in doubtful])
+            results = confident + [r.model_copy(update={"cascade_stage": level}) for r in hits]
+            pending.extend(misses)
+        return results, pending
+
+    def classify_batch(self, batch: List[Dict[str, Any]]) -> List[ClassificationResult]:
+        by_id = {str(item.get("product_id")): item for item in batch}
+        results: List[ClassificationResult] = []
+        items = batch
+        kept: List[ClassificationResult] = []
+        doubtful: List[ClassificationResult] = []
+        last_error = None
+        for level, stage in enumerate(self.stages):
+            started = time.perf_counter()
+            try:
+                answered = stage.client.classify_batch(items)
+            except Exception as e:
+                last_error = e
+                print(f"   ❌ Kaskade Stufe {level + 1} ({stage.name}): {e}")
+                answered = []
+            better = self._record(level, items, started, answered)
+            results = self._merge(kept, doubtful, better)
+            kept, doubtful, items = self._escalation(results, batch, by_id)
+            if not items:
+                break
+        if not results and last_error is not None:
+            raise last_error
+        return results
+
+    def get_usage_report(self) -> str:
+        report = self.stages[0].client.get_usage_report()
+        first_rows = self.stages[0].rows
+        lines = ["", "╔══════════════════════════════════════════════════════════════╗",
+                 f"║  {f'MODEL CASCADE (eskaliert unter Confidence {self.threshold:g})':<60}║",
+                 "╠══════════════════════════════════════════════════════════════╣"]
+        for level, stage in enumerate(self.stages, 1):
+            share = f" ({stage.rows / first_rows * 100:.1f}% eskaliert)" if level > 1 and first_rows else ""
+            lines.append(f"║  Stufe {level}: {stage.name[:50]:<50} ║")
+            detail = f"{stage.rows} Zeilen{share}, ${stage.cost_usd:.4f}, {stage.rows_per_second:.1f} Zeilen/s"
+            lines.append(f"║    {detail[:56]:<56}  ║")
+        total = sum(stage.cost_usd for stage in self.stages)
+        last = self.stages[-1]
+        lines.append("╠══════════════════════════════════════════════════════════════╣")
+        lines.append(f"║  Gesamtkosten Kaskade:       ${total:<30.4f} ║")
+        if last.rows:
+            # What the run would have cost with every row on the strongest model
+            all_last = last.cost_usd / last.rows * first_rows
+            lines.append(f"║  Nur letzte Stufe (geschätzt): ${all_last:<28.4f} ║")
+        lines.append("╚══════════════════════════════════════════════════════════════╝")
+        return report + "\n".join(lines)
+
+
+class AsyncModelCascade(ModelCascade):
+    """Cascade over AsyncLLMClients for the async engine"""
+
+    async def classify_batch(self, batch: List[Dict[str, Any]]) -> List[ClassificationResult]:
+        by_id = {str(item.get("product_id")): item for item in batch}
+        results: List[ClassificationResult] = []
+        items = batch
+        kept: List[ClassificationResult] = []
+        doubtful: List[ClassificationResult] = []
+        last_error = None
+        for level, stage in enumerate(self.stages):
+            started = time.perf_counter()
+            try:
+                answered = await stage.client.classify_batch(items)
+            except Exception as e:
+                last_error = e
+                print(f"   ❌ Kaskade Stufe {level + 1} ({stage.name}): {e}")
+                answered = []
+            better = self._record(level, items, started, answered)
+            results = self._merge(kept, doubtful, better)
+            kept, doubtful, items = self._escalation(results, batch, by_id)
+            if not items:
+                break
+        if not results and last_error is not None:
+            raise last_error
+        return results
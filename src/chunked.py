@@ -0,0 +1,103 @@
+import queue
+import threading
+from typing import Any, Callable, Dict, Generator, Iterable, List
+
+import pandas as pd
+
+
+_END = object()
+
+
+def iter_batches(chunks: Iterable[pd.DataFrame], batch_size: int) -> Generator[List[Dict[str, Any]], None, None]:
+    """Lazy batches across chunk boundaries; only one chunk of records is held at a time"""
+    carry: List[Dict[str, Any]] = []
+    for chunk in chunks:
+        records = carry + chunk.to_dict('records')
+        full = len(records) - len(records) % batch_size
+        for i in range(0, full, batch_size):
+            yield records[i:i + batch_size]
+        carry = records[full:]
+    if carry:
+        yield carry
+
+
+class ReorderBuffer:
+    """Emits items in sequence order; early finishers wait here until the ones before them are done"""
+
+    def __init__(self, emit: Callable[[Any], None], on_emit: Callable[[], None] = lambda: None):
+        self.emit = emit
+        self.on_emit = on_emit
+        self._next = 0
+        self._pending: Dict[int, Any] = {}
+        self._lock = threading.Lock()
+
+    def put(self, seq: int, item: Any):
+        with self._lock:
+            self._pending[seq] = item
+            while self._next in self._pending:
+                self.emit(self._pending.pop(self._next))
+                self._next += 1
+                self.on_emit()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+
+def run_ordered(items: Iterable[Any], work: Callable[[Any], Any], emit: Callable[[Any], None],
+                workers: int, max_in_flight: int) -> int:
+    """Producer/consumer over `items` with at most `max_in_flight` of them read but not yet emitted.
+
+    The calling thread produces (pulls from the lazy iterable), `workers`
+    threads run `work`, and `emit` gets the results in input order. Returns
+    the number of items processed; an exception in `work` or `emit` stops
+    the producer and is re-raised.
+    """
+    # One slot per item between reading and writing: bounds the queue and the reorder buffer
+    slots = threading.Semaphore(max(max_in_flight, workers))
+    tasks: queue.Queue = queue.Queue()
+    buffer = ReorderBuffer(emit, on_emit=slots.release)
+    errors: List[BaseException] = []
+    stop = threading.Event()
+
+    def consume():
+        while True:
+            task = tasks.get()
+            if task is None:
+                return
+            if stop.is_set():
+                continue
+            seq, item = task
+            try:
+                buffer.put(seq, work(item))
+            except BaseException as e:
+                errors.append(e)
+                stop.set()
+
+    threads = [threading.Thread(target=consume, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+
+    count = 0
+    iterator = iter(items)
+    try:
+        while not stop.is_set():
+            # Take a slot before reading the next item; short waits let Ctrl-C and worker errors through
+            if not slots.acquire(timeout=0.5):
+                continue
+            item = next(iterator, _END)
+            if item is _END:
+                break
+            tasks.put((count, item))
+            count += 1
+    except BaseException:
+        stop.set()
+        raise
+    finally:
+        for _ in threads:
+            tasks.put(None)
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(timeout=0.5)
+    if errors:
+        raise errors[0]
+    return count
@@ -0,0 +1,94 @@
+import os
+import json
+import time
+import sqlite3
+from pathlib import Path
+from threading import Lock
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from .cache import select_in
+from .models import ClassificationResult
+
+
+class ResultJournal:
+    """Append-only SQLite checkpoint of a run: every finished batch is committed as it completes.
+
+    A crash, Ctrl-C or provider outage loses at most the batches in flight;
+    `--resume` reloads the journal, skips the product_ids already in it and
+    the final output is merged from the journal rather than from memory.
+    A fresh run moves an existing journal to `<path>.prev` instead of clearing it.
+    """
+
+    def __init__(self, path: str, resume: bool = False, run_info: Optional[Dict[str, Any]] = None):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if not resume and self.path.exists():
+            # Keep the previous run until this one has written its output
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(f"{self.path}{suffix}"):
+                    os.replace(f"{self.path}{suffix}", f"{self.path}.prev{suffix}")
+
+        self._lock = Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # Every commit reaches the disk before the next batch is reported done
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                product_id TEXT NOT NULL,
+                source TEXT,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS run (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self.previous_run = dict(self._conn.execute("SELECT key, value FROM run").fetchall())
+        # A mismatching journal keeps its settings, so a later --resume is refused again
+        if run_info and not self.mismatches(run_info):
+            self._conn.executemany("INSERT OR REPLACE INTO run (key, value) VALUES (?, ?)",
+                                   [(k, json.dumps(v)) for k, v in run_info.items()])
+        self._conn.commit()
+
+    def mismatches(self, run_info: Dict[str, Any]) -> List[str]:
+        """Settings of the journaled run that differ from `run_info` (empty for a fresh journal)"""
+        return [key for key, value in run_info.items()
+                if key in self.previous_run and json.loads(self.previous_run[key]) != value]
+
+    def append(self, results: Iterable[ClassificationResult], source: Optional[str] = None) -> int:
+        """Durably record one batch of results; returns the number of rows written"""
+        now = time.time()
+        rows = [(str(r.product_id), source, json.dumps(r.model_dump(by_alias=True)), now) for r in results]
+        if not rows:
+            return 0
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO results (product_id, source, result, created_at) VALUES (?, ?, ?, ?)", rows)
+            self._conn.commit()
+        return len(rows)
+
+    def done_ids(self) -> Set[str]:
+        with self._lock:
+            return {row[0] for row in self._conn.execute("SELECT DISTINCT product_id FROM results")}
+
+    def get_many(self, product_ids: List[str]) -> Dict[str, ClassificationResult]:
+        """Latest journaled result per product_id, for the ids that have one"""
+        with self._lock:
+            rows = select_in(self._conn, "SELECT product_id, result FROM results "
+                                         "WHERE product_id IN ({placeholders}) ORDER BY seq", product_ids)
+        # Rows come in write order, so the latest result per product_id wins
+        return {product_id: ClassificationResult(**json.loads(result_json)) for product_id, result_json in rows}
+
+    def results(self) -> List[Dict[str, Any]]:
+        """All journaled result dicts in the order they were written"""
+        with self._lock:
+            rows = self._conn.execute("SELECT result FROM results ORDER BY seq").fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
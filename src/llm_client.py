@@ -1,10 +1,16 @@
 import os
 import json
 import time
-from typing import List, Dict, Any, Optional
+import re
+import asyncio
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from types import SimpleNamespace
+from typing import List, Dict, Any, Optional, Callable
 from dataclasses import dataclass, field
+from threading import BoundedSemaphore, Lock
 import pandas as pd
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 from dotenv import load_dotenv
 from pydantic import BaseModel
 try:
@@ -13,16 +19,26 @@ except ImportError:
     ZhipuAI = None
 
 from .models import ClassificationResult
+from .cache import ResultCache
+from .shaping import InputShaper
+from .streaming import StreamCollector
+from .metrics import MetricsRegistry, RATE_BUCKETS
+from .transport import TransportConfig
+from .processor import product_signature, row_quantity, rebase_quantity
 
 load_dotenv()
 
+# ZhipuAI exposes an OpenAI-compatible endpoint, used for the asyncio path
+ZHIPUAI_BASE_URL = "https://open.bigmodel.cn/api/paas/v4/"
+
 # OpenAI Pricing (USD per 1M tokens) - Updated Jan 2026
 # Pricing per 1M tokens (USD approx.)
+# "cached_input": prompt tokens served from the provider's prefix cache (defaults to "input")
 PRICING = {
-    "gpt-5-mini": {"input": 0.15 / 1_000_000, "output": 0.60 / 1_000_000},
-    "gpt-5.2": {"input": 5.00 / 1_000_000, "output": 15.00 / 1_000_000}, # Hypothetical High-Performance
-    "gpt-4o-mini": {"input": 0.15 / 1_000_000, "output": 0.60 / 1_000_000},
-    "gpt-4o": {"input": 2.50 / 1_000_000, "output": 10.00 / 1_000_000},
+    "gpt-5-mini": {"input": 0.15 / 1_000_000, "cached_input": 0.015 / 1_000_000, "output": 0.60 / 1_000_000},
+    "gpt-5.2": {"input": 5.00 / 1_000_000, "cached_input": 0.50 / 1_000_000, "output": 15.00 / 1_000_000}, # Hypothetical High-Performance
+    "gpt-4o-mini": {"input": 0.15 / 1_000_000, "cached_input": 0.075 / 1_000_000, "output": 0.60 / 1_000_000},
+    "gpt-4o": {"input": 2.50 / 1_000_000, "cached_input": 1.25 / 1_000_000, "output": 10.00 / 1_000_000},
     
     # ZhipuAI (approx exchange rate 1 RMB = 0.14 USD)
     "glm-4-plus": {"input": 0.70 / 1_000_000, "output": 0.70 / 1_000_000}, 
@@ -31,10 +47,37 @@ PRICING = {
     
     # GLM-4.5 Series (USD)
     "glm-4.5-preview": {"input": 3.00 / 1_000_000, "output": 3.00 / 1_000_000}, # Estimating high
-    "glm-4.5-air": {"input": 0.20 / 1_000_000, "output": 1.10 / 1_000_000}, # Based on user text
+    "glm-4.5-air": {"input": 0.20 / 1_000_000, "cached_input": 0.03 / 1_000_000, "output": 1.10 / 1_000_000}, # Based on user text
     "glm-4.5-flash": {"input": 0.00 / 1_000_000, "output": 0.00 / 1_000_000}, # Free?
 }
 
+# Rate limits per model (requests / tokens per minute) - approx. Tier 1 values,
+# adjust to the account tier. Limits reported in response headers take precedence.
+RATE_LIMITS = {
+    "gpt-5-mini": {"rpm": 500, "tpm": 500_000},
+    "gpt-5.2": {"rpm": 500, "tpm": 30_000},
+    "gpt-4o-mini": {"rpm": 500, "tpm": 200_000},
+    "gpt-4o": {"rpm": 500, "tpm": 30_000},
+    
+    # ZhipuAI limits by concurrency; these keep roughly 20 workers busy
+    "glm-4-plus": {"rpm": 300, "tpm": 1_000_000},
+    "glm-4-air": {"rpm": 600, "tpm": 1_000_000},
+    "glm-4-flash": {"rpm": 600, "tpm": 1_000_000},
+    "glm-4.5-preview": {"rpm": 300, "tpm": 1_000_000},
+    "glm-4.5-air": {"rpm": 600, "tpm": 1_000_000},
+    "glm-4.5-flash": {"rpm": 120, "tpm": 500_000},
+}
+DEFAULT_RATE_LIMIT = {"rpm": 500, "tpm": 200_000}
+MAX_RATE_LIMIT_RETRIES = 8
+# Attempts for a multi-row batch before it is split in bisect mode
+BISECT_RETRIES = 2
+# Follow-up requests for rows the model left out of its response
+MISSING_ROW_ROUNDS = 2
+# Latency observations needed before the hedge threshold is trusted
+HEDGE_MIN_SAMPLES = 5
+# Concurrent hedges without a transport config (the SDK's own pool)
+HEDGE_MAX_IN_FLIGHT = 8
+
 @dataclass
 class UsageStats:
     """Track API usage and costs"""
@@ -45,6 +88,36 @@ class UsageStats:
     rows_processed: int = 0
     batches_processed: int = 0
     errors: int = 0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    rows_deduplicated: int = 0
+    rate_limited: int = 0
+    batches_bisected: int = 0
+    rows_failed: int = 0
+    rows_rerequested: int = 0
+    rows_unanswered: int = 0
+    shaped_rows: int = 0
+    shaped_chars_before: int = 0
+    shaped_chars_after: int = 0
+    rows_fast_path: int = 0
+    rows_similarity: int = 0
+    cached_prompt_tokens: int = 0
+    prefix_cache_savings_usd: float = 0.0
+    streamed_batches: int = 0
+    responses_truncated: int = 0
+    rows_salvaged: int = 0
+    first_result_seconds: float = 0.0
+    hedges_fired: int = 0
+    hedges_won: int = 0
+    hedge_cost_usd: float = 0.0
+    # Workers update the same stats from several threads
+    _lock: Lock = field(default_factory=Lock, repr=False, compare=False)
+    
+    def add(self, **deltas):
+        """Atomically add to one or more counters"""
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
     
     @property
     def cost_per_row(self) -> float:
@@ -56,12 +129,50 @@ class UsageStats:
         """Average cost per row in EUR (approx 0.92 rate)"""
         return self.cost_per_row * 0.92
     
+    @property
+    def tokens_per_row(self) -> float:
+        """Average tokens spent per row sent to the API"""
+        return self.total_tokens / self.rows_processed if self.rows_processed > 0 else 0
+    
+    @property
+    def prompt_tokens_saved_per_row(self) -> float:
+        """Estimated prompt tokens removed by input shaping per row (~4 chars per token)"""
+        if self.shaped_rows == 0:
+            return 0
+        return (self.shaped_chars_before - self.shaped_chars_after) / 4 / self.shaped_rows
+    
+    @property
+    def avg_time_to_first_result(self) -> float:
+        """Mean seconds from request start to the first validated result (streaming)"""
+        return self.first_result_seconds / self.streamed_batches if self.streamed_batches > 0 else 0
+    
+    @property
+    def prefix_cache_hit_rate(self) -> float:
+        """Share of prompt tokens the provider served from its prefix cache"""
+        return self.cached_prompt_tokens / self.prompt_tokens if self.prompt_tokens > 0 else 0
+    
+    @property
+    def cache_hit_rate(self) -> float:
+        """Share of cache lookups answered without an API call"""
+        lookups = self.cache_hits + self.cache_misses
+        return self.cache_hits / lookups if lookups > 0 else 0
+    
     def get_summary(self) -> Dict[str, Any]:
         """Get a summary dict for reporting"""
         return {
             "total_tokens": self.total_tokens,
             "prompt_tokens": self.prompt_tokens,
             "completion_tokens": self.completion_tokens,
+            "cached_prompt_tokens": self.cached_prompt_tokens,
+            "prefix_cache_hit_rate": round(self.prefix_cache_hit_rate, 4),
+            "prefix_cache_savings_usd": round(self.prefix_cache_savings_usd, 4),
+            "streamed_batches": self.streamed_batches,
+            "responses_truncated": self.responses_truncated,
+            "rows_salvaged": self.rows_salvaged,
+            "avg_time_to_first_result_s": round(self.avg_time_to_first_result, 2),
+            "hedges_fired": self.hedges_fired,
+            "hedges_won": self.hedges_won,
+            "hedge_cost_usd": round(self.hedge_cost_usd, 4),
             "total_cost_usd": round(self.total_cost_usd, 4),
             "total_cost_eur": round(self.total_cost_usd * 0.92, 4),
             "rows_processed": self.rows_processed,
@@ -69,6 +180,20 @@ class UsageStats:
             "cost_per_row_eur": round(self.cost_per_row_eur, 6),
             "batches_processed": self.batches_processed,
             "errors": self.errors,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "cache_hit_rate": round(self.cache_hit_rate, 4),
+            "rate_limited": self.rate_limited,
+            "batches_bisected": self.batches_bisected,
+            "rows_failed": self.rows_failed,
+            "rows_rerequested": self.rows_rerequested,
+            "rows_unanswered": self.rows_unanswered,
+            "rows_deduplicated": self.rows_deduplicated,
+            "est_tokens_saved_dedup": int(self.rows_deduplicated * self.tokens_per_row),
+            "rows_fast_path": self.rows_fast_path,
+            "rows_similarity": self.rows_similarity,
+            "shaped_rows": self.shaped_rows,
+            "prompt_tokens_saved_per_row": round(self.prompt_tokens_saved_per_row, 1),
         }
     
     def estimate_cost_for_rows(self, num_rows: int) -> Dict[str, float]:
@@ -82,6 +207,182 @@ class UsageStats:
         }
 
 
+def _cached_tokens(usage) -> int:
+    """Prompt tokens served from the provider prefix cache (usage.prompt_tokens_details.cached_tokens)"""
+    details = getattr(usage, "prompt_tokens_details", None)
+    if isinstance(details, dict):
+        return details.get("cached_tokens") or 0
+    return getattr(details, "cached_tokens", None) or 0
+
+
+def _error_status(error: Exception) -> str:
+    """Label for the errors_total metric: HTTP status, timeout or exception type"""
+    if isinstance(error, json.JSONDecodeError):
+        return "invalid_json"
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if status:
+        return str(status)
+    if "timeout" in type(error).__name__.lower():
+        return "timeout"
+    return type(error).__name__
+
+
+def _parse_duration(value: str) -> Optional[float]:
+    """Parse rate-limit reset values like '1s', '6m0s', '20ms' or plain seconds"""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = re.findall(r"([\d.]+)(ms|h|m|s)", value)
+    if not parts:
+        return None
+    factors = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    return sum(float(num) * factors[unit] for num, unit in parts)
+
+
+def _rate_limit_delay(error: Exception) -> Optional[float]:
+    """Seconds to wait if the error is a 429, else None"""
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    if status != 429:
+        return None
+    headers = getattr(response, "headers", None) or {}
+    delay = _parse_duration(headers.get("retry-after-ms"))
+    if delay is not None:
+        return delay / 1000
+    for header in ("retry-after", "x-ratelimit-reset-requests", "x-ratelimit-reset-tokens"):
+        delay = _parse_duration(headers.get(header))
+        if delay is not None:
+            return delay
+    return 0.0
+
+
+class RateLimiter:
+    """Shared token bucket budgeting requests and tokens per minute.
+
+    All workers of a provider/model draw from the same buckets. 429s pause
+    everyone until Retry-After and lower the effective limits; successful
+    requests slowly restore them.
+    """
+
+    def __init__(self, rpm: int, tpm: int):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.effective_rpm = float(rpm)
+        self.effective_tpm = float(tpm)
+        self.request_level = float(rpm)
+        self.token_level = float(tpm)
+        self.blocked_until = 0.0
+        self.rate_limited = 0
+        self._updated = time.monotonic()
+        self._lock = Lock()
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        self._updated = now
+        self.request_level = min(self.effective_rpm, self.request_level + elapsed * self.effective_rpm / 60)
+        self.token_level = min(self.effective_tpm, self.token_level + elapsed * self.effective_tpm / 60)
+
+    def _reserve(self, tokens: int) -> float:
+        """Take budget for one request, or return how long to wait before trying again"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now < self.blocked_until:
+                return self.blocked_until - now
+            # A single request larger than the bucket would wait forever
+            tokens = min(tokens, self.effective_tpm)
+            if self.request_level >= 1 and self.token_level >= tokens:
+                self.request_level -= 1
+                self.token_level -= tokens
+                return 0.0
+            wait_requests = (1 - self.request_level) * 60 / self.effective_rpm
+            wait_tokens = (tokens - self.token_level) * 60 / self.effective_tpm
+            return max(wait_requests, wait_tokens, 0.01)
+
+    def acquire(self, tokens: int):
+        """Block the calling thread until the request fits into the budget"""
+        while True:
+            wait = self._reserve(tokens)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens: int):
+        """Wait without blocking the event loop until the request fits into the budget"""
+        while True:
+            wait = self._reserve(tokens)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: int):
+        """Correct the token bucket once the real usage is known; counts as a success"""
+        with self._lock:
+            self.token_level = min(self.effective_tpm, self.token_level + estimated_tokens - actual_tokens)
+            # Additive increase back towards the configured limits
+            self.effective_rpm = min(self.rpm, self.effective_rpm + self.rpm * 0.02)
+            self.effective_tpm = min(self.tpm, self.effective_tpm + self.tpm * 0.02)
+
+    def on_rate_limited(self, retry_after: float):
+        """Pause all workers and back off multiplicatively after a 429"""
+        with self._lock:
+            self.rate_limited += 1
+            now = time.monotonic()
+            self.blocked_until = max(self.blocked_until, now + max(retry_after, 1.0))
+            self.effective_rpm = max(self.rpm * 0.1, self.effective_rpm * 0.75)
+            self.effective_tpm = max(self.tpm * 0.1, self.effective_tpm * 0.75)
+            self.request_level = min(self.request_level, 0.0)
+
+    def update_from_headers(self, headers):
+        """Adopt the x-ratelimit-* values the provider reports"""
+        if not headers:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            for kind in ("requests", "tokens"):
+                limit = headers.get(f"x-ratelimit-limit-{kind}")
+                remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+                reset = _parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+                try:
+                    limit = int(limit) if limit is not None else None
+                    remaining = int(remaining) if remaining is not None else None
+                except ValueError:
+                    continue
+                if kind == "requests":
+                    if limit:
+                        self.rpm = limit
+                        self.effective_rpm = min(self.effective_rpm, limit) if self.rate_limited else float(limit)
+                    if remaining is not None:
+                        self.request_level = min(self.request_level, remaining)
+                else:
+                    if limit:
+                        self.tpm = limit
+                        self.effective_tpm = min(self.effective_tpm, limit) if self.rate_limited else float(limit)
+                    if remaining is not None:
+                        self.token_level = min(self.token_level, remaining)
+                if remaining == 0 and reset:
+                    self.blocked_until = max(self.blocked_until, now + reset)
+
+
+_rate_limiters: Dict[tuple, RateLimiter] = {}
+_rate_limiters_lock = Lock()
+
+
+def get_rate_limiter(provider: str, model: str, rpm: Optional[int] = None, tpm: Optional[int] = None) -> RateLimiter:
+    """Process-wide limiter per provider/model, shared by every client and worker"""
+    with _rate_limiters_lock:
+        key = (provider, model)
+        if key not in _rate_limiters:
+            limits = RATE_LIMITS.get(model, DEFAULT_RATE_LIMIT)
+            _rate_limiters[key] = RateLimiter(rpm or limits["rpm"], tpm or limits["tpm"])
+        return _rate_limiters[key]
+
+
 # System prompt with power extraction rules
 SYSTEM_PROMPT = """Du bist ein technischer Experte für Photovoltaik-Komponenten.
 
@@ -145,157 +446,660 @@ Antworte AUSSCHLIESSLICH als valides JSON-Objekt:
 }
 WICHTIG: Erstelle für JEDES Eingabe-Produkt einen Eintrag im `results` Array, auch wenn `is_pv_module` false ist!"""
 
+# Compact output: rows are numbered [1], [2], ... and the model answers with
+# short keys only, no echoed IDs or names. Same rules as SYSTEM_PROMPT.
+COMPACT_OUTPUT_FORMAT = """## AUSGABE-FORMAT
+Jedes Produkt ist mit einer Nummer [n] markiert. Antworte AUSSCHLIESSLICH als valides JSON-Objekt mit kurzen Schlüsseln:
+{{"r": [{{"i": n, "pv": 0|1, "c": Confidence 0.0-1.0{power_keys}{reasoning_key}}}]}}
+{null_hint}WICHTIG: Erstelle für JEDE Nummer einen Eintrag im `r` Array, auch wenn pv 0 ist!"""
+_COMPACT_POWER_KEYS = ', "w": power_watts, "q": quantity, "t": total_power_watts, "s": "module_wp"|"anlage_kwp"|"productcode"'
+_COMPACT_NULL_HINT = "- Felder mit null weglassen (w, q, t, s nur bei Leistungsangaben).\n"
+_POWER_OUTPUT_FIELDS = ("power_watts", "quantity", "total_power_watts", "power_source")
+
+
+def build_compact_prompt(include_reasoning: bool = False, extract_power: bool = True) -> str:
+    """SYSTEM_PROMPT rules with the compact alias-based output format"""
+    rules = SYSTEM_PROMPT.split("## AUSGABE-FORMAT")[0]
+    if not extract_power:
+        rules = _label_only(rules)
+    reasoning_key = ', "why": "Begründung, max 60 Zeichen"' if include_reasoning else ""
+    return rules + COMPACT_OUTPUT_FORMAT.format(
+        power_keys=_COMPACT_POWER_KEYS if extract_power else "",
+        null_hint=_COMPACT_NULL_HINT if extract_power else "",
+        reasoning_key=reasoning_key,
+    )
+
+
+def _label_only(prompt: str) -> str:
+    """Drops the LEISTUNGSEXTRAKTION section; power fields come from src/power.py instead"""
+    head, rest = prompt.split("## LEISTUNGSEXTRAKTION")
+    tail = "## AUSGABE-FORMAT" + rest.split("## AUSGABE-FORMAT")[1] if "## AUSGABE-FORMAT" in rest else ""
+    head = head.replace("Klassifiziere Produkte und extrahiere Leistungsdaten für CO2-Berechnungen.",
+                        "Klassifiziere Produkte.")
+    tail = "\n".join(line for line in tail.splitlines()
+                     if not line.strip().startswith(tuple(f'"{f}"' for f in _POWER_OUTPUT_FIELDS)))
+    # The last field before the removed ones no longer needs its trailing comma
+    tail = tail.replace('(max 100 Zeichen)",\n', '(max 100 Zeichen)"\n')
+    return head + tail
+
+
+# Static worked examples sent after the system prompt. They are identical in every
+# request, so they extend the cacheable prefix (OpenAI caches prompts from 1024 tokens
+# on; SYSTEM_PROMPT alone is ~700) and anchor the edge cases of the rules.
+FEW_SHOT_EXAMPLES = [
+    ({"product_id": "B1", "supply_product_name": "Trina Vertex S+ TSM-445NEG9R.28 445Wp Glas-Glas", "quantity": 20},
+     {"is_pv_module": True, "Confidence": 0.98, "Reasoning": "Glas-Glas Modul mit 445 Wp",
+      "power_watts": 445, "quantity": 20, "total_power_watts": 8900, "power_source": "module_wp"}),
+    ({"product_id": "B2", "supply_product_name": "Balkonkraftwerk 2,0 kWp inkl. Wechselrichter und Speicher", "quantity": 1},
+     {"is_pv_module": True, "Confidence": 0.95, "Reasoning": "Balkonkraftwerk-Set, Gesamtsystem",
+      "power_watts": 2000, "quantity": 1, "total_power_watts": 2000, "power_source": "anlage_kwp"}),
+    ({"product_id": "B3", "supply_product_name": "Hybrid-Wechselrichter 10 kW für PV-Anlage", "quantity": 1},
+     {"is_pv_module": False, "Confidence": 0.97, "Reasoning": "Wechselrichter ist Zubehör"}),
+    ({"product_id": "B4", "supply_service_name": "Montage PV-Module inkl. Gerüstbau", "quantity": 1},
+     {"is_pv_module": False, "Confidence": 0.97, "Reasoning": "Dienstleistung"}),
+    ({"product_id": "B5", "supply_product_name": "Teil einer PV-Anlage", "drafts_description": "Glas-Glas Modul 1755×1038mm"},
+     {"is_pv_module": False, "Confidence": 0.6, "Reasoning": "Nur Teil einer PV-Anlage, kein Modul/Set erkennbar"}),
+]
+
+
+def build_system_prompt(output_schema: str = "full", include_reasoning: bool = False,
+                        extract_power: bool = True) -> str:
+    if output_schema == "compact":
+        return build_compact_prompt(include_reasoning, extract_power)
+    return SYSTEM_PROMPT if extract_power else _label_only(SYSTEM_PROMPT)
+
 
 class LLMClient:
-    def __init__(self, provider: str = "openai", model: str = "gpt-4o-mini"):
+    def __init__(self, provider: str = "openai", model: str = "gpt-4o-mini", cache: Optional[ResultCache] = None,
+                 rate_limiter: Optional[RateLimiter] = None, failure_mode: str = "drop",
+                 shaper: Optional[InputShaper] = None, output_schema: str = "full",
+                 include_reasoning: bool = False, extract_power: bool = True, api_key: Optional[str] = None,
+                 few_shot: bool = False, stream: bool = False,
+                 on_result: Optional[Callable[[ClassificationResult], None]] = None,
+                 metrics: Optional[MetricsRegistry] = None, transport: Optional[TransportConfig] = None,
+                 hedge_percentile: Optional[float] = None, base_url: Optional[str] = None):
         self.provider = provider
         self.model = model
         self.usage = UsageStats()
-        
-        if provider == "openai":
+        self.cache = cache
+        self.rate_limiter = rate_limiter or get_rate_limiter(provider, model)
+        # "drop": a failing batch is lost; "bisect": split it down to the offending rows
+        self.failure_mode = failure_mode
+        self.shaper = shaper
+        # "full": model echoes product_id/name and reasoning; "compact": short row aliases
+        self.output_schema = output_schema
+        # extract_power=False: labels only, power fields are filled locally (src/power.py)
+        self.extract_power = extract_power
+        self.include_reasoning = include_reasoning
+        # stream: parse the result array while it arrives; on_result gets each row as soon as it is valid
+        self.stream = stream
+        self.on_result = on_result
+        self.metrics = metrics or MetricsRegistry()
+        # None keeps the SDK's default connection pool
+        self.transport = transport
+        # Duplicate a request still running past this latency quantile (e.g. 0.95); None disables hedging
+        self.hedge_percentile = hedge_percentile
+        self._hedge_pool: Optional[ThreadPoolExecutor] = None
+        # Hedges may take at most half of the connection pool, the rest stays for primary requests
+        hedge_slots = self.transport.max_connections // 2 if self.transport is not None else HEDGE_MAX_IN_FLIGHT
+        self._hedge_slots = BoundedSemaphore(max(hedge_slots, 1))
+        # OpenAI-compatible endpoint instead of the provider's, e.g. src/mock_server.py
+        self.base_url = base_url
+        self.system_prompt = build_system_prompt(output_schema, include_reasoning, extract_power)
+        # Static message prefix of every request, kept byte-identical for provider prefix caching
+        self.prefix_messages = [{"role": "system", "content": self.system_prompt}]
+        if few_shot:
+            self.prefix_messages += self._few_shot_messages()
+        prompt_source = self.system_prompt + "".join(m["content"] for m in self.prefix_messages[1:])
+        self.prompt_hash = hashlib.sha256(prompt_source.encode("utf-8")).hexdigest()
+        self.client = self._create_client(api_key or self._get_api_key())
+
+    def _get_api_key(self) -> str:
+        if self.base_url:
+            # Local endpoints such as the mock server do not check the key
+            return os.getenv("OPENAI_API_KEY") or "local"
+        if self.provider == "openai":
             api_key = os.getenv("OPENAI_API_KEY")
             if not api_key:
                 raise ValueError("OPENAI_API_KEY not found")
-            # Increase timeout for GPT-5 reasoning models (default is often 60s/600s)
-            self.client = OpenAI(api_key=api_key, timeout=1200.0)
-            print(f"🤖 Initialized OpenAI Client ({model}) with 20min timeout")
-            
-        elif provider == "zhipuai":
-            if ZhipuAI is None:
-                raise ImportError("zhipuai not installed. Run 'pip install zhipuai'")
-            
+            return api_key
+        elif self.provider == "zhipuai":
             # Map user env var to expected key if needed
             api_key = os.getenv("ZHIPUAI_API_KEY") or os.getenv("ZAI_API_KEY")
             if not api_key:
                 raise ValueError("ZHIPUAI_API_KEY (or ZAI_API_KEY) not found")
-                
-            self.client = ZhipuAI(api_key=api_key)
-            print(f"🤖 Initialized ZhipuAI Client ({model})")
-        else:
-            raise ValueError(f"Unknown provider: {provider}")
+            return api_key
+        raise ValueError(f"Unknown provider: {self.provider}")
+
+    def _http_options(self, async_client: bool = False) -> Dict[str, Any]:
+        """SDK client arguments for the configured transport (pool, keep-alive, HTTP/2, timeouts)"""
+        if self.transport is None:
+            # Increase timeout for GPT-5 reasoning models (default is often 60s/600s)
+            return {"timeout": 1200.0}
+        build = self.transport.async_client if async_client else self.transport.sync_client
+        return {"http_client": build(self.metrics, provider=self.provider, model=self.model),
+                "timeout": self.transport.timeout()}
+
+    def _create_client(self, api_key: str):
+        if self.provider == "openai":
+            # SDK-internal retries are off so every 429 reaches the shared rate limiter
+            client = OpenAI(api_key=api_key, base_url=self.base_url, max_retries=0, **self._http_options())
+            print(f"🤖 Initialized OpenAI Client ({self.model}) with 20min timeout"
+                  + (f" at {self.base_url}" if self.base_url else ""))
+            return client
+
+        if ZhipuAI is None:
+            raise ImportError("zhipuai not installed. Run 'pip install zhipuai'")
+        client = ZhipuAI(api_key=api_key, base_url=self.base_url, **self._http_options())
+        print(f"🤖 Initialized ZhipuAI Client ({self.model})")
+        return client
         
-    def _update_usage(self, response, rows_in_batch: int):
-        """Update usage statistics from API response"""
+    def _update_usage(self, response, rows_in_batch: int, discount: float = 1.0, hedge: bool = False):
+        """Update usage statistics from API response (discount: price factor, e.g. batch API).
+
+        hedge=True books the tokens and cost of a losing hedge request as extra spend only.
+        """
         usage = response.usage
-        self.usage.prompt_tokens += usage.prompt_tokens
-        self.usage.completion_tokens += usage.completion_tokens
-        self.usage.total_tokens += usage.total_tokens
-        self.usage.rows_processed += rows_in_batch
-        self.usage.batches_processed += 1
+        cached_tokens = _cached_tokens(usage)
         
-        # Calculate cost
+        # Calculate cost; prefix-cached prompt tokens are billed at the discounted rate
         pricing = PRICING.get(self.model, PRICING["gpt-4o-mini"])
-        cost = (usage.prompt_tokens * pricing["input"]) + \
+        cached_price = pricing.get("cached_input", pricing["input"])
+        cost = ((usage.prompt_tokens - cached_tokens) * pricing["input"]) + \
+               (cached_tokens * cached_price) + \
                (usage.completion_tokens * pricing["output"])
-        self.usage.total_cost_usd += cost
+        self.usage.add(
+            prompt_tokens=usage.prompt_tokens,
+            completion_tokens=usage.completion_tokens,
+            total_tokens=usage.total_tokens,
+            cached_prompt_tokens=cached_tokens,
+            rows_processed=0 if hedge else rows_in_batch,
+            batches_processed=0 if hedge else 1,
+            total_cost_usd=cost * discount,
+            prefix_cache_savings_usd=cached_tokens * (pricing["input"] - cached_price) * discount,
+            hedge_cost_usd=cost * discount if hedge else 0.0,
+        )
+        self.metrics.inc("cost_usd_total", cost * discount, provider=self.provider, model=self.model)
 
-    def classify_batch(self, batch: List[Dict[str, Any]]) -> List[ClassificationResult]:
-        """Classify a batch of products and extract power data"""
+    def _cache_key(self, item: Dict[str, Any]) -> str:
+        return ResultCache.make_key(product_signature(item), self.provider, self.model, self.prompt_hash)
+
+    def split_cached(self, records: List[Dict[str, Any]], count: bool = True) -> tuple:
+        """Answer rows from the result cache before they are batched.
+
+        Returns (cached_results, pending_records); only pending records need an API call.
+        count=False leaves the hit/miss counters to the caller (router lookups over several backends).
+        """
+        if self.cache is None:
+            return [], list(records)
+
+        keys = [self._cache_key(item) for item in records]
+        found = self.cache.get_many(keys)
+
+        cached_results = []
+        pending = []
+        for item, key in zip(records, keys):
+            if key in found:
+                result, source_quantity = found[key]
+                result = rebase_quantity(result, source_quantity, row_quantity(item))
+                cached_results.append(result.model_copy(update={"product_id": str(item.get("product_id"))}))
+            else:
+                pending.append(item)
+
+        if count:
+            self.usage.add(cache_hits=len(cached_results), cache_misses=len(pending))
+        return cached_results, pending
+
+    def _store_in_cache(self, batch: List[Dict[str, Any]], results: List[ClassificationResult]):
+        """Persist validated results, matched back to their input rows by product_id"""
+        if self.cache is None or not results:
+            return
+        by_id = {r.product_id: r for r in results}
+        entries = []
+        for item in batch:
+            result = by_id.get(str(item.get("product_id")))
+            if result is not None:
+                entries.append((self._cache_key(item), result, row_quantity(item)))
+        self.cache.put_many(entries)
+
+    def _few_shot_messages(self) -> List[Dict[str, str]]:
+        """FEW_SHOT_EXAMPLES as a user/assistant exchange in this client's output schema"""
+        rows = [row for row, _ in FEW_SHOT_EXAMPLES]
+        power_fields = ("power_watts", "quantity", "total_power_watts", "power_source")
+        answers = []
+        for alias, (row, expected) in enumerate(FEW_SHOT_EXAMPLES, 1):
+            power = {k: expected.get(k) for k in power_fields} if self.extract_power else {}
+            if self.output_schema == "compact":
+                short = {"i": alias, "pv": int(expected["is_pv_module"]), "c": expected["Confidence"]}
+                short.update({key: power[col] for key, col in zip(("w", "q", "t", "s"), power_fields)
+                              if power.get(col) is not None})
+                if self.include_reasoning:
+                    short["why"] = expected["Reasoning"]
+                answers.append(short)
+            else:
+                name = row.get("supply_product_name") or row.get("supply_service_name")
+                answers.append({"product_id": row["product_id"], "product_name": name[:50],
+                                "is_pv_module": expected["is_pv_module"], "Confidence": expected["Confidence"],
+                                "Reasoning": expected["Reasoning"], **power})
+        if self.output_schema == "compact":
+            content = json.dumps({"r": answers}, ensure_ascii=False, separators=(",", ":"))
+        else:
+            content = json.dumps({"results": answers}, ensure_ascii=False)
+        return [{"role": "user", "content": self._build_user_prompt(rows, track_shaping=False)},
+                {"role": "assistant", "content": content}]
+
+    def _build_user_prompt(self, batch: List[Dict[str, Any]], track_shaping: bool = True) -> str:
         # Prepare content: show all fields as context
         products_text = ""
         # Columns to exclude from the LLM input to prevent leakage
         excluded_cols = {'is_pv_module', 'Confidence', 'Reasoning', 'power_watts', 'total_power_watts', 'power_source'}
         
-        for item in batch:
+        if self.output_schema == "compact":
+            # Rows are addressed by their position, the ID is mapped back locally
+            excluded_cols = excluded_cols | {'product_id'}
+        
+        for alias, item in enumerate(batch, 1):
             # Convert item dict to a string representation, filtering out None/NaN and excluded columns
             item_data = {k: v for k, v in item.items() 
                          if pd.notnull(v) and k not in excluded_cols}
             
             item_str = ", ".join([f"{k}: {v}" for k, v in item_data.items()])
-            products_text += f"- {item_str}\n"
+            if self.shaper is not None:
+                shaped_str = ", ".join([f"{k}: {v}" for k, v in self.shaper.shape(item_data).items()])
+                if track_shaping:
+                    self.usage.add(shaped_rows=1, shaped_chars_before=len(item_str),
+                                   shaped_chars_after=len(shaped_str))
+                item_str = shaped_str
+            if self.output_schema == "compact":
+                products_text += f"[{alias}] {item_str}\n"
+            else:
+                products_text += f"- {item_str}\n"
+        
+        return f"Analysiere folgende Produkte und gib das JSON zurück:\n{products_text}"
+
+    def _build_request(self, batch: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Chat-completion arguments for a batch"""
+        kwargs = {
+            "model": self.model,
+            # Static prefix first, the batch last: only the final message differs between requests
+            "messages": self.prefix_messages + [
+                {"role": "user", "content": self._build_user_prompt(batch)}
+            ],
+            "response_format": {"type": "json_object"},
+        }
+        
+        # Reasoning models (o1, gpt-5) do not support temperature
+        if "o1" in self.model or "gpt-5" in self.model:
+            pass # Temp not supported
+        else:
+            kwargs["temperature"] = 0.1
+        
+        # GPT-5 Series: Set appropriate max_completion_tokens
+        # Without this, batches may truncate or timeout
+        if "gpt-5" in self.model:
+            if "gpt-5.2" in self.model:
+                kwargs["max_completion_tokens"] = 16384  # 16k for flagship
+            else:  # gpt-5-mini
+                kwargs["max_completion_tokens"] = 8192   # 8k for mini
+        return kwargs
+
+    def _estimate_tokens(self, kwargs: Dict[str, Any], rows: int) -> int:
+        """Rough token budget for a request (prompt chars / 4 plus the completion reserve)"""
+        prompt_chars = sum(len(m["content"]) for m in kwargs["messages"])
+        return prompt_chars // 4 + kwargs.get("max_completion_tokens", 100 * rows)
+
+    def _create_completion(self, kwargs: Dict[str, Any]):
+        """Send the request, reading rate-limit headers when the SDK exposes them"""
+        completions = self.client.chat.completions
+        raw_api = getattr(completions, "with_raw_response", None)
+        if raw_api is None:
+            return completions.create(**kwargs)
+        raw = raw_api.create(**kwargs)
+        self.rate_limiter.update_from_headers(raw.headers)
+        return raw.parse()
+
+    def _hedge_delay(self) -> Optional[float]:
+        """Seconds after which a still-running request gets a duplicate, None if hedging is off"""
+        if self.hedge_percentile is None or self.stream:
+            return None
+        delay, samples = self.metrics.quantile("request_latency_seconds", self.hedge_percentile,
+                                               provider=self.provider, model=self.model)
+        return delay if samples >= HEDGE_MIN_SAMPLES else None
+
+    def _account_hedge_loser(self, future, rows: int):
+        """A request that lost the race still costs money once it completes"""
+        if future.cancelled() or future.exception() is not None:
+            return
+        self._update_usage(future.result(), rows, hedge=True)
+
+    def _fetch_response(self, kwargs: Dict[str, Any], batch: List[Dict[str, Any]], estimated_tokens: int):
+        """_create_completion, hedged with a duplicate once the request outlives the hedge threshold.
+
+        The first successful response wins; the other request is left to finish
+        in the background and only its cost is booked.
+        """
+        delay = self._hedge_delay()
+        if delay is None:
+            return self._create_completion(kwargs)
+        if self._hedge_pool is None:
+            # Every in-flight request may have a primary and a hedge running
+            workers = 2 * (self.transport.max_connections if self.transport is not None else 16)
+            self._hedge_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hedge")
+        primary = self._hedge_pool.submit(self._create_completion, kwargs)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+
+        if not self._hedge_slots.acquire(blocking=False):
+            # Every hedge slot is busy: no duplicate, wait for the primary
+            return primary.result()
+        self.rate_limiter.acquire(estimated_tokens)
+        hedge = self._hedge_pool.submit(self._create_completion, kwargs)
+        hedge.add_done_callback(lambda f: self._hedge_slots.release())
+        self.usage.add(hedges_fired=1)
+        pending = {primary, hedge}
+        first_error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    first_error = first_error or future.exception()
+                    continue
+                for loser in pending:
+                    loser.add_done_callback(lambda f: self._account_hedge_loser(f, len(batch)))
+                if future is hedge:
+                    self.usage.add(hedges_won=1)
+                return future.result()
+        raise first_error
+
+    def _metric_labels(self, batch: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return {"provider": self.provider, "model": self.model, "batch_size": len(batch)}
+
+    def _record_request(self, batch: List[Dict[str, Any]], started: float, usage,
+                        first_token_at: Optional[float] = None):
+        """Per-request latency, throughput and (streaming) time-to-first-token"""
+        latency = time.perf_counter() - started
+        labels = self._metric_labels(batch)
+        self.metrics.inc("requests_total", **labels)
+        self.metrics.observe("request_latency_seconds", latency, **labels)
+        if first_token_at is not None:
+            self.metrics.observe("time_to_first_token_seconds", first_token_at - started, **labels)
+        if latency > 0:
+            self.metrics.observe("rows_per_second", len(batch) / latency, RATE_BUCKETS, **labels)
+            self.metrics.observe("completion_tokens_per_second", usage.completion_tokens / latency,
+                                 RATE_BUCKETS, **labels)
+
+    def _record_failure(self, batch: List[Dict[str, Any]], error: Exception, retried: bool):
+        status = _error_status(error)
+        labels = self._metric_labels(batch)
+        self.metrics.inc("errors_total", status=status, **labels)
+        if retried:
+            self.metrics.inc("retries_total", reason=status, **labels)
+
+    def _handle_rate_limit(self, error: Exception, rate_limit_retries: int) -> Optional[float]:
+        """Register a 429 with the shared limiter; returns the pause or None if not retryable"""
+        delay = _rate_limit_delay(error)
+        if delay is None or rate_limit_retries >= MAX_RATE_LIMIT_RETRIES:
+            return None
+        self.usage.add(rate_limited=1)
+        self.rate_limiter.on_rate_limited(delay)
+        print(f"⏳ Rate Limit ({self.model}): alle Worker pausieren {max(delay, 1.0):.1f}s...")
+        return delay
+
+    def _parse_response(self, response, batch: List[Dict[str, Any]]) -> List[ClassificationResult]:
+        """Account usage, then validate the JSON content into results"""
+        # Update usage stats
+        self._update_usage(response, len(batch))
+        
+        content = response.choices[0].message.content
+        if not content:
+            print(f"❌ Empty response content from API for batch")
+            raise ValueError("Empty response from API")
+        return self._parse_content(content, batch)
+
+    def _parse_content(self, content: str, batch: List[Dict[str, Any]]) -> List[ClassificationResult]:
+        """Validate the JSON response body into results for the given batch"""
+        data = json.loads(content)
+        key = self._result_key
+        results_data = data.get(key, [])
         
-        user_prompt = f"Analysiere folgende Produkte und gib das JSON zurück:\n{products_text}"
+        if not results_data:
+            print(f"⚠️ No '{key}' found in JSON. Content: {content[:500]}...")
+        
+        parsed_results = [res for res in (self._validate_item(item, batch) for item in results_data)
+                          if res is not None]
+        
+        self._store_in_cache(batch, parsed_results)
+        return parsed_results
+
+    @property
+    def _result_key(self) -> str:
+        return "r" if self.output_schema == "compact" else "results"
+
+    def _validate_item(self, item: Dict[str, Any], batch: List[Dict[str, Any]]) -> Optional[ClassificationResult]:
+        """Validate one result object with Pydantic; None (and an error count) if invalid"""
+        try:
+            if self.output_schema == "compact":
+                item = self._expand_compact(item, batch)
+            return ClassificationResult(**{**item, "classified_by": self.model})
+        except Exception as e:
+            print(f"⚠️ Validation error for item {item.get('product_id', item.get('i', 'unknown'))}: {e}")
+            self.usage.add(errors=1)
+            self.metrics.inc("errors_total", status="validation", provider=self.provider, model=self.model)
+            return None
+
+    def _stream_request(self, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        kwargs = {**kwargs, "stream": True}
+        if self.provider == "openai":
+            # Usage arrives in a final chunk without choices
+            kwargs["stream_options"] = {"include_usage": True}
+        return kwargs
+
+    def _collect_chunk(self, collector: StreamCollector, chunk, batch: List[Dict[str, Any]],
+                       results: List[ClassificationResult], started: float):
+        """Validate the result objects a stream chunk completes and hand them out immediately"""
+        for item in collector.add(chunk):
+            res = self._validate_item(item, batch)
+            if res is None:
+                continue
+            if not results:
+                self.usage.add(first_result_seconds=time.perf_counter() - started)
+            results.append(res)
+            if self.on_result is not None:
+                self.on_result(res)
+
+    def _finish_stream(self, collector: StreamCollector, kwargs: Dict[str, Any], batch: List[Dict[str, Any]],
+                       results: List[ClassificationResult], estimated_tokens: int,
+                       started: float) -> List[ClassificationResult]:
+        """Usage accounting and truncation handling once a stream has ended.
+
+        Rows finished before a truncation are kept; the rest are missing from
+        the result and go back out through the missing-row follow-up.
+        """
+        usage = collector.usage
+        if usage is None:
+            # Provider sent no usage chunk: ~4 chars per token
+            prompt_tokens = sum(len(m["content"]) for m in kwargs["messages"]) // 4
+            completion_tokens = len(collector.content) // 4
+            usage = SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                                    total_tokens=prompt_tokens + completion_tokens)
+        self._update_usage(SimpleNamespace(usage=usage), len(batch))
+        self.rate_limiter.record_usage(estimated_tokens, usage.total_tokens)
+        self._record_request(batch, started, usage, collector.first_content_at)
+        self.usage.add(streamed_batches=1)
+
+        if collector.truncated:
+            self.usage.add(responses_truncated=1, rows_salvaged=len(results))
+            print(f"✂️  Antwort abgeschnitten ({collector.finish_reason or 'Stream-Ende'}): "
+                  f"{len(results)} Zeilen behalten, {len(batch) - len(results)} erneut angefragt")
+        elif not results:
+            if not collector.content:
+                raise ValueError("Empty response from API")
+            # Unparseable answer without a result array: same retry path as non-streamed JSON errors
+            json.loads(collector.content)
+            print(f"⚠️ No '{self._result_key}' found in JSON. Content: {collector.content[:500]}...")
 
-        retries = 3
-        for attempt in range(retries):
+        self._store_in_cache(batch, results)
+        return results
+
+    def _stream_batch(self, kwargs: Dict[str, Any], batch: List[Dict[str, Any]],
+                      estimated_tokens: int) -> List[ClassificationResult]:
+        kwargs = self._stream_request(kwargs)
+        collector = StreamCollector(self._result_key)
+        results = []
+        started = time.perf_counter()
+        for chunk in self.client.chat.completions.create(**kwargs):
+            self._collect_chunk(collector, chunk, batch, results, started)
+        return self._finish_stream(collector, kwargs, batch, results, estimated_tokens, started)
+
+    @staticmethod
+    def _expand_compact(item: Dict[str, Any], batch: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Map a compact result ({"i": 3, "pv": 1, ...}) back onto its input row"""
+        alias = int(item["i"])
+        if not 1 <= alias <= len(batch):
+            raise ValueError(f"Unknown row alias {alias}")
+        row = batch[alias - 1]
+        name = next((str(row[col]) for col in ("product_name", "supply_product_name", "supply_service_name")
+                     if col in row and pd.notnull(row[col])), "")
+        return {
+            "product_id": str(row.get("product_id")),
+            "product_name": name[:50],
+            "is_pv_module": item["pv"],
+            "Confidence": item["c"],
+            "Reasoning": item.get("why", ""),
+            "power_watts": item.get("w"),
+            "quantity": item.get("q"),
+            "total_power_watts": item.get("t"),
+            "power_source": item.get("s"),
+        }
+
+    def _split_failed_batch(self, batch: List[Dict[str, Any]], error: Exception) -> Optional[tuple]:
+        """Halves of a failed batch, or None (after recording the loss) for a single row"""
+        if len(batch) == 1:
+            self.usage.add(rows_failed=1)
+            print(f"❌ Produkt {batch[0].get('product_id')} übersprungen: {error}")
+            return None
+        self.usage.add(batches_bisected=1)
+        mid = len(batch) // 2
+        print(f"✂️  Batch mit {len(batch)} Zeilen fehlgeschlagen ({error}), teile in {mid} + {len(batch) - mid}")
+        return batch[:mid], batch[mid:]
+
+    def _reconcile(self, batch: List[Dict[str, Any]], results: List[ClassificationResult],
+                   failed: List[Dict[str, Any]]) -> tuple:
+        """Match results to input rows: drop unknown IDs, return (results, missing_rows).
+
+        Rows the failure mode already gave up on are not counted as missing.
+        """
+        input_ids = {str(item.get("product_id")) for item in batch}
+        kept = [r for r in results if r.product_id in input_ids]
+        if len(kept) < len(results):
+            print(f"⚠️ {len(results) - len(kept)} Ergebnisse mit unbekannter product_id verworfen")
+        done = {r.product_id for r in kept} | {str(item.get("product_id")) for item in failed}
+        missing = [item for item in batch if str(item.get("product_id")) not in done]
+        return kept, missing
+
+    def _log_missing(self, missing: List[Dict[str, Any]], round_num: int):
+        if round_num < MISSING_ROW_ROUNDS:
+            self.usage.add(rows_rerequested=len(missing))
+            print(f"🔁 {len(missing)} Zeilen fehlen in der Antwort, sende sie erneut...")
+        else:
+            self.usage.add(rows_unanswered=len(missing))
+            print(f"⚠️ {len(missing)} Zeilen auch nach {MISSING_ROW_ROUNDS} Nachforderungen ohne Ergebnis")
+
+    def classify_batch(self, batch: List[Dict[str, Any]]) -> List[ClassificationResult]:
+        """Classify a batch of products and extract power data.
+
+        Rows missing from the response (or failing validation) are re-sent as
+        a smaller follow-up batch and merged in.
+        """
+        failed = []
+        results, missing = self._reconcile(batch, self._classify_once(batch, failed), failed)
+        for round_num in range(MISSING_ROW_ROUNDS + 1):
+            if not missing:
+                break
+            self._log_missing(missing, round_num)
+            if round_num == MISSING_ROW_ROUNDS:
+                break
+            follow_up, missing = self._reconcile(missing, self._classify_once(missing, failed), failed)
+            results.extend(follow_up)
+        return results
+
+    def _classify_once(self, batch: List[Dict[str, Any]], failed: List[Dict[str, Any]]) -> List[ClassificationResult]:
+        """One pass over the batch, applying the configured failure mode.
+
+        Rows given up on in bisect mode are appended to `failed`.
+        """
+        if self.failure_mode != "bisect":
+            return self._request_batch(batch)
+        try:
+            return self._request_batch(batch, retries=3 if len(batch) == 1 else BISECT_RETRIES)
+        except Exception as e:
+            halves = self._split_failed_batch(batch, e)
+            if halves is None:
+                failed.extend(batch)
+                return []
+            return self._classify_once(halves[0], failed) + self._classify_once(halves[1], failed)
+
+    def _request_batch(self, batch: List[Dict[str, Any]], retries: int = 3) -> List[ClassificationResult]:
+        """Send one batch with retries; raises once the retries are used up"""
+        kwargs = self._build_request(batch)
+        estimated_tokens = self._estimate_tokens(kwargs, len(batch))
+
+        attempt = 0
+        rate_limit_retries = 0
+        while attempt < retries:
+            # All workers share the limiter, so they throttle together
+            self.rate_limiter.acquire(estimated_tokens)
+            started = time.perf_counter()
             try:
-                # Prepare arguments
-                kwargs = {
-                    "model": self.model,
-                    "messages": [
-                        {"role": "system", "content": SYSTEM_PROMPT},
-                        {"role": "user", "content": user_prompt}
-                    ],
-                    "response_format": {"type": "json_object"},
-                }
-                
-                # Reasoning models (o1, gpt-5) do not support temperature
-                if "o1" in self.model or "gpt-5" in self.model:
-                    pass # Temp not supported
-                else:
-                    kwargs["temperature"] = 0.1
-                
-                # GPT-5 Series: Set appropriate max_completion_tokens
-                # Without this, batches may truncate or timeout
-                if "gpt-5" in self.model:
-                    if "gpt-5.2" in self.model:
-                        kwargs["max_completion_tokens"] = 16384  # 16k for flagship
-                    else:  # gpt-5-mini
-                        kwargs["max_completion_tokens"] = 8192   # 8k for mini
-
-                response = self.client.chat.completions.create(**kwargs)
-                
-                if hasattr(response, 'usage'):
-                   # print(f"DEBUG USAGE: {response.usage}")
-                   pass
-                
-                # Update usage stats
-                self._update_usage(response, len(batch))
-                
-                content = response.choices[0].message.content
-                if not content:
-                    print(f"❌ Empty response content from API for batch")
-                    raise ValueError("Empty response from API")
-                
-                # DEBUG: Print content preview
-                # print(f"DEBUG Response: {content[:100]}...")
-
-                data = json.loads(content)
-                results_data = data.get("results", [])
-                
-                if not results_data:
-                    print(f"⚠️ No 'results' found in JSON. Content: {content[:500]}...")
-                
-                parsed_results = []
-                for item in results_data:
-                    # Validate with Pydantic
-                    try:
-                        res = ClassificationResult(**item)
-                        parsed_results.append(res)
-                    except Exception as e:
-                        print(f"⚠️ Validation error for item {item.get('product_id', 'unknown')}: {e}")
-                        self.usage.errors += 1
-                        
-                return parsed_results
+                if self.stream:
+                    return self._stream_batch(kwargs, batch, estimated_tokens)
+                response = self._fetch_response(kwargs, batch, estimated_tokens)
+                self._record_request(batch, started, response.usage)
+                self.rate_limiter.record_usage(estimated_tokens, response.usage.total_tokens)
+                return self._parse_response(response, batch)
 
             except json.JSONDecodeError as e:
                 print(f"JSON Error: {e}. Retrying...")
-                self.usage.errors += 1
+                self.usage.add(errors=1)
+                self._record_failure(batch, e, retried=attempt < retries - 1)
                 if attempt == retries - 1:
                     raise e
                 time.sleep(1)
             except Exception as e:
+                # 429s wait in the limiter and don't use up the normal retries
+                if self._handle_rate_limit(e, rate_limit_retries) is not None:
+                    self._record_failure(batch, e, retried=True)
+                    rate_limit_retries += 1
+                    continue
                 # Retry logic with exponential backoff
+                self._record_failure(batch, e, retried=attempt < retries - 1)
                 if attempt == retries - 1:
-                    self.usage.errors += 1
+                    self.usage.add(errors=1)
                     raise e
                 wait_time = 2 ** attempt
                 print(f"API Error: {e}. Retrying in {wait_time}s...")
                 time.sleep(wait_time)
+            attempt += 1
                  
         return []
     
-    def get_usage_report(self) -> str:
-        """Get a formatted usage report"""
+    def get_usage_report(self, label: Optional[str] = None) -> str:
+        """Get a formatted usage report (label replaces the model name, e.g. for the router)"""
         stats = self.usage.get_summary()
         report = f"""
 ╔══════════════════════════════════════════════════════════════╗
 ║                     API USAGE REPORT                         ║
 ╠══════════════════════════════════════════════════════════════╣
-║  Model:              {self.model:<39} ║
+║  Model:              {(label or self.model)[:39]:<39} ║
 ║  Rows Processed:     {stats['rows_processed']:<39} ║
 ║  Batches Processed:  {stats['batches_processed']:<39} ║
 ║  Errors:             {stats['errors']:<39} ║
+║  Rate Limited (429): {stats['rate_limited']:<39} ║
+║  Batches Bisected:   {stats['batches_bisected']:<39} ║
+║  Rows Failed:        {stats['rows_failed']:<39} ║
+║  Rows Re-requested:  {stats['rows_rerequested']:<39} ║
+║  Rows Unanswered:    {stats['rows_unanswered']:<39} ║
 ╠══════════════════════════════════════════════════════════════╣
 ║  TOKENS                                                      ║
 ║  ├─ Prompt:          {stats['prompt_tokens']:<39} ║
@@ -315,6 +1119,213 @@ class LLMClient:
             est = self.usage.estimate_cost_for_rows(num_rows)
             report += f"\n║  ├─ {num_rows:,} rows:       ${est['estimated_usd']:<10} (€{est['estimated_eur']}){'':>16} ║"
         
+        if stats['cached_prompt_tokens']:
+            prefix_rate = f"{stats['prefix_cache_hit_rate']*100:.1f}%"
+            report += f"""
+╠══════════════════════════════════════════════════════════════╣
+║  PROMPT PREFIX CACHE (provider)                              ║
+║  ├─ Cached Tokens:   {stats['cached_prompt_tokens']:<39} ║
+║  ├─ Hit Ratio:       {prefix_rate:<39} ║
+║  └─ Saved (USD):     ${stats['prefix_cache_savings_usd']:<38} ║"""
+        
+        if stats['streamed_batches']:
+            first_result = f"{stats['avg_time_to_first_result_s']}s"
+            report += f"""
+╠══════════════════════════════════════════════════════════════╣
+║  STREAMING                                                   ║
+║  ├─ Streamed Batches: {stats['streamed_batches']:<38} ║
+║  ├─ Truncated:       {stats['responses_truncated']:<39} ║
+║  ├─ Rows Salvaged:   {stats['rows_salvaged']:<39} ║
+║  └─ First Result:    ~{first_result:<38} ║"""
+        
+        if stats['hedges_fired']:
+            report += f"""
+╠══════════════════════════════════════════════════════════════╣
+║  HEDGED REQUESTS                                             ║
+║  ├─ Hedges Fired:    {stats['hedges_fired']:<39} ║
+║  ├─ Hedges Won:      {stats['hedges_won']:<39} ║
+║  └─ Extra Cost (USD): ${stats['hedge_cost_usd']:<37} ║"""
+        
+        if self.cache is not None:
+            hit_rate = f"{stats['cache_hit_rate']*100:.1f}%"
+            report += f"""
+╠══════════════════════════════════════════════════════════════╣
+║  RESULT CACHE                                                ║
+║  ├─ Hits:            {stats['cache_hits']:<39} ║
+║  ├─ Misses:          {stats['cache_misses']:<39} ║
+║  └─ Hit Rate:        {hit_rate:<39} ║"""
+        
+        if stats['rows_fast_path']:
+            report += f"""
+╠══════════════════════════════════════════════════════════════╣
+║  RULE-BASED FAST PATH                                        ║
+║  └─ Rows Decided:    {stats['rows_fast_path']:<39} ║"""
+
+        if stats['rows_similarity']:
+            report += f"""
+╠══════════════════════════════════════════════════════════════╣
+║  SIMILARITY REUSE                                            ║
+║  └─ Rows Reused:     {stats['rows_similarity']:<39} ║"""
+        
+        if stats['shaped_rows']:
+            report += f"""
+╠══════════════════════════════════════════════════════════════╣
+║  INPUT SHAPING                                               ║
+║  ├─ Rows Shaped:     {stats['shaped_rows']:<39} ║
+║  └─ Tokens Saved/Row: ~{stats['prompt_tokens_saved_per_row']:<37} ║"""
+        
+        if stats['rows_deduplicated']:
+            report += f"""
+╠══════════════════════════════════════════════════════════════╣
+║  DEDUPLICATION                                               ║
+║  ├─ Rows Reused:     {stats['rows_deduplicated']:<39} ║
+║  └─ Tokens Saved:    ~{stats['est_tokens_saved_dedup']:<38} ║"""
+        
         report += """
 ╚══════════════════════════════════════════════════════════════╝"""
         return report
+
+
+class AsyncLLMClient(LLMClient):
+    """asyncio variant of LLMClient for the async engine.
+
+    Uses AsyncOpenAI for both providers (ZhipuAI through its OpenAI-compatible
+    endpoint), so hundreds of requests can be in flight on a single thread.
+    """
+
+    def _create_client(self, api_key: str):
+        options = self._http_options(async_client=True)
+        if self.provider == "openai":
+            client = AsyncOpenAI(api_key=api_key, base_url=self.base_url, max_retries=0, **options)
+            print(f"🤖 Initialized async OpenAI Client ({self.model}) with 20min timeout")
+        else:
+            client = AsyncOpenAI(api_key=api_key, base_url=self.base_url or ZHIPUAI_BASE_URL, max_retries=0, **options)
+            print(f"🤖 Initialized async ZhipuAI Client ({self.model})")
+        return client
+
+    async def _create_completion(self, kwargs: Dict[str, Any]):
+        completions = self.client.chat.completions
+        raw_api = getattr(completions, "with_raw_response", None)
+        if raw_api is None:
+            return await completions.create(**kwargs)
+        raw = await raw_api.create(**kwargs)
+        self.rate_limiter.update_from_headers(raw.headers)
+        return await raw.parse()
+
+    async def _fetch_response(self, kwargs: Dict[str, Any], batch: List[Dict[str, Any]], estimated_tokens: int):
+        """Hedged request on the event loop: the losing request is cancelled.
+
+        A cancelled request has usually been billed for its prompt already, so
+        the estimated prompt cost is booked as hedge cost.
+        """
+        delay = self._hedge_delay()
+        if delay is None:
+            return await self._create_completion(kwargs)
+        primary = asyncio.ensure_future(self._create_completion(kwargs))
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+
+        if not self._hedge_slots.acquire(blocking=False):
+            return await primary
+        await self.rate_limiter.acquire_async(estimated_tokens)
+        hedge = asyncio.ensure_future(self._create_completion(kwargs))
+        hedge.add_done_callback(lambda t: self._hedge_slots.release())
+        self.usage.add(hedges_fired=1)
+        pending = {primary, hedge}
+        first_error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    first_error = first_error or task.exception()
+                    continue
+                for loser in pending:
+                    loser.cancel()
+                    # Booked like any other usage, so cost_usd_total matches the usage report
+                    prompt_tokens = sum(len(m["content"]) for m in kwargs["messages"]) // 4
+                    estimate = SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=0,
+                                               total_tokens=prompt_tokens)
+                    self._update_usage(SimpleNamespace(usage=estimate), len(batch), hedge=True)
+                if task is hedge:
+                    self.usage.add(hedges_won=1)
+                return task.result()
+        raise first_error
+
+    async def _stream_batch(self, kwargs: Dict[str, Any], batch: List[Dict[str, Any]],
+                            estimated_tokens: int) -> List[ClassificationResult]:
+        kwargs = self._stream_request(kwargs)
+        collector = StreamCollector(self._result_key)
+        results = []
+        started = time.perf_counter()
+        async for chunk in await self.client.chat.completions.create(**kwargs):
+            self._collect_chunk(collector, chunk, batch, results, started)
+        return self._finish_stream(collector, kwargs, batch, results, estimated_tokens, started)
+
+    async def classify_batch(self, batch: List[Dict[str, Any]]) -> List[ClassificationResult]:
+        """Classify a batch of products and extract power data"""
+        failed = []
+        results, missing = self._reconcile(batch, await self._classify_once(batch, failed), failed)
+        for round_num in range(MISSING_ROW_ROUNDS + 1):
+            if not missing:
+                break
+            self._log_missing(missing, round_num)
+            if round_num == MISSING_ROW_ROUNDS:
+                break
+            follow_up, missing = self._reconcile(missing, await self._classify_once(missing, failed), failed)
+            results.extend(follow_up)
+        return results
+
+    async def _classify_once(self, batch: List[Dict[str, Any]], failed: List[Dict[str, Any]]) -> List[ClassificationResult]:
+        if self.failure_mode != "bisect":
+            return await self._request_batch(batch)
+        try:
+            return await self._request_batch(batch, retries=3 if len(batch) == 1 else BISECT_RETRIES)
+        except Exception as e:
+            halves = self._split_failed_batch(batch, e)
+            if halves is None:
+                failed.extend(batch)
+                return []
+            first, second = await asyncio.gather(self._classify_once(halves[0], failed),
+                                                 self._classify_once(halves[1], failed))
+            return first + second
+
+    async def _request_batch(self, batch: List[Dict[str, Any]], retries: int = 3) -> List[ClassificationResult]:
+        kwargs = self._build_request(batch)
+        estimated_tokens = self._estimate_tokens(kwargs, len(batch))
+
+        attempt = 0
+        rate_limit_retries = 0
+        while attempt < retries:
+            await self.rate_limiter.acquire_async(estimated_tokens)
+            started = time.perf_counter()
+            try:
+                if self.stream:
+                    return await self._stream_batch(kwargs, batch, estimated_tokens)
+                response = await self._fetch_response(kwargs, batch, estimated_tokens)
+                self._record_request(batch, started, response.usage)
+                self.rate_limiter.record_usage(estimated_tokens, response.usage.total_tokens)
+                return self._parse_response(response, batch)
+
+            except json.JSONDecodeError as e:
+                print(f"JSON Error: {e}. Retrying...")
+                self.usage.add(errors=1)
+                self._record_failure(batch, e, retried=attempt < retries - 1)
+                if attempt == retries - 1:
+                    raise e
+                await asyncio.sleep(1)
+            except Exception as e:
+                if self._handle_rate_limit(e, rate_limit_retries) is not None:
+                    self._record_failure(batch, e, retried=True)
+                    rate_limit_retries += 1
+                    continue
+                self._record_failure(batch, e, retried=attempt < retries - 1)
+                if attempt == retries - 1:
+                    self.usage.add(errors=1)
+                    raise e
+                wait_time = 2 ** attempt
+                print(f"API Error: {e}. Retrying in {wait_time}s...")
+                await asyncio.sleep(wait_time)
+            attempt += 1
+
+        return []
@@ -0,0 +1,206 @@
+"""Shared CSV/Parquet loader for exports, outputs and ground-truth files"""
+import csv
+import importlib.util
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Union
+
+import pandas as pd
+
+# Bytes read to detect the layout
+SAMPLE_BYTES = 64 * 1024
+DELIMITERS = (";", ",", "\t", "|")
+# Read as text: numeric-looking IDs must not turn into floats ("271093.0") or lose leading zeros
+ID_COLUMNS = ("account_id", "customer_document_id", "company_id", "product_id", "service_id", "ean")
+OUTPUT_FORMATS = ("csv", "parquet", "both")
+PARQUET_SUFFIXES = (".parquet", ".pq")
+# Nullable dtypes of the result columns: a missing power_watts stays <NA> instead of turning the column into floats
+RESULT_DTYPES = {"is_pv_module": "Int8", "Confidence": "Float64", "power_watts": "Int64", "quantity": "Int64",
+                 "total_power_watts": "Int64", "cascade_stage": "Int64"}
+
+
+@dataclass
+class CSVLayout:
+    """Delimiter, title lines to skip and header of a CSV file"""
+    delimiter: str
+    skiprows: int
+    columns: List[str]
+
+
+def sniff_layout(path: Union[str, Path]) -> CSVLayout:
+    with open(path, "rb") as f:
+        sample = f.read(SAMPLE_BYTES).decode("utf-8-sig", errors="ignore")
+    lines = sample.splitlines()
+    # Exports from Numbers/Excel start with a "Tabelle 1" title line
+    skiprows = 1 if lines and "Tabelle" in lines[0] else 0
+    header = lines[skiprows] if len(lines) > skiprows else ""
+    # Column names carry no delimiters, so the header line decides
+    delimiter = max(DELIMITERS, key=header.count)
+    if not header.count(delimiter):
+        delimiter = ","
+    columns = next(csv.reader([header], delimiter=delimiter), []) if header else []
+    return CSVLayout(delimiter=delimiter, skiprows=skiprows, columns=[c.strip() for c in columns])
+
+
+def pyarrow_available() -> bool:
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def _require_pyarrow():
+    if not pyarrow_available():
+        raise ImportError("Parquet needs pyarrow (pip install pyarrow)")
+
+
+def is_parquet(path: Union[str, Path]) -> bool:
+    return Path(path).suffix.lower() in PARQUET_SUFFIXES
+
+
+def read_table(path: Union[str, Path], usecols: Optional[Sequence[str]] = None,
+               dtype: Optional[Dict[str, object]] = None, chunksize: Optional[int] = None,
+               engine: str = "c", layout: Optional[CSVLayout] = None):
+    """pd.read_csv with the sniffed layout; returns a DataFrame, or a reader of chunks with `chunksize`.
+
+    `usecols` may name columns the file lacks; they are skipped. The pyarrow
+    engine falls back to C when it is not installed or chunks are requested.
+    """
+    layout = layout or sniff_layout(path)
+    if engine == "pyarrow" and (chunksize or not pyarrow_available()):
+        engine = "c"
+    dtypes = {c: str for c in ID_COLUMNS if c in layout.columns}
+    dtypes.update(dtype or {})
+    if usecols is not None:
+        usecols = [c for c in dict.fromkeys(usecols) if c in layout.columns]
+        dtypes = {c: t for c, t in dtypes.items() if c in usecols}
+    options = {"low_memory": False, "encoding_errors": "replace"} if engine == "c" else {}
+    return pd.read_csv(path, sep=layout.delimiter, skiprows=layout.skiprows, usecols=usecols, dtype=dtypes,
+                       engine=engine, chunksize=chunksize, encoding="utf-8-sig", **options)
+
+
+def normalize(df: pd.DataFrame) -> pd.DataFrame:
+    """n8n column names and the service_id fallback for rows without product_id"""
+    if "supply_product_name" in df.columns and "product_name" not in df.columns:
+        df["product_name"] = df["supply_product_name"]
+    if "service_id" in df.columns and "product_id" in df.columns:
+        # Some rows (services) have an empty product_id but a service_id
+        df["product_id"] = (df["product_id"].fillna(df["service_id"]).astype(str)
+                            .str.replace(r"\.0$", "", regex=True))
+    return df
+
+
+def _with_sources(usecols: Optional[Sequence[str]]) -> Optional[List[str]]:
+    """Add the columns normalize() derives product_id/product_name from"""
+    if usecols is None:
+        return None
+    columns = list(usecols)
+    if "product_id" in columns:
+        columns.append("service_id")
+    if "product_name" in columns:
+        columns.append("supply_product_name")
+    return columns
+
+
+def _check_required(columns, required: Sequence[str], path):
+    missing = [c for c in required if c not in columns]
+    if missing:
+        raise ValueError(f"Missing required columns in {path}: {', '.join(missing)}")
+
+
+def _parquet_columns(path: Union[str, Path], usecols: Optional[Sequence[str]]) -> Optional[List[str]]:
+    """`usecols` restricted to the columns of the Parquet file (like `usecols` of read_table)"""
+    if usecols is None:
+        return None
+    import pyarrow.parquet as pq
+    names = set(pq.read_schema(path).names)
+    return [c for c in dict.fromkeys(usecols) if c in names]
+
+
+def load_table(path: Union[str, Path], usecols: Optional[Sequence[str]] = None,
+               required: Sequence[str] = (), engine: str = "c") -> pd.DataFrame:
+    """Read and normalize a whole CSV or Parquet file; ValueError if a `required` column is missing"""
+    if is_parquet(path):
+        _require_pyarrow()
+        df = normalize(pd.read_parquet(path, columns=_parquet_columns(path, _with_sources(usecols))))
+    else:
+        df = normalize(read_table(path, usecols=_with_sources(usecols), engine=engine))
+    _check_required(df.columns, required, path)
+    return df
+
+
+def iter_table(path: Union[str, Path], chunksize: int, usecols: Optional[Sequence[str]] = None,
+               required: Sequence[str] = (), limit: Optional[int] = None) -> Iterator[pd.DataFrame]:
+    """load_table in chunks of `chunksize` rows (at most `limit` rows in total)"""
+    remaining = limit
+    with _chunk_reader(path, chunksize, _with_sources(usecols)) as reader:
+        for chunk in reader:
+            chunk = normalize(chunk)
+            _check_required(chunk.columns, required, path)
+            if remaining is not None:
+                chunk = chunk.head(remaining)
+                remaining -= len(chunk)
+            yield chunk
+            if remaining is not None and remaining <= 0:
+                return
+
+
+class _ParquetChunks:
+    """Record batches of a Parquet file as DataFrames, usable like the chunked CSV reader"""
+
+    def __init__(self, path: Union[str, Path], chunksize: int, usecols: Optional[Sequence[str]]):
+        import pyarrow.parquet as pq
+        self._file = pq.ParquetFile(path)
+        self._batches = self._file.iter_batches(batch_size=chunksize, columns=_parquet_columns(path, usecols))
+
+    def __iter__(self) -> Iterator[pd.DataFrame]:
+        for batch in self._batches:
+            yield batch.to_pandas()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._file.close()
+
+
+def _chunk_reader(path: Union[str, Path], chunksize: int, usecols: Optional[Sequence[str]]):
+    if is_parquet(path):
+        _require_pyarrow()
+        return _ParquetChunks(path, chunksize, usecols)
+    return read_table(path, usecols=usecols, chunksize=chunksize)
+
+
+def with_result_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """Result columns as nullable numbers (see RESULT_DTYPES); fractional quantities stay floats"""
+    df = df.copy()
+    for column, dtype in RESULT_DTYPES.items():
+        if column not in df.columns:
+            continue
+        values = pd.to_numeric(df[column], errors="coerce")
+        if dtype.startswith("Int") and not (values.dropna() % 1 == 0).all():
+            dtype = "Float64"
+        df[column] = values.astype(dtype)
+    return df
+
+
+def output_paths(path: Union[str, Path], output_format: str = "csv") -> List[Path]:
+    """Files written for `path` in `output_format`: the suffix is switched to .csv / .parquet as needed"""
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format: {output_format} (choose from {', '.join(OUTPUT_FORMATS)})")
+    path = Path(path)
+    csv_path = path.with_suffix(".csv") if is_parquet(path) else path
+    parquet_path = path if is_parquet(path) else path.with_suffix(".parquet")
+    return {"csv": [csv_path], "parquet": [parquet_path], "both": [csv_path, parquet_path]}[output_format]
+
+
+def save_table(df: pd.DataFrame, path: Union[str, Path], output_format: str = "csv") -> List[Path]:
+    """Write an output as CSV (sep=;) and/or Parquet; returns the written paths"""
+    paths = output_paths(path, output_format)
+    if any(is_parquet(p) for p in paths):
+        _require_pyarrow()
+    df = with_result_dtypes(df)
+    for target in paths:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if is_parquet(target):
+            df.to_parquet(target, index=False)
+        else:
+            df.to_csv(target, index=False, sep=";")
+    return paths
@@ -0,0 +1,162 @@
+import json
+import math
+from bisect import bisect_left
+from threading import Lock
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Upper bounds (seconds / per-second rates) for the Prometheus histogram buckets
+LATENCY_BUCKETS = (0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300, 600)
+RATE_BUCKETS = (1, 5, 10, 25, 50, 100, 200, 500, 1000, 2000)
+QUANTILES = (0.5, 0.95, 0.99)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+def quantile(values: List[float], q: float) -> float:
+    """Nearest-rank quantile of a sorted list"""
+    if not values:
+        return 0.0
+    return values[max(0, math.ceil(q * len(values)) - 1)]
+
+
+class Histogram:
+    """Keeps every observation (a run has at most a few thousand requests) plus bucket counts"""
+
+    def __init__(self, buckets: Iterable[float]):
+        self.buckets = tuple(buckets)
+        self.bucket_counts = [0] * (len(self.buckets) + 1)
+        self.values: List[float] = []
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.values.append(value)
+        self.sum += value
+        self.bucket_counts[bisect_left(self.buckets, value)] += 1
+
+    def summary(self) -> Dict[str, float]:
+        values = sorted(self.values)
+        stats = {"count": len(values), "sum": round(self.sum, 4),
+                 "mean": round(self.sum / len(values), 4) if values else 0.0}
+        for q in QUANTILES:
+            stats[f"p{int(q * 100)}"] = round(quantile(values, q), 4)
+        stats["max"] = round(values[-1], 4) if values else 0.0
+        return stats
+
+
+class MetricsRegistry:
+    """Thread- and asyncio-safe counters, gauges and histograms with labels.
+
+    One lock around plain dict/list updates: cheap enough for per-request
+    observations. Exported as a JSON summary (p50/p95/p99) and in the
+    Prometheus text format.
+    """
+
+    def __init__(self, namespace: str = "pv_classifier"):
+        self.namespace = namespace
+        self._lock = Lock()
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._gauges: Dict[Tuple[str, Labels], float] = {}
+        self._histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self._help: Dict[str, str] = {}
+
+    def describe(self, name: str, text: str):
+        self._help[name] = text
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def counter(self, name: str, **label_filter) -> float:
+        """Sum of a counter over the label sets matching `label_filter`"""
+        wanted = set(_labels(label_filter))
+        with self._lock:
+            return sum(value for (counter_name, labels), value in self._counters.items()
+                       if counter_name == name and wanted <= set(labels))
+
+    def set_gauge(self, name: str, value: float, **labels):
+        with self._lock:
+            self._gauges[(name, _labels(labels))] = value
+
+    def observe(self, name: str, value: float, buckets: Iterable[float] = LATENCY_BUCKETS, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def _merged_values(self, name: str, label_filter: Dict[str, Any]) -> List[float]:
+        wanted = set(_labels(label_filter))
+        with self._lock:
+            return [value for (hist_name, labels), histogram in self._histograms.items()
+                    if hist_name == name and wanted <= set(labels) for value in histogram.values]
+
+    def histogram_summary(self, name: str, **label_filter) -> Dict[str, float]:
+        """Quantiles over all label sets of a histogram matching `label_filter`"""
+        merged = Histogram(())
+        for value in self._merged_values(name, label_filter):
+            merged.observe(value)
+        return merged.summary()
+
+    def quantile(self, name: str, q: float, **label_filter) -> Tuple[float, int]:
+        """(q-quantile, number of observations) over the matching label sets"""
+        values = sorted(self._merged_values(name, label_filter))
+        return quantile(values, q), len(values)
+
+    def summary(self) -> Dict[str, Any]:
+        """JSON-serializable snapshot"""
+        with self._lock:
+            return {
+                "counters": [{"name": n, "labels": dict(l), "value": v} for (n, l), v in sorted(self._counters.items())],
+                "gauges": [{"name": n, "labels": dict(l), "value": v} for (n, l), v in sorted(self._gauges.items())],
+                "histograms": [{"name": n, "labels": dict(l), **h.summary()}
+                               for (n, l), h in sorted(self._histograms.items(), key=lambda item: item[0])],
+            }
+
+    def to_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            for kind, series in (("counter", self._counters), ("gauge", self._gauges)):
+                for name in sorted({n for n, _ in series}):
+                    full = f"{self.namespace}_{name}"
+                    if name in self._help:
+                        lines.append(f"# HELP {full} {self._help[name]}")
+                    lines.append(f"# TYPE {full} {kind}")
+                    for (n, labels), value in sorted(series.items()):
+                        if n == name:
+                            lines.append(f"{full}{_format_labels(labels)} {value}")
+            for name in sorted({n for n, _ in self._histograms}):
+                full = f"{self.namespace}_{name}"
+                if name in self._help:
+                    lines.append(f"# HELP {full} {self._help[name]}")
+                lines.append(f"# TYPE {full} histogram")
+                for (n, labels), histogram in sorted(self._histograms.items(), key=lambda item: item[0]):
+                    if n != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets + (float("inf"),), histogram.bucket_counts):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                        lines.append(f"{full}_bucket{_format_labels(labels, ('le', le))} {cumulative}")
+                    lines.append(f"{full}_sum{_format_labels(labels)} {histogram.sum:.6f}")
+                    lines.append(f"{full}_count{_format_labels(labels)} {len(histogram.values)}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, prefix: str):
+        """Writes `<prefix>.json` and `<prefix>.prom`"""
+        with open(f"{prefix}.json", "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, indent=2)
+        with open(f"{prefix}.prom", "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
@@ -0,0 +1,86 @@
+import re
+import json
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from .rules import RuleClassifier
+
+# Offline stand-in for the chat-completion endpoint: answers a rendered request
+# body with the rule classifier, in whichever output schema the prompt asks for.
+_ROW = re.compile(r"^(?:- |\[(\d+)\] )(.*)$")
+_PRODUCT_ID = re.compile(r"(?:^|, )product_id: ([^,]+)")
+
+_rules = RuleClassifier()
+
+
+def parse_prompt_rows(user_prompt: str) -> List[Tuple[str, str, bool]]:
+    """(row key, row text, compact) for every product line of a user prompt"""
+    rows = []
+    for line in user_prompt.splitlines():
+        match = _ROW.match(line)
+        if not match:
+            continue
+        alias, text = match.groups()
+        if alias is not None:
+            rows.append((alias, text, True))
+        else:
+            product_id = _PRODUCT_ID.search(text)
+            rows.append((product_id.group(1).strip() if product_id else "", text, False))
+    return rows
+
+
+def mock_answers(body: Dict[str, Any]) -> Tuple[str, List[Dict[str, Any]]]:
+    """(result array key, one answer object per prompt row) for a chat-completion request body"""
+    # The last user message holds the batch; earlier ones are few-shot examples
+    user_prompt = [m["content"] for m in body["messages"] if m["role"] == "user"][-1]
+    answers = []
+    compact = False
+    for key, text, compact in parse_prompt_rows(user_prompt):
+        result = _rules.classify({"product_id": key, "product_name": text})
+        is_pv = bool(result.is_pv_module) if result is not None else False
+        confidence = result.confidence if result is not None else 0.5
+        power = ({"power_watts": result.power_watts, "quantity": result.quantity,
+                  "total_power_watts": result.total_power_watts, "power_source": result.power_source}
+                 if result is not None and is_pv else {})
+        if compact:
+            short = {"i": int(key), "pv": int(is_pv), "c": confidence}
+            short.update({alias: power[col] for alias, col in (("w", "power_watts"), ("q", "quantity"),
+                                                                ("t", "total_power_watts"), ("s", "power_source"))
+                          if power.get(col) is not None})
+            answers.append(short)
+        else:
+            answers.append({
+                "product_id": key,
+                "product_name": text[:50],
+                "is_pv_module": is_pv,
+                "Confidence": confidence,
+                "Reasoning": result.reasoning if result is not None else "Mock: unklar",
+                **power,
+            })
+    return ("r" if compact else "results"), answers
+
+
+def mock_content(body: Dict[str, Any]) -> str:
+    """JSON answer content for a chat-completion request body"""
+    key, answers = mock_answers(body)
+    return json.dumps({key: answers}, ensure_ascii=False)
+
+
+def mock_completion(body: Dict[str, Any], content: Optional[str] = None,
+                    finish_reason: str = "stop") -> Dict[str, Any]:
+    """Complete chat.completion object for a request body, with ~4 chars per token usage"""
+    if content is None:
+        content = mock_content(body)
+    prompt_tokens = sum(len(m["content"]) for m in body["messages"]) // 4
+    completion_tokens = len(content) // 4
+    return {
+        "id": f"chatcmpl-mock-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "mock"),
+        "choices": [{"index": 0, "finish_reason": finish_reason,
+                     "message": {"role": "assistant", "content": content}}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                  "total_tokens": prompt_tokens + completion_tokens},
+    }
@@ -0,0 +1,254 @@
+"""Offline OpenAI-compatible chat-completions server with the failure modes of the real providers"""
+import json
+import math
+import time
+import random
+import argparse
+import threading
+from dataclasses import dataclass, asdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+
+from .mock_llm import mock_answers, mock_completion
+
+
+@dataclass
+class MockServerConfig:
+    """Behaviour of the mock endpoint; all rates are per request (rows: per row)"""
+    # Lognormal base latency: median seconds and spread (0 = fixed)
+    latency_median: float = 0.5
+    latency_sigma: float = 0.5
+    # Extra latency per prompt row and generation speed of the completion
+    latency_per_row: float = 0.0
+    tokens_per_second: float = 0.0
+    # Requests processed at once (more wait in line) and requests per minute (more get 429)
+    max_concurrency: int = 0
+    rpm: int = 0
+    error_429: float = 0.0
+    error_5xx: float = 0.0
+    truncate: float = 0.0
+    malformed: float = 0.0
+    drop_row: float = 0.0
+    seed: Optional[int] = None
+
+
+class MockLLMServer:
+    """Shared state of the handler threads: random source, limits and counters"""
+
+    def __init__(self, config: MockServerConfig):
+        self.config = config
+        self.random = random.Random(config.seed)
+        self._lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(config.max_concurrency) if config.max_concurrency else None
+        self._window: list = []
+        self.stats: Dict[str, int] = {"requests": 0, "completed": 0, "rate_limited": 0, "server_errors": 0,
+                                      "truncated": 0, "malformed": 0, "rows_dropped": 0, "streamed": 0}
+
+    def _count(self, key: str, value: int = 1):
+        with self._lock:
+            self.stats[key] += value
+
+    def _chance(self, rate: float) -> bool:
+        with self._lock:
+            return rate > 0 and self.random.random() < rate
+
+    def _rpm_exceeded(self) -> Tuple[bool, int]:
+        """Sliding one-minute window; returns (limited, remaining)"""
+        if not self.config.rpm:
+            return False, 0
+        now = time.monotonic()
+        with self._lock:
+            self._window = [t for t in self._window if now - t < 60]
+            if len(self._window) >= self.config.rpm:
+                return True, 0
+            self._window.append(now)
+            return False, self.config.rpm - len(self._window)
+
+    def latency(self, rows: int, completion_tokens: int) -> float:
+        config = self.config
+        with self._lock:
+            base = config.latency_median * math.exp(self.random.gauss(0, config.latency_sigma)) \
+                if config.latency_sigma > 0 else config.latency_median
+        generation = completion_tokens / config.tokens_per_second if config.tokens_per_second > 0 else 0.0
+        return base + rows * config.latency_per_row + generation
+
+    def rate_limit_headers(self, remaining: int) -> Dict[str, str]:
+        if not self.config.rpm:
+            return {}
+        return {"x-ratelimit-limit-requests": str(self.config.rpm),
+                "x-ratelimit-remaining-requests": str(remaining),
+                "x-ratelimit-reset-requests": "60s"}
+
+    def complete(self, body: Dict[str, Any]) -> Tuple[int, Dict[str, Any], Dict[str, str], int]:
+        """(status, response JSON, headers, prompt rows) for one chat-completion request, before latency"""
+        self._count("requests")
+        limited, remaining = self._rpm_exceeded()
+        if limited or self._chance(self.config.error_429):
+            self._count("rate_limited")
+            return 429, _error("Rate limit reached (mock)", "rate_limit_exceeded"), {"retry-after": "1"}, 0
+        if self._chance(self.config.error_5xx):
+            self._count("server_errors")
+            with self._lock:
+                status = self.random.choice([500, 502, 503])
+            return status, _error("The server had an error while processing your request (mock)", "server_error"), {}, 0
+
+        key, answers = mock_answers(body)
+        kept = [a for a in answers if not self._chance(self.config.drop_row)]
+        self._count("rows_dropped", len(answers) - len(kept))
+        content = json.dumps({key: kept}, ensure_ascii=False)
+        finish_reason = "stop"
+        if self._chance(self.config.truncate):
+            # Cut mid-array like a max_tokens stop
+            self._count("truncated")
+            content = content[:max(len(content) // 2, 1)]
+            finish_reason = "length"
+        elif self._chance(self.config.malformed):
+            self._count("malformed")
+            content = self._corrupt(content)
+        self._count("completed")
+        return 200, mock_completion(body, content, finish_reason), self.rate_limit_headers(remaining), len(answers)
+
+    def _corrupt(self, content: str) -> str:
+        with self._lock:
+            kind = self.random.randrange(3)
+        if kind == 0:
+            return content[:-2]
+        if kind == 1:
+            return content.replace('":', '"', 1)
+        return "Hier ist das Ergebnis: " + content.replace("}", "},", 1)
+
+
+def _error(message: str, code: str) -> Dict[str, Any]:
+    return {"error": {"message": message, "type": code, "code": code}}
+
+
+def _handler(server: MockLLMServer):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status: int, payload: Dict[str, Any], headers: Dict[str, str]):
+            data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path.rstrip("/").endswith("/models"):
+                self._send_json(200, {"object": "list", "data": [{"id": "mock", "object": "model"}]}, {})
+            elif self.path.rstrip("/").endswith("/stats"):
+                self._send_json(200, {"stats": dict(server.stats), "config": asdict(server.config)}, {})
+            else:
+                self._send_json(404, _error("Not found", "not_found"), {})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            raw = self.rfile.read(length)
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._send_json(404, _error("Not found", "not_found"), {})
+                return
+            try:
+                body = json.loads(raw)
+            except json.JSONDecodeError:
+                self._send_json(400, _error("Invalid JSON body", "invalid_request_error"), {})
+                return
+
+            if server.slots is not None:
+                server.slots.acquire()
+            try:
+                status, payload, headers, rows = server.complete(body)
+                if status != 200:
+                    self._send_json(status, payload, headers)
+                    return
+                delay = server.latency(rows, payload["usage"]["completion_tokens"])
+                if body.get("stream"):
+                    self._stream(payload, headers, delay, body.get("stream_options") or {})
+                else:
+                    time.sleep(delay)
+                    self._send_json(200, payload, headers)
+            finally:
+                if server.slots is not None:
+                    server.slots.release()
+
+        def _stream(self, payload: Dict[str, Any], headers: Dict[str, str], delay: float,
+                    stream_options: Dict[str, Any]):
+            """Server-sent events, content spread over the generation time"""
+            server._count("streamed")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.close_connection = True
+
+            choice = payload["choices"][0]
+            content = choice["message"]["content"]
+            pieces = [content[i:i + 40] for i in range(0, len(content), 40)] or [""]
+            base = {"id": payload["id"], "object": "chat.completion.chunk", "created": payload["created"],
+                    "model": payload["model"]}
+
+            def event(data: Dict[str, Any]):
+                self.wfile.write(f"data: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+
+            # Half of the latency before the first token, the rest while generating
+            time.sleep(delay / 2)
+            for i, piece in enumerate(pieces):
+                last = i == len(pieces) - 1
+                event({**base, "choices": [{"index": 0, "delta": {"content": piece},
+                                            "finish_reason": choice["finish_reason"] if last else None}]})
+                time.sleep(delay / 2 / len(pieces))
+            if stream_options.get("include_usage"):
+                event({**base, "choices": [], "usage": payload["usage"]})
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+
+    return Handler
+
+
+def serve(config: MockServerConfig, host: str = "127.0.0.1", port: int = 8089) -> Tuple[ThreadingHTTPServer, MockLLMServer]:
+    """Start the server on a daemon thread; port 0 picks a free port (see httpd.server_address)"""
+    state = MockLLMServer(config)
+    httpd = ThreadingHTTPServer((host, port), _handler(state))
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd, state
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline OpenAI-kompatibler Mock-Server für Last- und Fehlertests')
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency-median', type=float, default=0.5, help='Median der Basis-Latenz in Sekunden (default: 0.5)')
+    parser.add_argument('--latency-sigma', type=float, default=0.5, help='Streuung der Lognormal-Latenz (0 = konstant, default: 0.5)')
+    parser.add_argument('--latency-per-row', type=float, default=0.0, help='Zusätzliche Sekunden pro Zeile im Prompt')
+    parser.add_argument('--tokens-per-second', type=float, default=0.0, help='Generierungsgeschwindigkeit der Antwort (0 = sofort)')
+    parser.add_argument('--max-concurrency', type=int, default=0, help='Gleichzeitig bearbeitete Requests, weitere warten (0 = unbegrenzt)')
+    parser.add_argument('--rpm', type=int, default=0, help='Requests pro Minute, darüber 429 (0 = unbegrenzt)')
+    parser.add_argument('--error-429', type=float, default=0.0, help='Anteil zufälliger 429 Antworten')
+    parser.add_argument('--error-5xx', type=float, default=0.0, help='Anteil zufälliger 500/502/503 Antworten')
+    parser.add_argument('--truncate', type=float, default=0.0, help='Anteil abgeschnittener Antworten (finish_reason=length)')
+    parser.add_argument('--malformed', type=float, default=0.0, help='Anteil Antworten mit kaputtem JSON')
+    parser.add_argument('--drop-row', type=float, default=0.0, help='Wahrscheinlichkeit, dass eine Zeile in der Antwort fehlt')
+    parser.add_argument('--seed', type=int, default=None, help='Zufalls-Seed für reproduzierbare Läufe')
+    args = parser.parse_args()
+
+    config = MockServerConfig(**{k: v for k, v in vars(args).items() if k not in ('host', 'port')})
+    httpd, _ = serve(config, args.host, args.port)
+    host, port = httpd.server_address[:2]
+    print(f"🧪 Mock LLM Server auf http://{host}:{port}/v1 (Statistik: /v1/stats)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        httpd.shutdown()
+
+
+if __name__ == '__main__':
+    main()
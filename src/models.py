@@ -30,6 +30,19 @@ class ClassificationResult(BaseModel):
         description="Source of power extraction: 'module_wp', 'anlage_kwp', 'productcode', or null"
     )
 
+    # Provenance: model name, or 'rules' for the local fast path
+    classified_by: Optional[str] = Field(
+        default=None,
+        alias="classified_by",
+        description="Which classifier produced this result"
+    )
+    # Model cascade: 1 = first (cheap) stage, higher = escalated
+    cascade_stage: Optional[int] = Field(
+        default=None,
+        alias="cascade_stage",
+        description="Cascade stage that produced this result"
+    )
+
     model_config = {
         "populate_by_name": True
     }
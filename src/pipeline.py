@@ -0,0 +1,699 @@
+import os
+import time
+import asyncio
+from dataclasses import dataclass, field
+from pathlib import Path
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from .processor import CSVProcessor
+from .llm_client import LLMClient, AsyncLLMClient, get_rate_limiter
+from .router import LLMRouter, AsyncLLMRouter, parse_routes
+from .cascade import ModelCascade, AsyncModelCascade, DEFAULT_THRESHOLD
+from .similarity import SimilarityIndex, DEFAULT_THRESHOLD as SIMILARITY_THRESHOLD
+from .cache import ResultCache
+from .loader import load_table, save_table, output_paths, pyarrow_available
+from .journal import ResultJournal
+from .chunked import iter_batches, run_ordered
+from .metrics import MetricsRegistry
+from .transport import TransportConfig
+from .shaping import InputShaper
+from .rules import RuleClassifier
+from .power import PowerExtractor
+from .batch_job import BatchJobRunner, LocalBatchBackend, ProviderBatchBackend, ENDPOINTS
+from .models import ClassificationResult
+
+# Result columns merged into the input rows of the output file
+RESULT_COLUMNS = ['product_id', 'is_pv_module', 'Reasoning', 'Confidence', 'power_watts', 'quantity',
+                  'total_power_watts', 'power_source', 'classified_by', 'cascade_stage']
+
+
+# --journal without a path: <output>.journal.sqlite
+JOURNAL_DEFAULT = 'auto'
+
+
+class PipelineError(Exception):
+    """A run cannot start (missing API key, unreadable input, client setup)"""
+
+
+@dataclass
+class PipelineConfig:
+    """All options of a classification run; field names match the main.py flags"""
+    input: str = 'data/Testdaten ohne Loesung - mit head spalte.csv'
+    output: Optional[str] = 'data/output.csv'
+    output_format: str = 'csv'
+    provider: str = 'openai'
+    model: str = 'gpt-4o-mini'
+    base_url: Optional[str] = None
+    batch_size: int = 10
+    parallel: int = 1
+    engine: str = 'threads'
+    limit: Optional[int] = None
+    test_file: Optional[str] = None
+    dedup: bool = False
+    fast_path: bool = False
+    similar_from: Optional[str] = None
+    similarity_threshold: float = SIMILARITY_THRESHOLD
+    cache: Optional[str] = None
+    cache_max_entries: Optional[int] = None
+    cache_max_age_days: Optional[float] = None
+    rpm: Optional[int] = None
+    tpm: Optional[int] = None
+    on_failure: str = 'drop'
+    shape_input: bool = False
+    shape_columns: Optional[str] = None
+    shape_max_chars: int = 300
+    output_schema: str = 'full'
+    reasoning: bool = False
+    stream: bool = False
+    few_shot: bool = False
+    power_extraction: str = 'llm'
+    pool_size: Optional[int] = None
+    http2: bool = False
+    connect_timeout: float = 10.0
+    read_timeout: float = 1200.0
+    hedge_percentile: Optional[float] = None
+    metrics: Optional[str] = None
+    journal: Optional[str] = None
+    resume: bool = False
+    route: Optional[str] = None
+    route_cost_weight: float = 1.0
+    cascade: Optional[str] = None
+    cascade_threshold: float = DEFAULT_THRESHOLD
+    mode: str = 'sync'
+    batch_backend: str = 'api'
+    batch_dir: str = 'data/batch_jobs'
+    poll_interval: float = 60.0
+    chunk_size: int = 5000
+    max_in_flight: Optional[int] = None
+
+
+@dataclass
+class PipelineResult:
+    """Outcome of run_pipeline: merged output rows plus the client and telemetry of the run"""
+    config: PipelineConfig
+    df_input: pd.DataFrame
+    final_df: Optional[pd.DataFrame]
+    client: Any
+    metrics: MetricsRegistry
+    elapsed_seconds: float = 0.0
+    batches: int = 0
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+
+def process_single_batch(client: LLMClient, batch: list, batch_num: int, total: int, lock: Lock) -> tuple:
+    """Process a single batch and return results with batch number"""
+    try:
+        results = client.classify_batch(batch)
+        with lock:
+            print(f"   ✓ Batch {batch_num}/{total} fertig ({len(results)} Ergebnisse)")
+        return batch_num, results, None
+    except Exception as e:
+        with lock:
+            print(f"   ❌ Fehler in Batch {batch_num}: {e}")
+        return batch_num, [], str(e)
+
+
+async def process_batches_async(client: AsyncLLMClient, batches: list, concurrency: int,
+                                on_batch: Optional[Callable[[list], None]] = None) -> dict:
+    """Run all batches on one event loop with at most `concurrency` requests in flight"""
+    semaphore = asyncio.Semaphore(concurrency)
+    total = len(batches)
+    results_dict = {}
+
+    async def run_one(batch_num: int, batch: list):
+        async with semaphore:
+            try:
+                results = await client.classify_batch(batch)
+                print(f"   ✓ Batch {batch_num}/{total} fertig ({len(results)} Ergebnisse)")
+                if results:
+                    results_dict[batch_num] = results
+                    if on_batch is not None:
+                        on_batch(results)
+            except Exception as e:
+                print(f"   ❌ Fehler in Batch {batch_num}: {e}")
+
+    await asyncio.gather(*(run_one(i + 1, batch) for i, batch in enumerate(batches)))
+    return results_dict
+
+
+def _backends(config: PipelineConfig) -> Tuple[List[Tuple[str, str]], List[Tuple[str, str]]]:
+    """(routes, cascade stages) as (provider, model) pairs for this run"""
+    routes = parse_routes(config.route) if config.route else [(config.provider, config.model)]
+    if config.route and config.mode == 'batch-job':
+        print(f"⚠️  --route im Batch-Job Modus nicht unterstützt, nutze {routes[0][0]}:{routes[0][1]}")
+        routes = routes[:1]
+    if len(routes) > 1:
+        print(f"   Router: {', '.join(f'{p}:{m}' for p, m in routes)}")
+    cascade_stages = parse_routes(config.cascade) if config.cascade else []
+    if cascade_stages and config.mode == 'batch-job':
+        print("⚠️  --cascade im Batch-Job Modus nicht unterstützt, nur erste Stufe")
+        cascade_stages = []
+    if cascade_stages:
+        print(f"   Kaskade: → {' → '.join(f'{p}:{m}' for p, m in cascade_stages)} (Confidence < {config.cascade_threshold})")
+    return routes, cascade_stages
+
+
+def check_api_keys(providers):
+    for provider in providers:
+        if provider == 'openai' and not os.getenv("OPENAI_API_KEY"):
+            raise PipelineError("OPENAI_API_KEY not found in .env. Please set it.")
+        elif provider == 'zhipuai' and not (os.getenv("ZHIPUAI_API_KEY") or os.getenv("ZAI_API_KEY")):
+            raise PipelineError("ZHIPUAI_API_KEY (or ZAI_API_KEY) not found in .env. Please set it.")
+
+
+def build_client(config: PipelineConfig, routes, cascade_stages, cache: Optional[ResultCache],
+                 metrics: MetricsRegistry, offline: bool = False):
+    """Client, router or cascade for the configured backends"""
+    transport = None
+    if not offline:
+        transport = TransportConfig.for_concurrency(config.parallel, hedged=config.hedge_percentile is not None,
+                                                    http2=config.http2,
+                                                    connect_timeout=config.connect_timeout,
+                                                    read_timeout=config.read_timeout)
+        if config.pool_size:
+            transport.max_connections = transport.max_keepalive_connections = config.pool_size
+        print(f"   Transport: {transport.describe()}")
+
+    client_cls = AsyncLLMClient if config.engine == 'async' and config.mode == 'sync' else LLMClient
+    shaper = None
+    if config.shape_input:
+        columns = [c.strip() for c in config.shape_columns.split(',')] if config.shape_columns else None
+        shaper = InputShaper(columns=columns, max_chars=config.shape_max_chars)
+
+    def make_client(provider, model):
+        # Each backend keeps its own rate limiter; --rpm/--tpm apply to each of them
+        rate_limiter = get_rate_limiter(provider, model, rpm=config.rpm, tpm=config.tpm)
+        return client_cls(provider=provider, model=model, cache=cache, rate_limiter=rate_limiter,
+                          failure_mode=config.on_failure, shaper=shaper,
+                          output_schema=config.output_schema, include_reasoning=config.reasoning,
+                          extract_power=config.power_extraction != 'local',
+                          api_key='offline' if offline else None, few_shot=config.few_shot,
+                          stream=config.stream, metrics=metrics, transport=transport,
+                          hedge_percentile=config.hedge_percentile / 100 if config.hedge_percentile else None,
+                          base_url=config.base_url)
+
+    is_async = client_cls is AsyncLLMClient
+    clients = [make_client(provider, model) for provider, model in routes]
+    client = clients[0]
+    if len(clients) > 1:
+        client = (AsyncLLMRouter if is_async else LLMRouter)(clients, cost_weight=config.route_cost_weight)
+    if cascade_stages:
+        stages = [client] + [make_client(provider, model) for provider, model in cascade_stages]
+        client = (AsyncModelCascade if is_async else ModelCascade)(
+            stages, threshold=config.cascade_threshold, check_power=config.power_extraction != 'local')
+    return client
+
+
+def merge_results(df_input: pd.DataFrame, all_results: List[Optional[Dict[str, Any]]],
+                  aligned: bool = False) -> pd.DataFrame:
+    """Join result dicts onto the input rows (aligned: one entry per input row, None for unanswered)"""
+    results_df = pd.DataFrame([r for r in all_results if r is not None])
+
+    # Ensure ID types match for merging
+    df_input['product_id'] = df_input['product_id'].astype(str)
+    results_df['product_id'] = results_df['product_id'].astype(str)
+
+    # Columns to drop from input before merge (to avoid _x _y suffixes)
+    df_input_clean = df_input.drop(columns=[c for c in RESULT_COLUMNS[1:] if c in df_input.columns])
+
+    available_cols = [c for c in RESULT_COLUMNS if c in results_df.columns]
+    if 'cascade_stage' in results_df.columns and results_df['cascade_stage'].isna().all():
+        available_cols.remove('cascade_stage')
+
+    if aligned:
+        # Dedup results are aligned row by row with the input
+        results_df.index = df_input_clean.index[[r is not None for r in all_results]]
+        final_df = df_input_clean.join(results_df[[c for c in available_cols if c != 'product_id']])
+    else:
+        # Deduplicate results by product_id
+        results_subset = results_df[available_cols].drop_duplicates(subset=['product_id'])
+        final_df = pd.merge(df_input_clean, results_subset, on='product_id', how='left')
+
+    # Convert boolean to 1/0 to match test data format
+    final_df['is_pv_module'] = final_df['is_pv_module'].apply(lambda x: 1 if x is True else 0 if x is False else None)
+    if 'cascade_stage' in final_df.columns:
+        final_df['cascade_stage'] = final_df['cascade_stage'].astype('Int64')
+    return final_df
+
+
+def prompt_hash(client) -> Optional[str]:
+    """System prompt hash of the client, or of the first backend/stage of a router or cascade"""
+    if hasattr(client, 'backends'):
+        client = client.backends[0].client
+    elif hasattr(client, 'stages'):
+        client = client.stages[0].client
+    return getattr(client, 'prompt_hash', None)
+
+
+def open_journal(config: PipelineConfig, client) -> Optional[ResultJournal]:
+    """Checkpoint journal, only with --journal or --resume (default path <output>.journal.sqlite).
+
+    Raises PipelineError when --resume finds a journal of a run with other settings.
+    """
+    if not (config.journal or config.resume):
+        return None
+    journal_path = config.journal if config.journal != JOURNAL_DEFAULT else None
+    journal_path = journal_path or (f"{config.output}.journal.sqlite" if config.output else None)
+    if not journal_path:
+        print("⚠️  Journal braucht einen Pfad (--journal PFAD oder --output), starte ohne Journal")
+        return None
+    run_info = {"input": config.input, "provider": config.provider, "model": config.model,
+                "route": config.route, "cascade": config.cascade, "dedup": config.dedup, "limit": config.limit,
+                "prompt_hash": prompt_hash(client), "output_schema": config.output_schema,
+                "reasoning": config.reasoning, "power_extraction": config.power_extraction}
+    journal = ResultJournal(journal_path, resume=config.resume, run_info=run_info)
+    mismatches = journal.mismatches(run_info)
+    if mismatches:
+        journal.close()
+        # Replaying results of another model or prompt would silently mix two runs
+        raise PipelineError(f"Journal {journal_path} stammt aus einem Lauf mit anderen Einstellungen "
+                            f"({', '.join(mismatches)}); ohne --resume neu starten oder anderes --journal wählen")
+    print(f"📓 Journal: {journal_path}" + (f" ({len(journal)} Ergebnisse übernommen)" if config.resume else ""))
+    return journal
+
+
+def report_timing(config: PipelineConfig, client, metrics: MetricsRegistry, elapsed_time: float):
+    print(f"⏱️  Verarbeitung abgeschlossen in {elapsed_time:.1f}s")
+    metrics.set_gauge("run_seconds", elapsed_time, mode=config.mode, engine=config.engine)
+    metrics.set_gauge("run_rows_per_second", client.usage.rows_processed / elapsed_time if elapsed_time > 0 else 0,
+                      mode=config.mode, engine=config.engine)
+    latency = metrics.histogram_summary("request_latency_seconds")
+    if latency["count"]:
+        print(f"   Latenz pro Request: p50 {latency['p50']:.2f}s | p95 {latency['p95']:.2f}s | "
+              f"p99 {latency['p99']:.2f}s ({latency['count']} Requests)")
+    pool_wait = metrics.histogram_summary("pool_wait_seconds")
+    if pool_wait["count"]:
+        print(f"   Warten auf Pool-Verbindung: p50 {pool_wait['p50']*1000:.0f}ms | p95 {pool_wait['p95']*1000:.0f}ms | "
+              f"p99 {pool_wait['p99']*1000:.0f}ms")
+
+
+def report_power(pv_modules: int, modules_with_power: int, total_power: float):
+    print(f"\n⚡ LEISTUNGSEXTRAKTION:")
+    print(f"   PV-Module klassifiziert:  {pv_modules}")
+    print(f"   Davon mit Leistung:       {modules_with_power}")
+    print(f"   Gesamt-Leistung:          {total_power/1000:.2f} kWp")
+
+
+def run_pipeline(config: PipelineConfig, df_input: Optional[pd.DataFrame] = None,
+                 metrics: Optional[MetricsRegistry] = None) -> PipelineResult:
+    """Classify `config.input` (or an already loaded `df_input`) and write `config.output`.
+
+    Raises PipelineError when the run cannot start; batch failures are
+    reported and counted but do not abort the run.
+    """
+    print("🚀 Starte Solar-Modul Klassifizierung mit Leistungsextraktion")
+    print(f"   Model: {config.model}")
+    print(f"   Batch-Size: {config.batch_size}")
+    print(f"   Parallel Workers: {config.parallel}")
+    print(f"   Engine: {config.engine}")
+    if config.mode == 'batch-job':
+        print(f"   Modus: Batch-Job ({config.batch_backend})")
+    elif config.mode == 'stream':
+        print(f"   Modus: Streaming (Chunks à {config.chunk_size} Zeilen, max. {max_in_flight(config)} Batches unterwegs)")
+    routes, cascade_stages = _backends(config)
+    # The local batch stand-in never calls the provider
+    offline = config.mode == 'batch-job' and config.batch_backend == 'local'
+    if not (offline or config.base_url):
+        check_api_keys({p for p, _ in routes + cascade_stages})
+
+    if config.mode == 'stream' and df_input is None:
+        return run_streaming(config, routes, cascade_stages, metrics or MetricsRegistry())
+    if config.output and config.output_format != 'csv' and not pyarrow_available():
+        # Fail before any request is paid for, not when the output is written
+        raise PipelineError(f"--output-format {config.output_format} braucht pyarrow (pip install pyarrow)")
+
+    # 1. Initialize Processor
+    processor = CSVProcessor(config.input, config.output)
+    if df_input is None:
+        try:
+            df_input = processor.load_csv()
+        except Exception as e:
+            raise PipelineError(f"Fehler beim Laden der CSV: {e}") from e
+        if config.limit:
+            df_input = df_input.head(config.limit)
+            print(f"⚠️  Limitiert auf {config.limit} Zeilen (Test-Modus)")
+        print(f"✅ {len(df_input)} Produkte geladen aus {config.input}")
+    else:
+        df_input = df_input.head(config.limit).copy() if config.limit else df_input.copy()
+
+    # 2. Initialize Client
+    cache = None
+    if config.cache:
+        cache = ResultCache(config.cache, max_entries=config.cache_max_entries, max_age_days=config.cache_max_age_days)
+        print(f"🗄️  Ergebnis-Cache: {config.cache} ({len(cache)} Einträge)")
+    metrics = metrics or MetricsRegistry()
+    try:
+        client = build_client(config, routes, cascade_stages, cache, metrics, offline=offline)
+    except Exception as e:
+        raise PipelineError(f"Fehler beim Initialisieren des LLM Clients: {e}") from e
+    result = PipelineResult(config=config, df_input=df_input, final_df=None, client=client, metrics=metrics)
+
+    journal = open_journal(config, client)
+
+    # 3. Process Batches
+    all_results = []
+
+    def keep(results, source):
+        # Memory for the no-journal case; with a journal each batch is committed as it finishes
+        all_results.extend(res.model_dump(by_alias=True) for res in results)
+        if journal is not None:
+            journal.append(results, source)
+
+    df_pending = df_input
+    signatures = None
+    if config.dedup:
+        signatures = processor.signatures(df_input)
+        df_pending = processor.deduplicate(df_input, signatures)
+        client.usage.rows_deduplicated = len(df_input) - len(df_pending)
+        ratio = len(df_input) / len(df_pending) if len(df_pending) else 0
+        print(f"   🧬 Dedup: {len(df_input)} Zeilen → {len(df_pending)} eindeutige Produkte "
+              f"(Ratio {ratio:.2f}x, {client.usage.rows_deduplicated} Zeilen gespart)")
+
+    if journal is not None and config.resume:
+        done = journal.done_ids()
+        rows_before = len(df_pending)
+        df_pending = df_pending[~df_pending['product_id'].astype(str).isin(done)]
+        print(f"   ♻️  Fortsetzen: {rows_before - len(df_pending)} Zeilen bereits im Journal, "
+              f"{len(df_pending)} verbleiben")
+
+    if config.fast_path:
+        rows_before = len(df_pending)
+        rule_results, ambiguous = RuleClassifier().split(df_pending.to_dict('records'))
+        keep(rule_results, 'rules')
+        df_pending = pd.DataFrame(ambiguous, columns=df_input.columns)
+        client.usage.rows_fast_path = len(rule_results)
+        coverage = len(rule_results) / rows_before * 100 if rows_before else 0
+        print(f"   ⚡ Fast-Path: {len(rule_results)} von {rows_before} Zeilen regelbasiert ({coverage:.1f}%), "
+              f"{len(df_pending)} an das LLM")
+
+    if cache is not None:
+        cached_results, pending_records = client.split_cached(df_pending.to_dict('records'))
+        keep(cached_results, 'cache')
+        df_pending = pd.DataFrame(pending_records, columns=df_input.columns)
+        print(f"   🗄️  {len(cached_results)} Zeilen aus dem Cache, {len(df_pending)} an das LLM")
+
+    if config.similar_from:
+        index = SimilarityIndex.from_csv([p.strip() for p in config.similar_from.split(',')])
+        similar_results, pending_records = index.split(df_pending.to_dict('records'),
+                                                       threshold=config.similarity_threshold)
+        keep(similar_results, 'similarity')
+        df_pending = pd.DataFrame(pending_records, columns=df_input.columns)
+        client.usage.rows_similarity = len(similar_results)
+        print(f"   🔗 Ähnlichkeit: {len(similar_results)} Zeilen übernehmen das Label eines Nachbarn "
+              f"(Index {len(index)} Zeilen, Schwelle {config.similarity_threshold}), {len(df_pending)} an das LLM")
+
+    batches = list(processor.create_batches(df_pending, batch_size=config.batch_size))
+    total_batches = result.batches = len(batches)
+
+    if total_batches == 0 and not all_results and not (journal is not None and len(journal)):
+        print("⚠️ Keine Batches zu verarbeiten.")
+        return result
+
+    print(f"📦 Starte Verarbeitung von {total_batches} Batches...")
+    start_time = time.time()
+
+    if config.mode == 'batch-job':
+        # One asynchronous provider job for all batches; a rerun resumes the pending job
+        if config.batch_backend == 'local':
+            backend = LocalBatchBackend(os.path.join(config.batch_dir, 'local'), endpoint=ENDPOINTS[config.provider])
+        else:
+            backend = ProviderBatchBackend(client.client, config.provider)
+        runner = BatchJobRunner(client, backend, work_dir=config.batch_dir, poll_interval=config.poll_interval)
+        try:
+            keep(runner.run(batches), 'batch-job')
+        except Exception as e:
+            print(f"   ❌ Batch-Job fehlgeschlagen: {e}")
+    elif config.engine == 'async':
+        # Single-threaded asyncio: --parallel bounds the requests in flight
+        print(f"   ⚡ Async-Verarbeitung mit max. {config.parallel} gleichzeitigen Requests")
+        on_batch = (lambda results: journal.append(results, 'llm')) if journal is not None else None
+        results_dict = asyncio.run(process_batches_async(client, batches, config.parallel, on_batch=on_batch))
+        for batch_num in sorted(results_dict.keys()):
+            for res in results_dict[batch_num]:
+                all_results.append(res.model_dump(by_alias=True))
+    elif config.parallel > 1:
+        # Parallel processing
+        print(f"   ⚡ Parallele Verarbeitung mit {config.parallel} Workers")
+        lock = Lock()
+        results_dict = {}
+
+        with ThreadPoolExecutor(max_workers=config.parallel) as executor:
+            futures = {
+                executor.submit(process_single_batch, client, batch, i+1, total_batches, lock): i
+                for i, batch in enumerate(batches)
+            }
+
+            try:
+                for future in as_completed(futures):
+                    batch_num, results, error = future.result()
+                    if results:
+                        results_dict[batch_num] = results
+                        if journal is not None:
+                            journal.append(results, 'llm')
+            except KeyboardInterrupt:
+                # Don't wait for the queued batches; the journal keeps the finished ones
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+
+        # Combine results in order
+        for batch_num in sorted(results_dict.keys()):
+            for res in results_dict[batch_num]:
+                all_results.append(res.model_dump(by_alias=True))
+    else:
+        # Sequential processing
+        for i, batch in enumerate(batches, 1):
+            print(f"   Batch {i}/{total_batches}: {len(batch)} Produkte...")
+            try:
+                results = client.classify_batch(batch)
+                keep(results, 'llm')
+                print(f"   ✓ Batch {i} fertig")
+            except Exception as e:
+                print(f"   ❌ Fehler in Batch {i}: {e}")
+
+    elapsed_time = result.elapsed_seconds = time.time() - start_time
+    report_timing(config, client, metrics, elapsed_time)
+    if cache is not None:
+        cache.close()
+
+    if journal is not None:
+        # Merge from what is on disk: earlier runs (--resume) plus every batch committed above
+        all_results = journal.results()
+        journal.close()
+
+    if signatures is not None and all_results:
+        # Spread each unique product's result back to all of its rows
+        all_results = processor.fan_out(df_input, signatures, [ClassificationResult(**r) for r in all_results])
+
+    # 4. Merge & Save Output
+    if not any(r is not None for r in all_results):
+        print("⚠️ Keine Ergebnisse zum Speichern.")
+        return result
+
+    final_df = merge_results(df_input, all_results, aligned=signatures is not None)
+    if config.power_extraction == 'local':
+        final_df = PowerExtractor().fill(final_df)
+    elif config.power_extraction == 'check':
+        final_df['power_check'] = PowerExtractor().cross_check(final_df)
+        counts = final_df['power_check'].value_counts()
+        print(f"🔎 Leistungs-Gegenprüfung: {counts.get('ok', 0)} ok, {counts.get('mismatch', 0)} Abweichungen, "
+              f"{counts.get('llm_only', 0)} nur LLM, {counts.get('local_only', 0)} nur lokal")
+    result.final_df = final_df
+
+    if config.output:
+        for path in save_table(final_df, config.output, config.output_format):
+            print(f"💾 Ergebnisse gespeichert: {path}")
+
+    # Power extraction summary
+    if 'power_watts' in final_df.columns and 'total_power_watts' in final_df.columns:
+        pv_modules = final_df[final_df['is_pv_module'] == 1]
+        report_power(len(pv_modules), pv_modules['power_watts'].notna().sum(), pv_modules['total_power_watts'].sum())
+    return result
+
+
+def max_in_flight(config: PipelineConfig) -> int:
+    """Batches read but not yet written in streaming mode (default: two per worker)"""
+    return config.max_in_flight or 2 * max(config.parallel, 1)
+
+
+def run_streaming(config: PipelineConfig, routes, cascade_stages, metrics: MetricsRegistry) -> PipelineResult:
+    """Bounded-memory run: chunked CSV → lazy batches → worker pool → output appended in input order.
+
+    Only `chunk_size` input rows plus at most `max_in_flight` batches are
+    held at once, however large the export is. Rows of a failed batch are
+    written without a label, like in the in-memory run.
+    """
+    if config.dedup:
+        print("⚠️  --dedup braucht die ganze Datei und ist im Streaming-Modus deaktiviert")
+    if config.engine == 'async':
+        print("⚠️  Streaming nutzt Threads, --engine async wird ignoriert")
+    output_path = output_paths(config.output, 'csv')[0] if config.output else None
+    if output_path is not None and config.output_format != 'csv':
+        print(f"⚠️  Streaming schreibt fortlaufend CSV, --output-format {config.output_format} wird ignoriert")
+    processor = CSVProcessor(config.input, config.output)
+    try:
+        chunks = processor.iter_chunks(config.chunk_size, limit=config.limit)
+        first_chunk = next(chunks, None)
+    except Exception as e:
+        raise PipelineError(f"Fehler beim Laden der CSV: {e}") from e
+    if first_chunk is None:
+        raise PipelineError(f"Fehler beim Laden der CSV: {config.input} enthält keine Zeilen")
+    columns = list(first_chunk.columns)
+
+    cache = None
+    if config.cache:
+        cache = ResultCache(config.cache, max_entries=config.cache_max_entries, max_age_days=config.cache_max_age_days)
+        print(f"🗄️  Ergebnis-Cache: {config.cache} ({len(cache)} Einträge)")
+    try:
+        client = build_client(config, routes, cascade_stages, cache, metrics)
+    except Exception as e:
+        raise PipelineError(f"Fehler beim Initialisieren des LLM Clients: {e}") from e
+    result = PipelineResult(config=config, df_input=first_chunk.head(0), final_df=None, client=client, metrics=metrics)
+    journal = open_journal(config, client)
+    rules = RuleClassifier() if config.fast_path else None
+    index = None
+    if config.similar_from:
+        index = SimilarityIndex.from_csv([p.strip() for p in config.similar_from.split(',')])
+
+    # Same columns for every written batch, whatever a single batch happens to contain
+    result_columns = [c for c in RESULT_COLUMNS[1:] if c != 'cascade_stage' or cascade_stages]
+    if config.power_extraction == 'check':
+        result_columns.append('power_check')
+    out_columns = [c for c in columns if c not in result_columns] + result_columns
+    stats = {"rows": 0, "resumed": 0, "pv": 0, "with_power": 0, "total_power": 0.0}
+
+    def classify(batch: List[Dict[str, Any]]) -> pd.DataFrame:
+        results: List[ClassificationResult] = []
+        pending = batch
+        if journal is not None and config.resume:
+            journaled = journal.get_many([str(item['product_id']) for item in pending])
+            results.extend(journaled.values())
+            pending = [item for item in pending if str(item['product_id']) not in journaled]
+        fresh: List[ClassificationResult] = []
+        if rules is not None and pending:
+            rule_results, pending = rules.split(pending)
+            fresh.extend(rule_results)
+            client.usage.add(rows_fast_path=len(rule_results))
+        if cache is not None and pending:
+            cached_results, pending = client.split_cached(pending)
+            fresh.extend(cached_results)
+        if index is not None and pending:
+            similar_results, pending = index.split(pending, threshold=config.similarity_threshold)
+            fresh.extend(similar_results)
+            client.usage.add(rows_similarity=len(similar_results))
+        if pending:
+            try:
+                fresh.extend(client.classify_batch(pending))
+            except Exception as e:
+                print(f"   ❌ Fehler in Batch ({len(pending)} Zeilen): {e}")
+        if journal is not None:
+            journal.append(fresh, 'stream')
+        results.extend(fresh)
+
+        # Row-wise join is cheaper than pd.merge for a single batch
+        by_id: Dict[str, Dict[str, Any]] = {}
+        for res in results:
+            by_id.setdefault(str(res.product_id), res.model_dump(by_alias=True))
+        rows = []
+        for item in batch:
+            answer = by_id.get(str(item['product_id']), {})
+            rows.append({**item, 'product_id': str(item['product_id']),
+                         **{c: answer.get(c) for c in result_columns if c != 'power_check'}})
+        frame = pd.DataFrame(rows, columns=out_columns)
+        frame['is_pv_module'] = frame['is_pv_module'].apply(lambda x: 1 if x is True else 0 if x is False else None)
+        if 'cascade_stage' in frame.columns:
+            frame['cascade_stage'] = frame['cascade_stage'].astype('Int64')
+        if config.power_extraction == 'local':
+            frame = PowerExtractor().fill(frame)
+        elif config.power_extraction == 'check':
+            frame['power_check'] = PowerExtractor().cross_check(frame)
+        frame.attrs['resumed'] = len(results) - len(fresh)
+        return frame
+
+    output = open(output_path, 'w', encoding='utf-8', newline='') if output_path else None
+
+    def write(frame: pd.DataFrame):
+        # Called in input order by the reorder buffer
+        if output is not None:
+            frame.to_csv(output, index=False, sep=';', header=stats["rows"] == 0)
+            output.flush()
+        stats["rows"] += len(frame)
+        stats["resumed"] += frame.attrs.get('resumed', 0)
+        pv_modules = frame[frame['is_pv_module'] == 1]
+        stats["pv"] += len(pv_modules)
+        stats["with_power"] += int(pv_modules['power_watts'].notna().sum())
+        stats["total_power"] += float(pd.to_numeric(pv_modules['total_power_watts'], errors='coerce').sum())
+        print(f"   ✓ {stats['rows']} Zeilen geschrieben")
+
+    def all_chunks():
+        yield first_chunk
+        yield from chunks
+
+    print(f"📦 Starte Streaming-Verarbeitung aus {config.input}...")
+    start_time = time.time()
+    try:
+        result.batches = run_ordered(iter_batches(all_chunks(), config.batch_size), classify, write,
+                                     workers=max(config.parallel, 1), max_in_flight=max_in_flight(config))
+    finally:
+        if output is not None:
+            output.close()
+        if journal is not None:
+            journal.close()
+        if cache is not None:
+            cache.close()
+
+    result.elapsed_seconds = time.time() - start_time
+    report_timing(config, client, metrics, result.elapsed_seconds)
+    result.extra.update(rows=stats["rows"], rows_resumed=stats["resumed"])
+    if config.output:
+        print(f"💾 {stats['rows']} Zeilen gespeichert: {output_path}"
+              + (f" ({stats['resumed']} aus dem Journal)" if stats["resumed"] else ""))
+    report_power(stats["pv"], stats["with_power"], stats["total_power"])
+    return result
+
+
+def load_ground_truth(path) -> pd.DataFrame:
+    """product_id / ground_truth pairs of a labelled export"""
+    truth = load_table(path, usecols=['product_id', 'is_pv_module'], required=['product_id', 'is_pv_module'])
+    return truth[['product_id', 'is_pv_module']].rename(columns={'is_pv_module': 'ground_truth'})
+
+
+def score_predictions(final_df: pd.DataFrame, truth: pd.DataFrame) -> Tuple[Dict[str, Any], pd.DataFrame]:
+    """(metrics, merged rows with pred/truth) of an output against ground truth; empty metrics if no IDs match"""
+    final_df = final_df.assign(product_id=final_df['product_id'].astype(str))
+    merged_eval = pd.merge(final_df, truth, on='product_id', how='inner')
+    if merged_eval.empty:
+        return {}, merged_eval
+    merged_eval = merged_eval.dropna(subset=['is_pv_module', 'ground_truth'])
+    merged_eval['pred'] = merged_eval['is_pv_module'].astype(int)
+    merged_eval['truth'] = merged_eval['ground_truth'].astype(int)
+
+    pred, true = merged_eval['pred'], merged_eval['truth']
+    tp = int(((pred == 1) & (true == 1)).sum())
+    fp = int(((pred == 1) & (true == 0)).sum())
+    fn = int(((pred == 0) & (true == 1)).sum())
+    tn = int(((pred == 0) & (true == 0)).sum())
+    total = len(merged_eval)
+    precision = tp / (tp + fp) * 100 if (tp + fp) > 0 else 0
+    recall = tp / (tp + fn) * 100 if (tp + fn) > 0 else 0
+    return {
+        "total": total,
+        "correct": tp + tn,
+        "accuracy": (tp + tn) / total * 100 if total > 0 else 0,
+        "precision": precision,
+        "recall": recall,
+        "f1": 2 * (precision * recall) / (precision + recall) if (precision + recall) > 0 else 0,
+        "tp": tp, "fp": fp, "fn": fn, "tn": tn,
+    }, merged_eval
+
+
+def truth_path(config: PipelineConfig, df_input: pd.DataFrame) -> Optional[Path]:
+    """--test-file, or the input itself when it carries is_pv_module"""
+    if config.test_file:
+        return Path(config.test_file)
+    if 'is_pv_module' in df_input.columns:
+        return Path(config.input)
+    return None
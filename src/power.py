@@ -0,0 +1,141 @@
+import re
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from .processor import QUANTITY_FIELDS, parse_numbers
+
+PRODUCT_NAME_FIELDS = [
+    "product_name",
+    "supply_product_name",
+    "drafts_supply_product_name",
+]
+NAME_FIELDS = PRODUCT_NAME_FIELDS + [
+    "supply_service_name",
+    "drafts_supply_service_name",
+]
+DESCRIPTION_FIELDS = [
+    "drafts_description",
+    "supply_product_description",
+    "product_text",
+]
+
+# Patterns follow the LEISTUNGSEXTRAKTION rules of SYSTEM_PROMPT and run on casefolded text.
+# Module power 200-600 W: "450W", "445 Wp", "455 Wattpeak"; the lookbehind keeps
+# "1.450 W" or dimension chains like "1762x1134" from matching.
+MODULE_POWER = re.compile(r"(?<![\d.,])([2-5]\d{2}|600)\s*(?:wp|w|watt(?:peak)?)\b")
+# System power: "14,5 kWp", "2.0kWp"
+SYSTEM_KWP = re.compile(r"(?<![\d.,])(\d{1,4}(?:[.,]\d+)?)\s*kwp\b")
+# System power given in Wp with thousands separator: "2.000Wp"
+SYSTEM_WP = re.compile(r"(?<![\d.,])(\d{1,3}(?:\.\d{3})+|\d{4,6})\s*wp\b")
+# Manufacturer codes with the rating after a dash: "TSM-445NEG9R.28", "JW-HD108N-450W"
+PRODUCT_CODE = re.compile(r"\b[a-z]{2,4}\d{0,3}[a-z]?-(?:[a-z0-9]+-)?([2-5]\d{2}|600)(?=[a-z])")
+# Quantity hints: "20x Module", "12 Stk", "15 Stück", "5 pcs" - not "1755×1038mm"
+QUANTITY_HINT = re.compile(r"(?<![\d.,x×])(\d{1,4})\s*(?:(?:x|×)(?!\s*\d)|stk\b|stück|pcs\b)")
+SYSTEM_SET = re.compile(r"balkonkraftwerk|pv-set|solar-?set|mini-solaranlage|steckersolar|pv-anlage|photovoltaikanlage")
+
+_HTML_TAGS = r"<[^>]+>"
+
+
+def _text(df: pd.DataFrame, fields: List[str]) -> pd.Series:
+    """Casefolded, HTML-free concatenation of the given columns"""
+    present = [f for f in fields if f in df.columns]
+    if not present or df.empty:
+        return pd.Series("", index=df.index, dtype="string")
+    text = df[present].astype("string").fillna("").agg(" | ".join, axis=1)
+    return text.str.replace(_HTML_TAGS, " ", regex=True).str.replace("&nbsp;", " ", regex=False).str.casefold()
+
+
+def column_quantity(df: pd.DataFrame) -> pd.Series:
+    """Quantity from the row's own quantity columns, NaN if missing or not positive"""
+    quantity = pd.Series(np.nan, index=df.index)
+    for col in QUANTITY_FIELDS:
+        if col in df.columns:
+            values = df[col]
+            if not pd.api.types.is_numeric_dtype(values):
+                values = parse_numbers(values)
+            quantity = quantity.fillna(values.round().where(values > 0))
+    return quantity
+
+
+class PowerExtractor:
+    """Local, vectorized power/quantity extraction over a whole DataFrame.
+
+    One pass of str.extract per pattern; no per-row Python. Precedence mirrors
+    the prompt: kWp for systems, Wp in the name, Wp in the description, then
+    manufacturer codes.
+    """
+
+    def extract(self, df: pd.DataFrame) -> pd.DataFrame:
+        names = _text(df, NAME_FIELDS)
+        descriptions = _text(df, DESCRIPTION_FIELDS)
+        everything = names + " | " + descriptions
+
+        # Only the product names decide "system": service lines like "16,72 kWp Photovoltaikanlage"
+        # describe the whole installation, not the module on this row
+        is_system = _text(df, PRODUCT_NAME_FIELDS).str.contains(SYSTEM_SET)
+        kwp = parse_numbers(everything.str.extract(SYSTEM_KWP, expand=False)) * 1000
+        system_wp = parse_numbers(everything.str.extract(SYSTEM_WP, expand=False))
+        system_power = kwp.fillna(system_wp)
+        name_power = pd.to_numeric(names.str.extract(MODULE_POWER, expand=False))
+        description_power = pd.to_numeric(descriptions.str.extract(MODULE_POWER, expand=False))
+        code_power = pd.to_numeric(everything.str.extract(PRODUCT_CODE, expand=False))
+
+        conditions = [
+            is_system & system_power.notna(),
+            name_power.notna(),
+            description_power.notna(),
+            code_power.notna(),
+        ]
+        power = np.select(conditions, [system_power, name_power, description_power, code_power], default=np.nan)
+        source = np.select(conditions, ["anlage_kwp", "module_wp", "module_wp", "productcode"], default=None)
+
+        # Quantity: the row's column if > 1, else a text hint; systems are one package
+        quantity = column_quantity(df)
+        text_quantity = pd.to_numeric(everything.str.extract(QUANTITY_HINT, expand=False))
+        quantity = quantity.where(quantity > 1).fillna(text_quantity).fillna(quantity)
+        quantity = quantity.where(source != "anlage_kwp", 1)
+
+        result = pd.DataFrame({
+            "power_watts": pd.array(power.round(), dtype="Int64"),
+            "quantity": pd.array(quantity.round(), dtype="Int64"),
+            "power_source": pd.array(source, dtype="string"),
+        }, index=df.index)
+        total = result["power_watts"] * result["quantity"]
+        result["total_power_watts"] = total.where(result["power_source"] != "anlage_kwp", result["power_watts"])
+        return result[["power_watts", "quantity", "total_power_watts", "power_source"]]
+
+    def fill(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Replace the power fields of rows classified as PV with local extraction"""
+        df = df.copy()
+        positive = df["is_pv_module"] == 1
+        extracted = self.extract(df.loc[positive])
+        for col in extracted.columns:
+            df[col] = df[col].astype("object") if col in df.columns else None
+            df.loc[positive, col] = extracted[col].astype("object")
+            df.loc[~positive, col] = None
+        return df
+
+    def cross_check(self, df: pd.DataFrame) -> pd.Series:
+        """Compare LLM power_watts with local extraction for PV rows.
+
+        Returns a per-row status: ok, mismatch, llm_only, local_only, none
+        (empty for non-PV rows).
+        """
+        status = pd.Series(pd.NA, index=df.index, dtype="string")
+        positive = df["is_pv_module"] == 1
+        if not positive.any():
+            return status
+        local = self.extract(df.loc[positive])["power_watts"].astype("Float64")
+        llm = pd.to_numeric(df.loc[positive, "power_watts"], errors="coerce").astype("Float64")
+        checked = np.select(
+            [llm.notna() & local.notna() & (llm == local),
+             llm.notna() & local.notna(),
+             llm.notna(),
+             local.notna()],
+            ["ok", "mismatch", "llm_only", "local_only"],
+            default="none",
+        )
+        status.loc[positive] = checked
+        return status
@@ -1,54 +1,178 @@
+import re
+import hashlib
 import pandas as pd
-from typing import Generator, List, Dict, Any
+from typing import Generator, List, Dict, Any, Optional
 from pathlib import Path
 
+from .models import ClassificationResult
+from .loader import load_table, iter_table, save_table
+
+# Columns that describe the product itself. Per-document fields (IDs, prices,
+# quantities, timestamps) are left out so identical line items share a signature.
+PRODUCT_FIELDS = [
+    "product_name",
+    "supply_product_name",
+    "drafts_supply_product_name",
+    "supply_service_name",
+    "drafts_supply_service_name",
+    "drafts_description",
+    "supply_product_description",
+    "supply_product_category",
+    "supply_catalog_name",
+    "supply_product_manufacturer",
+    "ean",
+    "product_text",
+]
+
+QUANTITY_FIELDS = ["quantity", "position_item_quantity"]
+# "." groups thousands only next to a decimal comma or before exactly three digits ("1.000")
+_THOUSANDS_DOTS = re.compile(r"^\d{1,3}(\.\d{3})+$")
+
+
+def _german_number(text: str) -> str:
+    """German number string ("14,5", "2.000", "9.5") in Python float syntax"""
+    text = text.strip()
+    if "," in text or _THOUSANDS_DOTS.match(text):
+        return text.replace(".", "").replace(",", ".")
+    return text
+
+
+def parse_numbers(values: pd.Series) -> pd.Series:
+    """Vectorized _german_number + float conversion, NaN where unparseable"""
+    text = values.astype("string").str.strip()
+    grouped = (text.str.contains(",", regex=False) | text.str.match(_THOUSANDS_DOTS.pattern)).fillna(False)
+    text = text.mask(grouped, text.str.replace(".", "", regex=False).str.replace(",", ".", regex=False))
+    return pd.to_numeric(text, errors="coerce").astype(float)
+
+
+def _normalize_value(value: Any) -> str:
+    """Casefold and collapse whitespace so cosmetic differences don't split products"""
+    return re.sub(r"\s+", " ", str(value)).strip().casefold()
+
+
+def product_signature(item: Dict[str, Any]) -> str:
+    """Stable hash over the normalized product fields of a row"""
+    parts = [f"{col}={_normalize_value(item[col])}"
+             for col in PRODUCT_FIELDS
+             if col in item and pd.notnull(item[col]) and str(item[col]).strip()]
+    if not parts:
+        # Nothing descriptive to compare - keep the row on its own
+        parts = [f"product_id={item.get('product_id')}"]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+def row_quantity(item: Dict[str, Any]) -> Optional[int]:
+    """Quantity from the row's own columns (German number format aware)"""
+    for col in QUANTITY_FIELDS:
+        value = item.get(col)
+        if value is None or pd.isnull(value):
+            continue
+        if isinstance(value, str):
+            value = _german_number(value)
+        try:
+            qty = int(round(float(value)))
+        except (TypeError, ValueError):
+            continue
+        if qty > 0:
+            return qty
+    return None
+
+
+def rebase_quantity(result: ClassificationResult,
+                    source_quantity: Optional[int],
+                    target_quantity: Optional[int]) -> ClassificationResult:
+    """Re-apply a result classified for one row to another row of the same product.
+
+    A quantity that equals the source row's quantity column came from that row
+    and is replaced by the target row's own quantity; quantities taken from the
+    product text ("20x Module") are kept. total_power_watts is recomputed.
+    """
+    if result.power_source == "anlage_kwp":
+        quantity = 1
+    else:
+        quantity = result.quantity
+        if source_quantity and source_quantity > 1 and quantity == source_quantity:
+            quantity = None
+        if target_quantity and target_quantity > 1:
+            quantity = target_quantity
+
+    total = None
+    if result.is_pv_module and result.power_watts is not None:
+        total = result.power_watts * quantity if quantity else None
+        if result.power_source == "anlage_kwp":
+            total = result.power_watts
+
+    return result.model_copy(update={"quantity": quantity, "total_power_watts": total})
+
+
 class CSVProcessor:
-    def __init__(self, input_path: str, output_path: str):
+    def __init__(self, input_path: str, output_path: Optional[str] = None):
         self.input_path = Path(input_path)
-        self.output_path = Path(output_path)
+        self.output_path = Path(output_path) if output_path else None
         self.required_columns = ["product_id", "product_name"]
 
     def load_csv(self) -> pd.DataFrame:
         if not self.input_path.exists():
             raise FileNotFoundError(f"Input file not found: {self.input_path}")
         
-        # Try reading with default (comma)
         try:
-            # Check for "Tabelle 1" or similar metadata lines
-            with open(self.input_path, 'r', encoding='utf-8', errors='ignore') as f:
-                first_line = f.readline().strip()
-            
-            skip_rows = 0
-            if "Tabelle" in first_line:
-                skip_rows = 1
-            
-            # Detect separator by reading a few lines
-            df = pd.read_csv(self.input_path, skiprows=skip_rows, sep=None, engine='python')
-            
+            df = load_table(self.input_path)
         except Exception as e:
              raise ValueError(f"Could not read CSV file: {e}")
         
-        # Normalize columns from n8n style if present (Non-destructive)
-        if "supply_product_name" in df.columns and "product_name" not in df.columns:
-            df["product_name"] = df["supply_product_name"]
-            
-        # Ensure we have a valid ID for every row
-        # Some rows (services) have empty product_id but have service_id
-        if "service_id" in df.columns and "product_id" in df.columns:
-            # Fill NaN product_id with service_id
-            df["product_id"] = df["product_id"].fillna(df["service_id"])
-            # Ensure IDs are strings and remove decimal .0 if present (common in pandas float reading)
-            df["product_id"] = df["product_id"].astype(str).str.replace(r'\.0$', '', regex=True)
-            
+        missing = [c for c in self.required_columns if c not in df.columns]
+        if missing:
+            raise ValueError(f"Missing required columns: {', '.join(missing)}")
         return df
 
+    def iter_chunks(self, chunk_size: int = 5000, limit: Optional[int] = None) -> Generator[pd.DataFrame, None, None]:
+        """load_csv in pieces of `chunk_size` rows, so memory does not grow with the file"""
+        if not self.input_path.exists():
+            raise FileNotFoundError(f"Input file not found: {self.input_path}")
+        yield from iter_table(self.input_path, chunk_size, required=self.required_columns, limit=limit)
+
     def create_batches(self, df: pd.DataFrame, batch_size: int = 10) -> Generator[List[Dict[str, Any]], None, None]:
         records = df.to_dict('records')
         for i in range(0, len(records), batch_size):
             yield records[i:i + batch_size]
 
-    def save_results(self, results: List[Dict[str, Any]]):
-        df = pd.DataFrame(results)
-        # Ensure output directory exists
-        self.output_path.parent.mkdir(parents=True, exist_ok=True)
-        df.to_csv(self.output_path, index=False)
+    def signatures(self, df: pd.DataFrame) -> pd.Series:
+        """Product signature per row, aligned to df.index"""
+        return pd.Series([product_signature(item) for item in df.to_dict('records')], index=df.index)
+
+    def deduplicate(self, df: pd.DataFrame, signatures: pd.Series) -> pd.DataFrame:
+        """Keep the first row of every product signature; only these need classifying"""
+        return df.loc[~signatures.duplicated()]
+
+    def fan_out(self, df: pd.DataFrame, signatures: pd.Series,
+                results: List[ClassificationResult]) -> List[Dict[str, Any]]:
+        """Spread representative results to every row sharing their signature.
+
+        Returns one result dict per row of df (in order), or None where the
+        representative got no result. Quantity and total power are recomputed
+        from each row's own quantity column.
+        """
+        by_id = {r.product_id: r for r in results}
+        representatives = {}
+        records = df.to_dict('records')
+        for item, sig in zip(records, signatures):
+            if sig in representatives:
+                continue
+            result = by_id.get(str(item.get("product_id")))
+            representatives[sig] = (result, row_quantity(item)) if result is not None else None
+
+        fanned = []
+        for item, sig in zip(records, signatures):
+            rep = representatives.get(sig)
+            if rep is None:
+                fanned.append(None)
+                continue
+            result, source_quantity = rep
+            result = rebase_quantity(result, source_quantity, row_quantity(item))
+            fanned.append(result.model_copy(update={"product_id": str(item.get("product_id"))})
+                          .model_dump(by_alias=True))
+        return fanned
+
+    def save_results(self, results: List[Dict[str, Any]], output_format: str = "csv") -> List[Path]:
+        """Write results as CSV, Parquet or both (see loader.save_table); returns the written paths"""
+        return save_table(pd.DataFrame(results), self.output_path, output_format)
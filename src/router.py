@@ -0,0 +1,197 @@
+import time
+import random
+from dataclasses import dataclass
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+
+from .llm_client import LLMClient, PRICING
+from .models import ClassificationResult
+
+# Weight of the EWMA update for latency and error rate
+EWMA_ALPHA = 0.3
+# Consecutive failures that take a backend out of rotation, and for how long
+FAILURE_THRESHOLD = 3
+COOLDOWN_SECONDS = 120.0
+
+
+def parse_routes(spec: str) -> List[Tuple[str, str]]:
+    """"openai:gpt-4o-mini,zhipuai:glm-4.5-air" -> [(provider, model), ...]"""
+    routes = []
+    for part in spec.split(","):
+        provider, _, model = part.strip().partition(":")
+        if not model:
+            raise ValueError(f"Route '{part}' muss die Form provider:model haben")
+        routes.append((provider, model))
+    return routes
+
+
+@dataclass
+class Backend:
+    """One provider/model in the rotation with its observed health"""
+    client: LLMClient
+    latency_ewma: Optional[float] = None
+    error_rate: float = 0.0
+    consecutive_failures: int = 0
+    down_until: float = 0.0
+    in_flight: int = 0
+    requests: int = 0
+    rows: int = 0
+    failures: int = 0
+
+    @property
+    def name(self) -> str:
+        return f"{self.client.provider}/{self.client.model}"
+
+    @property
+    def price_per_million(self) -> float:
+        """Input + output USD per 1M tokens, the cost dimension of the score"""
+        pricing = PRICING.get(self.client.model, PRICING["gpt-4o-mini"])
+        return (pricing["input"] + pricing["output"]) * 1_000_000
+
+    @property
+    def cost_usd(self) -> float:
+        return self.client.metrics.counter("cost_usd_total", provider=self.client.provider,
+                                           model=self.client.model)
+
+
+class LLMRouter:
+    """Spreads batches over several LLMClients by latency, error rate and price.
+
+    Each batch goes to a backend drawn with weight 1/score, where the score
+    grows with the backend's latency EWMA, in-flight requests, error rate and
+    PRICING cost. Backends without measurements score best so every backend
+    is probed early. A failing batch fails over to the next backend; after
+    FAILURE_THRESHOLD consecutive failures a backend sits out COOLDOWN_SECONDS.
+
+    All clients share one UsageStats, so the router can stand in for a single
+    client in main.py. Which backend answered is recorded per row in
+    `classified_by`.
+    """
+
+    def __init__(self, clients: List[LLMClient], cost_weight: float = 1.0, seed: Optional[int] = None):
+        if not clients:
+            raise ValueError("Router braucht mindestens einen Backend-Client")
+        self.backends = [Backend(client) for client in clients]
+        self.primary = clients[0]
+        self.usage = self.primary.usage
+        for client in clients[1:]:
+            client.usage = self.usage
+        self.cost_weight = cost_weight
+        self._random = random.Random(seed)
+        self._lock = Lock()
+
+    @property
+    def model(self) -> str:
+        return ", ".join(backend.name for backend in self.backends)
+
+    @property
+    def cache(self):
+        return self.primary.cache
+
+    def split_cached(self, records: List[Dict[str, Any]]) -> tuple:
+        """Cache lookup under each backend's key in turn: a row answered by any backend is a hit"""
+        results, pending = [], list(records)
+        for backend in self.backends:
+            if not pending:
+                break
+            hits, pending = backend.client.split_cached(pending, count=False)
+            results.extend(hits)
+        self.usage.add(cache_hits=len(results), cache_misses=len(pending))
+        return results, pending
+
+    def _score(self, backend: Backend) -> float:
+        latency = backend.latency_ewma if backend.latency_ewma is not None else 0.0
+        error_penalty = 1 / (1 - min(backend.error_rate, 0.9))
+        return (latency * (1 + backend.in_flight) * error_penalty
+                + self.cost_weight * backend.price_per_million + 0.01)
+
+    def _order(self) -> List[Backend]:
+        """Backends for one batch: a weighted draw first, the rest by score as failover"""
+        now = time.time()
+        with self._lock:
+            available = [b for b in self.backends if b.down_until <= now] or list(self.backends)
+            weights = [1 / self._score(b) for b in available]
+            first = self._random.choices(available, weights=weights)[0]
+            rest = sorted((b for b in self.backends if b is not first), key=self._score)
+            first.in_flight += 1
+        return [first] + rest
+
+    def _start(self, backend: Backend, claimed: bool):
+        if not claimed:
+            with self._lock:
+                backend.in_flight += 1
+
+    def _finish(self, backend: Backend, started: float, rows: int, ok: bool):
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            backend.in_flight -= 1
+            backend.requests += 1
+            backend.error_rate = (1 - EWMA_ALPHA) * backend.error_rate + EWMA_ALPHA * (0.0 if ok else 1.0)
+            if ok:
+                backend.rows += rows
+                backend.consecutive_failures = 0
+                backend.latency_ewma = elapsed if backend.latency_ewma is None else \
+                    (1 - EWMA_ALPHA) * backend.latency_ewma + EWMA_ALPHA * elapsed
+            else:
+                backend.failures += 1
+                backend.consecutive_failures += 1
+                if backend.consecutive_failures >= FAILURE_THRESHOLD:
+                    backend.down_until = time.time() + COOLDOWN_SECONDS
+                    print(f"🚧 Backend {backend.name} nach {backend.consecutive_failures} Fehlern "
+                          f"für {COOLDOWN_SECONDS:.0f}s aus der Rotation genommen")
+
+    def classify_batch(self, batch: List[Dict[str, Any]]) -> List[ClassificationResult]:
+        last_error = None
+        for attempt, backend in enumerate(self._order()):
+            self._start(backend, claimed=attempt == 0)
+            started = time.perf_counter()
+            try:
+                results = backend.client.classify_batch(batch)
+            except Exception as e:
+                last_error = e
+                results = None
+            ok = bool(results)
+            self._finish(backend, started, len(batch), ok)
+            if ok:
+                return results
+            print(f"   ↪️  {backend.name} ohne Ergebnis für {len(batch)} Zeilen, Failover...")
+        if last_error is not None:
+            raise last_error
+        return []
+
+    def get_usage_report(self) -> str:
+        report = self.primary.get_usage_report(label=f"Router ({len(self.backends)} Backends)")
+        lines = ["", "╔══════════════════════════════════════════════════════════════╗",
+                 "║  ROUTER BACKENDS                                             ║",
+                 "╠══════════════════════════════════════════════════════════════╣"]
+        for backend in self.backends:
+            latency = f"{backend.latency_ewma:.1f}s" if backend.latency_ewma is not None else "-"
+            lines.append(f"║  {backend.name[:58]:<58}  ║")
+            detail = (f"{backend.requests} Req, {backend.rows} Zeilen, {backend.failures} Fehler, "
+                      f"Ø {latency}, ${backend.cost_usd:.4f}")
+            lines.append(f"║    {detail[:56]:<56}  ║")
+        lines.append("╚══════════════════════════════════════════════════════════════╝")
+        return report + "\n".join(lines)
+
+
+class AsyncLLMRouter(LLMRouter):
+    """Router over AsyncLLMClients for the async engine"""
+
+    async def classify_batch(self, batch: List[Dict[str, Any]]) -> List[ClassificationResult]:
+        last_error = None
+        for attempt, backend in enumerate(self._order()):
+            self._start(backend, claimed=attempt == 0)
+            started = time.perf_counter()
+            try:
+                results = await backend.client.classify_batch(batch)
+            except Exception as e:
+                last_error = e
+                results = None
+            ok = bool(results)
+            self._finish(backend, started, len(batch), ok)
+            if ok:
+                return results
+            print(f"   ↪️  {backend.name} ohne Ergebnis für {len(batch)} Zeilen, Failover...")
+        if last_error is not None:
+            raise last_error
+        return []
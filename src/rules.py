@@ -0,0 +1,129 @@
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from .models import ClassificationResult
+from .processor import row_quantity
+from .power import MODULE_POWER, SYSTEM_KWP as SYSTEM_POWER
+
+# Name fields: the decision is made on these, descriptions only count as PV signal
+NAME_FIELDS = [
+    "product_name",
+    "supply_product_name",
+    "drafts_supply_product_name",
+    "supply_service_name",
+    "drafts_supply_service_name",
+]
+TEXT_FIELDS = NAME_FIELDS + [
+    "drafts_description",
+    "supply_product_description",
+    "supply_product_category",
+    "supply_product_manufacturer",
+    "product_text",
+]
+
+# Same vocabulary as SYSTEM_PROMPT
+_BRANDS = (r"trina|jinko|aiko|ja[\s-]?solar|longi|canadian\s+solar|meyer\s+burger|solar\s*fabrik|"
+           r"solarwatt|q[.\s-]?cells|heckert|luxor|jolywood|astronergy|vitovolt|axitec")
+
+SERVICE = re.compile(r"\b(montage|installation|anmeldung|gerüstbau|geruestbau|lieferung|versand|spedition)")
+ACCESSORY = re.compile(
+    r"(wechselrichter|inverter|speicher|smart[\s-]?meter|\bdtu\b|optimierer|dachhaken|schiene|kabel|"
+    r"stecker|schraube|ballast|unterkonstruktion|klemme|halterung|\bhalter\b|montagesystem)"
+)
+SYSTEM_SET = re.compile(r"(balkonkraftwerk|pv-set|solar-?set|mini-solaranlage|steckersolar)")
+MODULE = re.compile(rf"(modul|panel|\b({_BRANDS})\b)")
+# Anything hinting at photovoltaics; rows without any of it are clear negatives
+PV_SIGNAL = re.compile(
+    rf"(\bpv\b|pv-|photovolt|solar|modul|\d\s*k?wp?\b|wattpeak|balkonkraftwerk|topcon|bifazial|"
+    rf"monokristallin|halfcut|shingled|\bhjt\b|n-type|n-typ|\b({_BRANDS})\b)"
+)
+
+
+def _join(item: Dict[str, Any], fields: List[str]) -> str:
+    return " | ".join(str(item[f]) for f in fields if f in item and pd.notnull(item[f])).casefold()
+
+
+def _head(names: str) -> str:
+    """First word of the product name, the head noun of names like "Dachhaken Ziegel für PV" """
+    match = re.match(r"\W*(\S+)", names)
+    return match.group(1) if match else ""
+
+
+class RuleClassifier:
+    """Deterministic pre-classifier for rows the SYSTEM_PROMPT rules decide unambiguously.
+
+    Returns a result only for high-certainty rows (services and accessories
+    named as such, sets, modules with explicit Wp, rows without any PV
+    signal); everything else is left to the LLM.
+    """
+
+    def classify(self, item: Dict[str, Any]) -> Optional[ClassificationResult]:
+        names = _join(item, NAME_FIELDS)
+        text = _join(item, TEXT_FIELDS)
+        if not names and not text:
+            return None
+
+        if not PV_SIGNAL.search(text):
+            return self._result(item, False, 0.9, "kein PV-Bezug im Text")
+
+        service = SERVICE.search(names)
+        accessory = ACCESSORY.search(names)
+        system_set = SYSTEM_SET.search(names)
+        module_power = MODULE_POWER.search(names)
+
+        # Only a service/accessory that is the product itself, not "Solarmodul ... inkl. Versand"
+        if (service or accessory) and not (system_set or module_power or MODULE.search(names)):
+            head = _head(names)
+            head_service, head_accessory = SERVICE.search(head), ACCESSORY.search(head)
+            if head_service:
+                return self._result(item, False, 0.95, f"Dienstleistung ({head_service.group(1)})")
+            if head_accessory:
+                return self._result(item, False, 0.95, f"Zubehör ({head_accessory.group(1)})")
+        if service or accessory:
+            return None
+
+        if system_set:
+            kwp = SYSTEM_POWER.search(text)
+            watts = int(round(float(kwp.group(1).replace(",", ".")) * 1000)) if kwp else None
+            return self._result(item, True, 0.95, f"Anlage/Set ({system_set.group(1)})",
+                                power_watts=watts, quantity=1, total=watts,
+                                power_source="anlage_kwp" if watts else None)
+
+        if module_power and MODULE.search(names):
+            watts = int(module_power.group(1))
+            quantity = row_quantity(item)
+            return self._result(item, True, 0.95, f"PV-Modul mit {watts} Wp",
+                                power_watts=watts, quantity=quantity,
+                                total=watts * quantity if quantity else None, power_source="module_wp")
+        return None
+
+    def split(self, records: List[Dict[str, Any]]) -> Tuple[List[ClassificationResult], List[Dict[str, Any]]]:
+        """Returns (rule_results, ambiguous_records); only the latter need the LLM"""
+        decided, ambiguous = [], []
+        for item in records:
+            result = self.classify(item)
+            if result is None:
+                ambiguous.append(item)
+            else:
+                decided.append(result)
+        return decided, ambiguous
+
+    @staticmethod
+    def _result(item: Dict[str, Any], is_pv: bool, confidence: float, reason: str,
+                power_watts: Optional[int] = None, quantity: Optional[int] = None,
+                total: Optional[int] = None, power_source: Optional[str] = None) -> ClassificationResult:
+        name = next((str(item[f]) for f in NAME_FIELDS if f in item and pd.notnull(item[f])), "")
+        return ClassificationResult(
+            product_id=str(item.get("product_id")),
+            product_name=name.strip()[:50],
+            is_pv_module=is_pv,
+            Confidence=confidence,
+            Reasoning=f"Regelbasiert: {reason}",
+            power_watts=power_watts,
+            quantity=quantity,
+            total_power_watts=total,
+            power_source=power_source,
+            classified_by="rules",
+        )
@@ -0,0 +1,90 @@
+import re
+import html
+from typing import Any, Dict, Iterable, Optional
+
+import pandas as pd
+
+# Columns worth sending to the LLM. Account/company IDs, prices and timestamps
+# carry no signal for the classification and only cost prompt tokens.
+DEFAULT_COLUMNS = [
+    "product_id",
+    "industry",
+    "measure_name",
+    "quantity",
+    "position_item_quantity",
+    "unit_type",
+    "product_name",
+    "supply_product_name",
+    "drafts_supply_product_name",
+    "supply_service_name",
+    "drafts_supply_service_name",
+    "supply_product_manufacturer",
+    "supply_product_category",
+    "supply_catalog_name",
+    "ean",
+    "drafts_description",
+    "supply_product_description",
+    "product_text",
+]
+
+# Identifier/number columns that are never truncated or merged with others
+_VERBATIM_COLUMNS = {"product_id", "quantity", "position_item_quantity", "ean"}
+
+_BLOCK_TAGS = re.compile(r"<\s*(br|/p|/div|/li|/tr|/h\d)\s*/?\s*>", re.IGNORECASE)
+_TAGS = re.compile(r"<[^>]+>")
+_WHITESPACE = re.compile(r"\s+")
+# Separator used by scripts/prepare_data.py when building product_text
+_SEGMENT_SEPARATOR = " | "
+
+
+def html_to_text(value: str) -> str:
+    """Strip tags and entities, keeping block boundaries as separators"""
+    if "<" not in value and "&" not in value:
+        return value
+    value = _BLOCK_TAGS.sub(" ", value)
+    value = _TAGS.sub(" ", value)
+    return html.unescape(value)
+
+
+class InputShaper:
+    """Reduces a CSV row to the fields and text the classifier actually needs.
+
+    Applies a column allowlist, converts HTML to text, collapses whitespace,
+    drops values (or " | " segments of product_text) already present in an
+    earlier field, and truncates long fields.
+    """
+
+    def __init__(self, columns: Optional[Iterable[str]] = None, max_chars: int = 300):
+        self.columns = list(columns) if columns else list(DEFAULT_COLUMNS)
+        # Results are matched back by product_id, so it is always sent
+        if "product_id" not in self.columns:
+            self.columns.insert(0, "product_id")
+        self.max_chars = max_chars
+
+    def shape(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        shaped = {}
+        seen = []
+        for col in self.columns:
+            value = item.get(col)
+            if value is None or not pd.notnull(value):
+                continue
+            if col in _VERBATIM_COLUMNS:
+                shaped[col] = value
+                continue
+
+            text = _WHITESPACE.sub(" ", html_to_text(str(value))).strip()
+            # Keep only segments not already covered by an earlier field
+            segments = []
+            for segment in text.split(_SEGMENT_SEPARATOR):
+                key = segment.strip().casefold()
+                if key and not any(key in earlier for earlier in seen):
+                    segments.append(segment.strip())
+                    seen.append(key)
+            text = _SEGMENT_SEPARATOR.join(segments)
+            if not text:
+                continue
+
+            if self.max_chars and len(text) > self.max_chars:
+                text = text[:self.max_chars].rstrip() + "…"
+            shaped[col] = text
+        return shaped
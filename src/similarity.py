@@ -0,0 +1,157 @@
+import re
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .models import ClassificationResult
+from .loader import load_table
+from .power import NAME_FIELDS, PowerExtractor
+
+# Hashed feature space; 2048 float32 per indexed row (~8 KB)
+DEFAULT_DIM = 2048
+NGRAM_SIZES = (3, 4)
+# Conservative default: reuse only near-identical names (see scripts/similarity_agreement.py)
+DEFAULT_THRESHOLD = 0.95
+TEXT_FIELDS = NAME_FIELDS + ["supply_product_manufacturer"]
+# Multipliers of the polynomial n-gram hash (odd 64-bit constants, arithmetic wraps mod 2**64)
+_HASH_MULTIPLIERS = np.array([0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9,
+                              0xD6E8FEB86659FD93, 0xFF51AFD7ED558CCD], dtype=np.uint64)
+_HTML_TAGS = re.compile(r"<[^>]+>")
+_SPACES = re.compile(r"\s+")
+# "445W", "445 Wp", "445 Watt" -> "445wp" so unit spelling does not lower the similarity
+_WATT_UNIT = re.compile(r"(\d)\s*(?:wp|w|watt(?:peak)?)\b")
+_QUERY_CHUNK = 1024
+
+
+def similarity_text(item: Dict[str, Any]) -> str:
+    """Casefolded, whitespace-normalized product names and manufacturer of a row"""
+    parts = []
+    for field in TEXT_FIELDS:
+        value = item.get(field)
+        if value is None or pd.isnull(value):
+            continue
+        text = _SPACES.sub(" ", _HTML_TAGS.sub(" ", str(value))).strip().casefold()
+        text = _WATT_UNIT.sub(r"\1wp", text)
+        if text and text not in parts:
+            parts.append(text)
+    return " | ".join(parts)
+
+
+def hash_vectors(texts: Sequence[str], dim: int = DEFAULT_DIM,
+                 ngram_sizes: Iterable[int] = NGRAM_SIZES) -> np.ndarray:
+    """L2-normalized hashed character n-gram counts, one float32 row per text"""
+    vectors = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        if not text:
+            continue
+        codes = np.frombuffer(f" {text} ".encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+        buckets = []
+        for n in ngram_sizes:
+            if len(codes) < n:
+                continue
+            windows = np.lib.stride_tricks.sliding_window_view(codes, n)
+            with np.errstate(over="ignore"):
+                hashes = (windows * _HASH_MULTIPLIERS[:n]).sum(axis=1) + np.uint64(n)
+            buckets.append(hashes % np.uint64(dim))
+        if buckets:
+            vectors[row] = np.bincount(np.concatenate(buckets).astype(np.int64), minlength=dim)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1)
+
+
+class SimilarityIndex:
+    """Nearest-neighbour label reuse over previously classified rows.
+
+    Product names are embedded as hashed character n-gram vectors (no model,
+    no network); cosine similarity is a matrix product. A new row whose
+    nearest neighbour scores at least `threshold` takes over the neighbour's
+    label; its power fields are extracted locally from its own text, never
+    copied, since near-identical names often differ exactly in the Wp rating.
+    """
+
+    def __init__(self, dim: int = DEFAULT_DIM, ngram_sizes: Iterable[int] = NGRAM_SIZES):
+        self.dim = dim
+        self.ngram_sizes = tuple(ngram_sizes)
+        self.vectors = np.zeros((0, dim), dtype=np.float32)
+        self.texts: List[str] = []
+        self.labels: List[Dict[str, Any]] = []
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def vectorize(self, texts: Sequence[str]) -> np.ndarray:
+        return hash_vectors(texts, self.dim, self.ngram_sizes)
+
+    def add(self, items: List[Dict[str, Any]], labels: List[Dict[str, Any]]):
+        """Index rows with their labels (dicts with is_pv_module and Confidence)"""
+        texts = [similarity_text(item) for item in items]
+        keep = [i for i, text in enumerate(texts) if text]
+        self.texts.extend(texts[i] for i in keep)
+        self.labels.extend(labels[i] for i in keep)
+        self.vectors = np.vstack([self.vectors, self.vectorize([texts[i] for i in keep])])
+
+    @classmethod
+    def from_csv(cls, paths: Iterable[str], **kwargs) -> "SimilarityIndex":
+        """Index from earlier outputs (CSV or Parquet, with is_pv_module); only name and label columns are read"""
+        index = cls(**kwargs)
+        for path in paths:
+            df = load_table(path, usecols=[*TEXT_FIELDS, "is_pv_module", "Confidence"])
+            df = df[pd.to_numeric(df["is_pv_module"], errors="coerce").isin([0, 1])]
+            records = df.to_dict("records")
+            labels = [{"is_pv_module": int(float(r["is_pv_module"])) == 1,
+                       "Confidence": float(r["Confidence"]) if pd.notnull(r.get("Confidence")) else 1.0}
+                      for r in records]
+            index.add(records, labels)
+        return index
+
+    def nearest(self, vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(index of the best neighbour, cosine similarity) per query vector"""
+        best = np.full(len(vectors), -1, dtype=np.int64)
+        scores = np.zeros(len(vectors), dtype=np.float32)
+        if not len(self):
+            return best, scores
+        for start in range(0, len(vectors), _QUERY_CHUNK):
+            sims = vectors[start:start + _QUERY_CHUNK] @ self.vectors.T
+            best[start:start + _QUERY_CHUNK] = sims.argmax(axis=1)
+            scores[start:start + _QUERY_CHUNK] = sims.max(axis=1)
+        return best, scores
+
+    def split(self, records: List[Dict[str, Any]],
+              threshold: float = DEFAULT_THRESHOLD) -> Tuple[List[ClassificationResult], List[Dict[str, Any]]]:
+        """Returns (reused_results, pending_records); only pending records need the LLM"""
+        if not records or not len(self):
+            return [], list(records)
+        texts = [similarity_text(item) for item in records]
+        best, scores = self.nearest(self.vectorize(texts))
+        matched = [i for i, text in enumerate(texts) if text and scores[i] >= threshold]
+        matched_set = set(matched)
+        pending = [item for i, item in enumerate(records) if i not in matched_set]
+        if not matched:
+            return [], pending
+
+        df = pd.DataFrame([records[i] for i in matched])
+        df["is_pv_module"] = [int(self.labels[best[i]]["is_pv_module"]) for i in matched]
+        power = PowerExtractor().fill(df)
+
+        reused = []
+        for pos, i in enumerate(matched):
+            label = self.labels[best[i]]
+            row = power.iloc[pos]
+            reused.append(ClassificationResult(
+                product_id=str(records[i].get("product_id")),
+                product_name=texts[i][:50],
+                is_pv_module=label["is_pv_module"],
+                Confidence=round(min(label["Confidence"], float(scores[i])), 4),
+                Reasoning=f"Ähnlich zu '{self.texts[best[i]][:40]}' ({scores[i]:.2f})",
+                power_watts=_optional_int(row.get("power_watts")),
+                quantity=_optional_int(row.get("quantity")),
+                total_power_watts=_optional_int(row.get("total_power_watts")),
+                power_source=row.get("power_source") if pd.notnull(row.get("power_source")) else None,
+                classified_by="similarity",
+            ))
+        return reused, pending
+
+
+def _optional_int(value) -> Optional[int]:
+    return None if value is None or pd.isnull(value) else int(value)
@@ -0,0 +1,99 @@
+import re
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+
+class ResultArrayParser:
+    """Incremental parser for the result array of a streamed JSON response.
+
+    Fed with text fragments, it returns every object of `{"<key>": [...]}`
+    as soon as its closing brace arrives. Objects cut off by truncation are
+    never returned.
+    """
+
+    def __init__(self, key: str):
+        self._array_start = re.compile(rf'"{re.escape(key)}"\s*:\s*\[')
+        self.buffer = ""
+        self.pos: Optional[int] = None
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.object_start: Optional[int] = None
+        self.closed = False
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        self.buffer += text
+        if self.pos is None:
+            match = self._array_start.search(self.buffer)
+            if not match:
+                return []
+            self.pos = match.end()
+
+        objects = []
+        buf = self.buffer
+        i = self.pos
+        while i < len(buf) and not self.closed:
+            ch = buf[i]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+            elif ch in "{[":
+                if self.depth == 0 and ch == "{":
+                    self.object_start = i
+                self.depth += 1
+            elif ch in "}]":
+                if self.depth == 0:
+                    # Closing bracket of the result array itself
+                    self.closed = True
+                else:
+                    self.depth -= 1
+                    if self.depth == 0 and self.object_start is not None:
+                        try:
+                            objects.append(json.loads(buf[self.object_start:i + 1]))
+                        except json.JSONDecodeError:
+                            pass
+                        self.object_start = None
+            i += 1
+        self.pos = i
+        return objects
+
+
+class StreamCollector:
+    """Accumulates chat-completion stream chunks: content, finish reason and usage"""
+
+    def __init__(self, key: str):
+        self.parser = ResultArrayParser(key)
+        self.finish_reason: Optional[str] = None
+        self.usage = None
+        self.first_content_at: Optional[float] = None
+
+    def add(self, chunk) -> List[Dict[str, Any]]:
+        """Returns the result objects completed by this chunk"""
+        if getattr(chunk, "usage", None) is not None:
+            self.usage = chunk.usage
+        objects = []
+        for choice in getattr(chunk, "choices", None) or []:
+            content = getattr(choice.delta, "content", None)
+            if content:
+                if self.first_content_at is None:
+                    self.first_content_at = time.perf_counter()
+                objects.extend(self.parser.feed(content))
+            if choice.finish_reason:
+                self.finish_reason = choice.finish_reason
+        return objects
+
+    @property
+    def content(self) -> str:
+        return self.parser.buffer
+
+    @property
+    def truncated(self) -> bool:
+        """The model stopped (token limit or dropped stream) before closing the array"""
+        return self.finish_reason == "length" or (self.parser.pos is not None and not self.parser.closed)
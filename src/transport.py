@@ -0,0 +1,120 @@
+import time
+import importlib.util
+from dataclasses import dataclass
+from typing import Optional
+
+from .metrics import MetricsRegistry
+
+# httpcore trace events that mark the end of waiting for a pooled connection:
+# either a new connection starts, or a reused one starts sending
+_CONNECTION_ACQUIRED = ("connection.connect_tcp.started", "http11.send_request_headers.started",
+                        "http2.send_request_headers.started")
+
+
+@dataclass
+class TransportConfig:
+    """HTTP transport for the SDK clients: pool limits, keep-alive, HTTP/2 and per-phase timeouts"""
+    max_connections: int = 20
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 90.0
+    http2: bool = False
+    connect_timeout: float = 10.0
+    # GPT-5 reasoning models can take many minutes for a large batch
+    read_timeout: float = 1200.0
+    write_timeout: float = 30.0
+    pool_timeout: float = 120.0
+
+    @classmethod
+    def for_concurrency(cls, concurrency: int, hedged: bool = False, **overrides) -> "TransportConfig":
+        """Pool sized to the worker count, with headroom for bisect halves and follow-up requests.
+
+        hedged=True doubles the count: every worker may have a primary and a hedge request in flight.
+        """
+        if hedged:
+            concurrency *= 2
+        size = max(concurrency + max(2, concurrency // 4), 4)
+        config = cls(max_connections=size, max_keepalive_connections=size)
+        for name, value in overrides.items():
+            if value is not None:
+                setattr(config, name, value)
+        return config
+
+    def http2_available(self) -> bool:
+        return importlib.util.find_spec("h2") is not None
+
+    def _httpx_options(self):
+        import httpx
+
+        http2 = self.http2 and self.http2_available()
+        if self.http2 and not http2:
+            print("⚠️  HTTP/2 angefordert, aber 'h2' nicht installiert (pip install 'httpx[http2]') - nutze HTTP/1.1")
+        limits = httpx.Limits(max_connections=self.max_connections,
+                              max_keepalive_connections=self.max_keepalive_connections,
+                              keepalive_expiry=self.keepalive_expiry)
+        return {"limits": limits, "timeout": self.timeout(), "http2": http2}
+
+    def timeout(self):
+        import httpx
+
+        return httpx.Timeout(connect=self.connect_timeout, read=self.read_timeout,
+                             write=self.write_timeout, pool=self.pool_timeout)
+
+    def sync_client(self, metrics: Optional[MetricsRegistry] = None, **labels):
+        from openai import DefaultHttpxClient
+
+        hooks = {"request": [_sync_tracer(metrics, labels)]} if metrics is not None else None
+        return DefaultHttpxClient(event_hooks=hooks, **self._httpx_options())
+
+    def async_client(self, metrics: Optional[MetricsRegistry] = None, **labels):
+        from openai import DefaultAsyncHttpxClient
+
+        hooks = {"request": [_async_tracer(metrics, labels)]} if metrics is not None else None
+        return DefaultAsyncHttpxClient(event_hooks=hooks, **self._httpx_options())
+
+    def describe(self) -> str:
+        protocol = "HTTP/2" if self.http2 and self.http2_available() else "HTTP/1.1"
+        return (f"{protocol}, Pool {self.max_connections} (keep-alive {self.max_keepalive_connections}, "
+                f"{self.keepalive_expiry:.0f}s), Timeouts connect {self.connect_timeout:.0f}s / "
+                f"read {self.read_timeout:.0f}s")
+
+
+class _ConnectionTrace:
+    """Turns httpcore trace events of one request into pool-wait and connect metrics"""
+
+    def __init__(self, metrics: MetricsRegistry, labels: dict):
+        self.metrics = metrics
+        self.labels = labels
+        self.started = time.perf_counter()
+        self.acquired = False
+        self.connect_started: Optional[float] = None
+
+    def event(self, name: str):
+        now = time.perf_counter()
+        if not self.acquired and name in _CONNECTION_ACQUIRED:
+            self.acquired = True
+            self.metrics.observe("pool_wait_seconds", now - self.started, **self.labels)
+        if name == "connection.connect_tcp.started":
+            self.connect_started = now
+            self.metrics.inc("connections_opened_total", **self.labels)
+        elif name in ("http11.send_request_headers.started", "http2.send_request_headers.started") \
+                and self.connect_started is not None:
+            # TCP + TLS handshake of a new connection
+            self.metrics.observe("connect_seconds", now - self.connect_started, **self.labels)
+            self.connect_started = None
+
+
+def _sync_tracer(metrics: MetricsRegistry, labels: dict):
+    def on_request(request):
+        trace = _ConnectionTrace(metrics, labels)
+        request.extensions["trace"] = lambda name, info: trace.event(name)
+    return on_request
+
+
+def _async_tracer(metrics: MetricsRegistry, labels: dict):
+    async def on_request(request):
+        trace = _ConnectionTrace(metrics, labels)
+
+        async def record(name, info):
+            trace.event(name)
+        request.extensions["trace"] = record
+    return on_request
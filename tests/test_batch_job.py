@@ -0,0 +1,44 @@
+import json
+
+import pytest
+
+from src.llm_client import LLMClient
+from src.batch_job import BatchJobRunner, LocalBatchBackend
+
+
+def test_local_batch_job_round_trip(tmp_path):
+    client = LLMClient(api_key="test", output_schema="compact")
+    runner = BatchJobRunner(client, LocalBatchBackend(str(tmp_path / "local")), work_dir=str(tmp_path))
+    batches = [[{"product_id": "M1", "product_name": "Trina Vertex S+ Modul 445Wp"},
+                {"product_id": "K1", "product_name": "Solarkabel 6mm²"}],
+               [{"product_id": "S1", "product_name": "Montage und Installation"}]]
+
+    state = runner.submit(batches)
+    with open(state["request_file"]) as f:
+        requests = [json.loads(line) for line in f]
+    assert [r["custom_id"] for r in requests] == ["batch-00001", "batch-00002"]
+    # A second submit before the job is consumed resumes the persisted job
+    assert runner.submit(batches)["job_id"] == state["job_id"]
+
+    results = runner.collect(state, runner.wait(state), [item for batch in batches for item in batch])
+
+    by_id = {r.product_id: r for r in results}
+    assert by_id["M1"].is_pv_module is True and by_id["M1"].power_watts == 445
+    assert by_id["K1"].is_pv_module is False and by_id["S1"].is_pv_module is False
+    assert client.usage.batches_processed == 2
+    assert runner.submit(batches)["job_id"] != state["job_id"]
+
+
+def test_batch_job_resume_needs_same_input_and_drops_dead_jobs(tmp_path):
+    client = LLMClient(api_key="test", output_schema="compact")
+    runner = BatchJobRunner(client, LocalBatchBackend(str(tmp_path / "local")), work_dir=str(tmp_path))
+    batches = [[{"product_id": "M1", "product_name": "Trina Vertex S+ Modul 445Wp"}]]
+
+    state = runner.submit(batches)
+    # Another input must not pick up the pending job
+    other = runner.submit([[{"product_id": "K1", "product_name": "Solarkabel 6mm²"}]])
+    assert other["job_id"] != state["job_id"]
+
+    with pytest.raises(RuntimeError, match="expired"):
+        runner.collect(other, {"status": "expired", "output_file_id": None}, [])
+    assert runner.submit(batches)["job_id"] != other["job_id"]
@@ -0,0 +1,31 @@
+import json
+
+import pandas as pd
+
+from src.benchmark import BenchmarkSpec, run_benchmark, summarize, compare, write_report
+
+
+def test_grid_runs_in_process_and_reports_structured_results(tmp_path):
+    input_file = tmp_path / "input.csv"
+    pd.DataFrame({
+        "product_id": [str(i) for i in range(12)],
+        "product_name": ["Aiko Neostar 450 Wp Modul", "Montage der PV-Anlage", "Dachhaken Edelstahl"] * 4,
+        "is_pv_module": [1, 0, 0] * 4,
+    }).to_csv(input_file, index=False, sep=';')
+    spec = BenchmarkSpec(input=str(input_file), warmup=1, repeats=2,
+                         base={"mode": "batch-job", "batch_backend": "local", "poll_interval": 0,
+                               "batch_dir": str(tmp_path / "jobs")},
+                         grid={"batch_size": [4, 12]})
+
+    records = run_benchmark(spec)
+
+    assert [(r["batch_size"], r["repeat"]) for r in records] == [(4, 1), (4, 2), (12, 1), (12, 2)]
+    assert all(r["error"] is None and r["rows_answered"] == 12 and r["f1"] == 100.0 for r in records)
+    summary = summarize(records)
+    assert [row["runs"] for row in summary] == [2, 2] and summary[0]["rows_per_second"] > 0
+
+    report = write_report(tmp_path / "bench", spec, records, summary)
+    assert json.loads((tmp_path / "bench.json").read_text())["summary"] == summary
+    assert report["environment"]["python"]
+    slower = [{**row, "rows_per_second": row["rows_per_second"] * 2} for row in summary]
+    assert all(d["regression"] for d in compare(summary, slower))
@@ -0,0 +1,58 @@
+from src.cache import ResultCache
+from src.llm_client import LLMClient
+from src.models import ClassificationResult
+
+
+def _result(product_id, quantity=None, total=None):
+    return ClassificationResult(
+        product_id=product_id,
+        product_name="Trina Vertex S+ 445W",
+        is_pv_module=True,
+        Confidence=0.95,
+        Reasoning="Modul mit Wp-Angabe",
+        power_watts=445,
+        quantity=quantity,
+        total_power_watts=total,
+        power_source="module_wp",
+    )
+
+
+def test_cache_roundtrip_and_eviction(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache.sqlite"), max_entries=2)
+    cache.put_many([
+        ("a", _result("1"), None),
+        ("b", _result("2"), 10),
+        ("c", _result("3"), None),
+    ])
+    found = cache.get_many(["a", "b", "missing"])
+    assert found["b"][0].power_watts == 445
+    assert found["b"][1] == 10
+    assert "missing" not in found
+
+    cache.evict()
+    assert len(cache) == 2
+    cache.close()
+
+
+def test_split_cached_rebases_quantity(tmp_path, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    cache = ResultCache(str(tmp_path / "cache.sqlite"))
+    client = LLMClient(cache=cache)
+
+    source = {"product_id": "A", "supply_product_name": "Trina Vertex S+ 445W", "quantity": 10}
+    client._store_in_cache([source], [_result("A", quantity=10, total=4450)])
+
+    rows = [
+        # Same product text on another document with its own quantity
+        {"product_id": "B", "supply_product_name": "  trina vertex s+ 445W ", "quantity": "20"},
+        {"product_id": "C", "supply_product_name": "Dachhaken", "quantity": 4},
+    ]
+    cached, pending = client.split_cached(rows)
+
+    assert [r.product_id for r in cached] == ["B"]
+    assert cached[0].quantity == 20
+    assert cached[0].total_power_watts == 8900
+    assert [r["product_id"] for r in pending] == ["C"]
+    assert client.usage.cache_hits == 1
+    assert client.usage.cache_misses == 1
+    cache.close()
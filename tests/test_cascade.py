@@ -0,0 +1,58 @@
+from src.cascade import ModelCascade
+from src.llm_client import UsageStats
+from src.models import ClassificationResult
+
+
+class FakeStageClient:
+    def __init__(self, model, answers, fail=False):
+        self.provider = "openai"
+        self.model = model
+        self.answers = answers
+        self.fail = fail
+        self.usage = UsageStats()
+        self.seen = []
+
+    def classify_batch(self, batch):
+        self.seen.append([item["product_id"] for item in batch])
+        if self.fail:
+            raise Exception("500 Internal Server Error")
+        self.usage.add(total_cost_usd=0.001 * len(batch), rows_processed=len(batch))
+        return [ClassificationResult(product_id=item["product_id"], product_name=item["product_name"],
+                                     classified_by=self.model, **self.answers[item["product_id"]]) for item in batch]
+
+
+BATCH = [
+    {"product_id": "1", "product_name": "Trina Vertex S+ 445W", "position_item_quantity": 10},
+    {"product_id": "2", "product_name": "Montageschiene 2m"},
+    {"product_id": "3", "product_name": "Aiko Neostar 450 Wp", "position_item_quantity": 2},
+]
+
+
+def test_cascade_escalates_uncertain_and_inconsistent_rows():
+    cheap = FakeStageClient("gpt-4o-mini", {
+        "1": dict(is_pv_module=True, Confidence=0.95, Reasoning="Modul", power_watts=445, quantity=10,
+                  total_power_watts=4450),
+        "2": dict(is_pv_module=True, Confidence=0.6, Reasoning="Unsicher"),
+        # power_watts contradicts the 450 Wp in the name
+        "3": dict(is_pv_module=True, Confidence=0.99, Reasoning="Modul", power_watts=405, quantity=2,
+                  total_power_watts=810),
+    })
+    strong = FakeStageClient("gpt-5.2", {
+        "2": dict(is_pv_module=False, Confidence=0.99, Reasoning="Zubehör"),
+        "3": dict(is_pv_module=True, Confidence=0.99, Reasoning="Modul", power_watts=450, quantity=2,
+                  total_power_watts=900),
+    })
+    cascade = ModelCascade([cheap, strong], threshold=0.9)
+
+    results = {r.product_id: r for r in cascade.classify_batch(BATCH)}
+
+    assert strong.seen == [["2", "3"]]
+    assert [(results[pid].cascade_stage, results[pid].classified_by) for pid in "123"] == \
+        [(1, "gpt-4o-mini"), (2, "gpt-5.2"), (2, "gpt-5.2")]
+    assert results["2"].is_pv_module is False and results["3"].total_power_watts == 900
+    assert [stage.rows for stage in cascade.stages] == [3, 2]
+
+    # A failing stronger stage keeps the cheap answers
+    cascade = ModelCascade([cheap, FakeStageClient("gpt-5.2", {}, fail=True)], threshold=0.9)
+    results = {r.product_id: r for r in cascade.classify_batch(BATCH)}
+    assert results["2"].confidence == 0.6 and results["2"].cascade_stage == 1
@@ -0,0 +1,36 @@
+import time
+import threading
+
+import pandas as pd
+
+from src.chunked import iter_batches, run_ordered
+
+
+def test_batches_span_chunks_and_results_are_written_in_input_order():
+    chunks = (pd.DataFrame({"product_id": range(start, min(start + 7, 23))}) for start in range(0, 23, 7))
+    batches = list(iter_batches(chunks, batch_size=5))
+    assert [len(b) for b in batches] == [5, 5, 5, 5, 3]
+    assert [item["product_id"] for b in batches for item in b] == list(range(23))
+
+    lock, state, written = threading.Lock(), {"in_flight": 0, "peak": 0}, []
+
+    def produce():
+        for i in range(40):
+            with lock:
+                state["in_flight"] += 1
+                state["peak"] = max(state["peak"], state["in_flight"])
+            yield i
+
+    def work(i):
+        # Later items finish first
+        time.sleep(0.002 * (i % 4 == 0))
+        return i * 10
+
+    def emit(value):
+        written.append(value)
+        with lock:
+            state["in_flight"] -= 1
+
+    assert run_ordered(produce(), work, emit, workers=4, max_in_flight=6) == 40
+    assert written == [i * 10 for i in range(40)]
+    assert state["peak"] <= 6
@@ -0,0 +1,48 @@
+import pandas as pd
+import pytest
+
+from src.journal import ResultJournal
+from src.models import ClassificationResult
+from src.pipeline import PipelineConfig, PipelineError, JOURNAL_DEFAULT, run_pipeline
+
+
+def test_resume_skips_journaled_rows_and_merges_from_journal(tmp_path):
+    input_file, output_file = tmp_path / "input.csv", tmp_path / "output.csv"
+    pd.DataFrame({
+        "product_id": [str(i) for i in range(8)],
+        "product_name": ["Aiko Neostar 450 Wp Modul", "Montage der PV-Anlage"] * 4,
+    }).to_csv(input_file, index=False, sep=';')
+    config = PipelineConfig(input=str(input_file), output=str(output_file), batch_size=2, mode="batch-job",
+                            batch_backend="local", batch_dir=str(tmp_path / "jobs"), poll_interval=0)
+
+    # A run that died after committing the first two batches
+    journal = ResultJournal(f"{output_file}.journal.sqlite", run_info={"input": str(input_file)})
+    for start in (0, 2):
+        journal.append([ClassificationResult(product_id=str(i), product_name="x", is_pv_module=i % 2 == 0, Confidence=0.9,
+                                             Reasoning="aus Journal") for i in (start, start + 1)])
+    journal.close()
+
+    result = run_pipeline(PipelineConfig(**{**config.__dict__, "resume": True}))
+
+    assert result.client.usage.rows_processed == 4
+    out = pd.read_csv(output_file, sep=';', dtype={"product_id": str}).set_index("product_id")
+    assert out["is_pv_module"].tolist() == [1, 0] * 4
+    assert (out.loc[["0", "1", "2", "3"], "Reasoning"] == "aus Journal").all()
+    assert (out.loc[["4", "5", "6", "7"], "Reasoning"] != "aus Journal").all()
+    assert len(ResultJournal(f"{output_file}.journal.sqlite", resume=True)) == 8
+
+
+def test_resume_refuses_journal_of_other_run(tmp_path):
+    input_file, output_file = tmp_path / "input.csv", tmp_path / "output.csv"
+    pd.DataFrame({"product_id": ["1"], "product_name": ["Montage"]}).to_csv(input_file, index=False, sep=';')
+    ResultJournal(f"{output_file}.journal.sqlite", run_info={"model": "glm-4-plus"}).close()
+    config = PipelineConfig(input=str(input_file), output=str(output_file), resume=True, mode="batch-job",
+                            batch_backend="local", batch_dir=str(tmp_path / "jobs"), poll_interval=0)
+
+    with pytest.raises(PipelineError, match="model"):
+        run_pipeline(config)
+
+    # A fresh run keeps the old journal aside
+    run_pipeline(PipelineConfig(**{**config.__dict__, "resume": False, "journal": JOURNAL_DEFAULT}))
+    assert (tmp_path / "output.csv.journal.sqlite.prev").exists()
+    assert len(ResultJournal(f"{output_file}.journal.sqlite", resume=True)) == 1
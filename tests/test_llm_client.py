@@ -0,0 +1,295 @@
+import json
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from src.llm_client import LLMClient, AsyncLLMClient
+
+
+def _response(results):
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=json.dumps({"results": results})))],
+        usage=SimpleNamespace(prompt_tokens=100, completion_tokens=20, total_tokens=120),
+    )
+
+
+def _result(product_id, is_pv=False):
+    return {
+        "product_id": product_id,
+        "product_name": "Produkt",
+        "is_pv_module": is_pv,
+        "Confidence": 0.9,
+        "Reasoning": "Test",
+    }
+
+
+class FakeCompletions:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+class FakeAsyncCompletions(FakeCompletions):
+    async def create(self, **kwargs):
+        return FakeCompletions.create(self, **kwargs)
+
+
+def _fake_client(completions):
+    return SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+
+def test_classify_batch_parses_and_tracks_usage(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    client = LLMClient()
+    completions = FakeCompletions([_response([_result("1", True), _result("2")])])
+    client.client = _fake_client(completions)
+
+    results = client.classify_batch([{"product_id": "1", "product_name": "Modul 445W"},
+                                     {"product_id": "2", "product_name": "Kabel"}])
+
+    assert [r.product_id for r in results] == ["1", "2"]
+    assert results[0].is_pv_module is True
+    assert client.usage.prompt_tokens == 100
+    assert client.usage.rows_processed == 2
+    assert "Modul 445W" in completions.calls[0]["messages"][1]["content"]
+
+
+def test_async_client_classifies_batches_concurrently(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    client = AsyncLLMClient()
+    client.client = _fake_client(FakeAsyncCompletions([_response([_result("1")]), _response([_result("2")])]))
+
+    async def run():
+        return await asyncio.gather(client.classify_batch([{"product_id": "1", "product_name": "A"}]),
+                                    client.classify_batch([{"product_id": "2", "product_name": "B"}]))
+
+    first, second = asyncio.run(run())
+    assert first[0].product_id == "1"
+    assert second[0].product_id == "2"
+    assert client.usage.batches_processed == 2
+
+
+def test_rate_limiter_budgets_requests_and_headers():
+    from src.llm_client import RateLimiter, _rate_limit_delay
+
+    limiter = RateLimiter(rpm=2, tpm=1000)
+    assert limiter._reserve(400) == 0
+    assert limiter._reserve(400) == 0
+    # Request bucket is empty: the third call has to wait
+    assert limiter._reserve(100) > 0
+
+    limiter.update_from_headers({"x-ratelimit-limit-tokens": "500", "x-ratelimit-remaining-tokens": "0",
+                                 "x-ratelimit-reset-tokens": "6m0s"})
+    assert limiter.tpm == 500
+    assert limiter.blocked_until > 0
+
+    error = Exception("rate limited")
+    error.status_code = 429
+    error.response = SimpleNamespace(status_code=429, headers={"retry-after": "7"})
+    assert _rate_limit_delay(error) == 7
+    assert _rate_limit_delay(ValueError("other")) is None
+
+
+def test_rate_limit_retries_do_not_consume_normal_retries(monkeypatch):
+    from src.llm_client import RateLimiter
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setattr("src.llm_client.time.sleep", lambda s: None)
+    limiter = RateLimiter(rpm=1000, tpm=1_000_000)
+    monkeypatch.setattr(limiter, "acquire", lambda tokens: None)
+    client = LLMClient(rate_limiter=limiter)
+
+    error = Exception("429")
+    error.status_code = 429
+    error.response = SimpleNamespace(status_code=429, headers={"retry-after-ms": "50"})
+    responses = [error, error, error, _response([_result("1")])]
+    client.client = _fake_client(FakeCompletions(responses))
+
+    results = client.classify_batch([{"product_id": "1", "product_name": "A"}])
+    assert results[0].product_id == "1"
+    assert client.usage.rate_limited == 3
+    assert limiter.effective_rpm < 1000
+    retries = [c for c in client.metrics.summary()["counters"] if c["name"] == "retries_total"]
+    assert retries[0]["labels"]["reason"] == "429" and retries[0]["value"] == 3
+    assert client.metrics.histogram_summary("request_latency_seconds", batch_size=1)["count"] == 1
+
+
+def test_bisect_isolates_poisoned_row(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setattr("src.llm_client.time.sleep", lambda s: None)
+    client = LLMClient(failure_mode="bisect")
+
+    class PoisonedCompletions:
+        def create(self, **kwargs):
+            prompt = kwargs["messages"][1]["content"]
+            if "POISON" in prompt:
+                raise ValueError("context length exceeded")
+            ids = [line.split("product_id: ")[1].split(",")[0] for line in prompt.splitlines() if "product_id" in line]
+            return _response([_result(i) for i in ids])
+
+    client.client = _fake_client(PoisonedCompletions())
+    batch = [{"product_id": str(i), "product_name": "POISON" if i == 2 else f"P{i}"} for i in range(4)]
+
+    results = client.classify_batch(batch)
+
+    assert sorted(r.product_id for r in results) == ["0", "1", "3"]
+    assert client.usage.rows_failed == 1
+    assert client.usage.batches_bisected == 2
+
+
+def test_missing_rows_are_requested_again(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    client = LLMClient()
+    # First answer drops row 2 and invents an unknown ID; the follow-up only contains row 2
+    completions = FakeCompletions([
+        _response([_result("1"), _result("99")]),
+        _response([_result("2")]),
+    ])
+    client.client = _fake_client(completions)
+
+    results = client.classify_batch([{"product_id": "1", "product_name": "A"},
+                                     {"product_id": "2", "product_name": "B"}])
+
+    assert sorted(r.product_id for r in results) == ["1", "2"]
+    assert "product_id: 1" not in completions.calls[1]["messages"][1]["content"]
+    assert client.usage.rows_rerequested == 1
+    assert client.usage.rows_unanswered == 0
+
+
+def test_compact_schema_maps_aliases_back(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    client = LLMClient(output_schema="compact")
+    content = json.dumps({"r": [{"i": 2, "pv": 1, "c": 0.97, "w": 445, "q": 10, "t": 4450, "s": "module_wp"},
+                                {"i": 1, "pv": 0, "c": 0.99}]})
+    response = SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+                               usage=SimpleNamespace(prompt_tokens=50, completion_tokens=10, total_tokens=60))
+    completions = FakeCompletions([response])
+    client.client = _fake_client(completions)
+
+    results = client.classify_batch([{"product_id": "K1", "product_name": "Kabel"},
+                                     {"product_id": "M1", "product_name": "Trina 445W"}])
+
+    prompt = completions.calls[0]["messages"][1]["content"]
+    assert "[1] product_name: Kabel" in prompt and "K1" not in prompt
+    by_id = {r.product_id: r for r in results}
+    assert by_id["M1"].is_pv_module is True
+    assert by_id["M1"].total_power_watts == 4450
+    assert by_id["K1"].product_name == "Kabel"
+    assert by_id["K1"].reasoning == ""
+
+
+def test_prefix_cache_accounting_and_stable_prefix(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    client = LLMClient(few_shot=True)
+    response = _response([_result("1")])
+    response.usage.prompt_tokens = 1000
+    response.usage.prompt_tokens_details = SimpleNamespace(cached_tokens=800)
+    completions = FakeCompletions([response, _response([_result("2")])])
+    client.client = _fake_client(completions)
+
+    client.classify_batch([{"product_id": "1", "product_name": "A"}])
+    client.classify_batch([{"product_id": "2", "product_name": "B"}])
+
+    first, second = (call["messages"] for call in completions.calls)
+    # Everything but the final batch message is byte-identical
+    assert first[:-1] == second[:-1] and len(first) == 4
+    assert client.usage.cached_prompt_tokens == 800
+    assert abs(client.usage.prefix_cache_savings_usd - 800 * 0.075 / 1_000_000) < 1e-12
+    assert "PROMPT PREFIX CACHE" in client.get_usage_report()
+
+
+def _chunk(content=None, finish_reason=None, usage=None):
+    choices = [] if content is None and finish_reason is None else [
+        SimpleNamespace(delta=SimpleNamespace(content=content), finish_reason=finish_reason)]
+    return SimpleNamespace(choices=choices, usage=usage)
+
+
+def test_streaming_keeps_finished_rows_on_truncation(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    emitted = []
+    client = LLMClient(stream=True, on_result=emitted.append)
+    first = json.dumps({"results": [_result("1", True), _result("2")]})
+    # Cut off inside the second object, as at max_completion_tokens
+    truncated = [_chunk(first[:40]), _chunk(first[40:-60]), _chunk(finish_reason="length"),
+                 _chunk(usage=SimpleNamespace(prompt_tokens=100, completion_tokens=50, total_tokens=150))]
+    follow_up = [_chunk(json.dumps({"results": [_result("2")]})), _chunk(finish_reason="stop")]
+    completions = FakeCompletions([truncated, follow_up])
+    client.client = _fake_client(completions)
+
+    results = client.classify_batch([{"product_id": "1", "product_name": "Modul"},
+                                     {"product_id": "2", "product_name": "Kabel"}])
+
+    assert [r.product_id for r in emitted] == ["1", "2"]
+    assert sorted(r.product_id for r in results) == ["1", "2"]
+    assert "product_id: 1" not in completions.calls[1]["messages"][-1]["content"]
+    assert completions.calls[0]["stream"] is True
+    assert client.usage.responses_truncated == 1
+    assert client.usage.rows_salvaged == 1
+    assert client.usage.streamed_batches == 2
+
+
+def test_slow_request_is_hedged(monkeypatch):
+    import time as _time
+    from src.llm_client import RateLimiter
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    client = LLMClient(hedge_percentile=0.95, rate_limiter=RateLimiter(rpm=10_000, tpm=10_000_000))
+    for _ in range(5):
+        client.metrics.observe("request_latency_seconds", 0.05, provider="openai", model="gpt-4o-mini")
+
+    class SlowThenFast:
+        def __init__(self):
+            self.calls = 0
+
+        def create(self, **kwargs):
+            self.calls += 1
+            if self.calls == 1:
+                _time.sleep(0.5)
+            return _response([_result("1")])
+
+    completions = SlowThenFast()
+    client.client = _fake_client(completions)
+
+    results = client.classify_batch([{"product_id": "1", "product_name": "A"}])
+    client._hedge_pool.shutdown(wait=True)
+
+    assert results[0].product_id == "1"
+    assert completions.calls == 2
+    assert client.usage.hedges_fired == 1 and client.usage.hedges_won == 1
+    assert client.usage.batches_processed == 1
+    assert client.usage.hedge_cost_usd > 0
+
+
+def test_cancelled_async_hedge_is_booked_in_metrics(monkeypatch):
+    from src.llm_client import RateLimiter
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    client = AsyncLLMClient(hedge_percentile=0.95, rate_limiter=RateLimiter(rpm=10_000, tpm=10_000_000))
+    for _ in range(5):
+        client.metrics.observe("request_latency_seconds", 0.05, provider="openai", model="gpt-4o-mini")
+
+    class SlowThenFast:
+        def __init__(self):
+            self.calls = 0
+
+        async def create(self, **kwargs):
+            self.calls += 1
+            if self.calls == 1:
+                await asyncio.sleep(0.5)
+            return _response([_result("1")])
+
+    client.client = _fake_client(SlowThenFast())
+
+    results = asyncio.run(client.classify_batch([{"product_id": "1", "product_name": "A"}]))
+
+    assert results[0].product_id == "1"
+    assert client.usage.hedges_fired == 1 and client.usage.hedge_cost_usd > 0
+    assert client.metrics.counter("cost_usd_total") == pytest.approx(client.usage.total_cost_usd)
@@ -0,0 +1,29 @@
+from threading import Thread
+
+from src.metrics import MetricsRegistry
+
+
+def test_counters_histograms_and_export(tmp_path):
+    metrics = MetricsRegistry()
+
+    def work():
+        for i in range(1000):
+            metrics.inc("requests_total", model="m")
+            metrics.observe("request_latency_seconds", (i % 100) / 10, model="m", batch_size=10)
+
+    threads = [Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    summary = metrics.histogram_summary("request_latency_seconds", model="m")
+    assert summary["count"] == 4000
+    assert summary["p50"] == 4.9 and summary["p99"] == 9.8
+
+    prom = metrics.to_prometheus()
+    assert 'pv_classifier_requests_total{model="m"} 4000' in prom
+    assert 'pv_classifier_request_latency_seconds_bucket{batch_size="10",model="m",le="+Inf"} 4000' in prom
+
+    metrics.write(str(tmp_path / "metrics"))
+    assert (tmp_path / "metrics.json").exists() and (tmp_path / "metrics.prom").exists()
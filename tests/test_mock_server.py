@@ -0,0 +1,29 @@
+import json
+import urllib.error
+import urllib.request
+
+from src.llm_client import LLMClient
+from src.mock_server import MockServerConfig, serve
+
+
+def test_client_classifies_against_mock_server_and_failures_are_injected():
+    httpd, state = serve(MockServerConfig(latency_median=0.0, latency_sigma=0.0), port=0)
+    base_url = "http://127.0.0.1:%d/v1" % httpd.server_address[1]
+    try:
+        client = LLMClient(base_url=base_url)
+        results = client.classify_batch([{"product_id": "1", "product_name": "Aiko Neostar 450 Wp Modul"},
+                                         {"product_id": "2", "product_name": "Montage der PV-Anlage"}])
+        assert {r.product_id: r.is_pv_module for r in results} == {"1": True, "2": False}
+        assert client.usage.prompt_tokens > 0 and state.stats["completed"] == 1
+
+        state.config.error_5xx = 1.0
+        request = urllib.request.Request(f"{base_url}/chat/completions", method="POST",
+                                         data=json.dumps(client._build_request([{"product_id": "3"}])).encode())
+        try:
+            urllib.request.urlopen(request)
+            raise AssertionError("expected an injected server error")
+        except urllib.error.HTTPError as e:
+            assert e.code in (500, 502, 503)
+        assert state.stats["server_errors"] == 1
+    finally:
+        httpd.shutdown()
@@ -0,0 +1,57 @@
+import pandas as pd
+
+from src.power import PowerExtractor, column_quantity
+from src.processor import row_quantity
+
+
+def _frame():
+    return pd.DataFrame({
+        "product_id": ["1", "2", "3", "4", "5", "6"],
+        "supply_product_name": [
+            "Trina Vertex S+ 445Wp",
+            "Balkonkraftwerk 2,0 kWp",
+            "Glas-Glas Modul 1755×1038mm",
+            "20x Module Jinko Tiger Neo",
+            "Trina TSM-445NEG9R.28",
+            "Dachhaken Edelstahl",
+        ],
+        "drafts_description": [None, None, "<p>Leistung: 450 W</p>", "<b>455 Wattpeak</b>", None, None],
+        "quantity": ["10", "1", "1", None, "12,0", "40"],
+    })
+
+
+def test_extract_power_quantity_and_total():
+    extracted = PowerExtractor().extract(_frame())
+
+    assert extracted["power_watts"].tolist()[:5] == [445, 2000, 450, 455, 445]
+    assert extracted["power_source"].tolist()[:5] == ["module_wp", "anlage_kwp", "module_wp", "module_wp", "productcode"]
+    # "20x" is a quantity hint, "1755×1038mm" is not
+    assert extracted["quantity"].tolist()[:5] == [10, 1, 1, 20, 12]
+    assert extracted["total_power_watts"].tolist()[:5] == [4450, 2000, 450, 9100, 5340]
+    assert pd.isna(extracted.loc[5, "power_watts"])
+
+
+def test_fill_and_cross_check_only_touch_pv_rows():
+    df = _frame()
+    df["is_pv_module"] = [1, 1, 1, 1, 1, 0]
+    df["power_watts"] = [445, 14500, None, 455, 445, 999]
+
+    status = PowerExtractor().cross_check(df)
+    assert status.tolist()[:5] == ["ok", "mismatch", "local_only", "ok", "ok"]
+    assert pd.isna(status[5])
+
+    filled = PowerExtractor().fill(df)
+    assert filled.loc[1, "power_watts"] == 2000
+    assert filled.loc[3, "total_power_watts"] == 9100
+    assert filled.loc[5, "power_watts"] is None
+
+
+def test_decimal_points_and_thousands_separators():
+    df = pd.DataFrame({"supply_product_name": ["PV-Anlage 9.5 kWp komplett", "PV-Anlage 9,5 kWp komplett",
+                                               "Photovoltaikanlage 2.000 Wp"]})
+    assert PowerExtractor().extract(df)["power_watts"].tolist() == [9500, 9500, 2000]
+
+    # Vectorized and per-row quantity parsing agree
+    values = ["2.0", "7,04", "1.5", "1.000"]
+    assert column_quantity(pd.DataFrame({"quantity": values})).tolist() == [2, 7, 2, 1000]
+    assert [row_quantity({"quantity": v}) for v in values] == [2, 7, 2, 1000]
@@ -1,5 +1,6 @@
 import pytest
 from src.processor import CSVProcessor
+from src.loader import load_table
 import pandas as pd
 
 def test_load_csv_validation(tmp_path):
@@ -27,3 +28,84 @@ def test_create_batches():
     assert len(batches[1]) == 10
     assert len(batches[2]) == 5
     assert batches[0][0]['product_id'] == 0
+
+def test_deduplicate_and_fan_out():
+    from src.models import ClassificationResult
+    df = pd.DataFrame([
+        {'product_id': 'A', 'supply_product_name': 'Trina 445W Modul', 'quantity': 10},
+        {'product_id': 'B', 'supply_product_name': 'Dachhaken', 'quantity': 40},
+        {'product_id': 'C', 'supply_product_name': 'trina 445w  modul', 'quantity': 20},
+    ])
+    processor = CSVProcessor("dummy", "dummy")
+    signatures = processor.signatures(df)
+    unique = processor.deduplicate(df, signatures)
+    assert list(unique['product_id']) == ['A', 'B']
+
+    result = ClassificationResult(product_id='A', product_name='Trina', is_pv_module=True, Confidence=0.9,
+                                  Reasoning='Modul', power_watts=445, quantity=10, total_power_watts=4450,
+                                  power_source='module_wp')
+    fanned = processor.fan_out(df, signatures, [result])
+
+    assert fanned[1] is None
+    assert fanned[2]['product_id'] == 'C'
+    assert fanned[2]['quantity'] == 20
+    assert fanned[2]['total_power_watts'] == 8900
+
+def test_load_csv_sniffs_layout(tmp_path):
+    p = tmp_path / "export.csv"
+    p.write_text("Tabelle 1\n"
+                 "product_id,service_id,supply_product_name,ean\n"
+                 "0042,,Trina 445W Modul,04012345678901\n"
+                 ",271093,Montage,\n")
+
+    df = CSVProcessor(str(p)).load_csv()
+
+    assert list(df['product_id']) == ['0042', '271093']
+    assert df['ean'][0] == '04012345678901'
+    assert df['product_name'][1] == 'Montage'
+
+SAVED_RESULTS = [
+    {'product_id': '1', 'is_pv_module': 1, 'power_watts': 445, 'total_power_watts': 4450},
+    {'product_id': '2', 'is_pv_module': 0, 'power_watts': None, 'total_power_watts': None},
+]
+
+
+def test_save_results_csv(tmp_path, monkeypatch):
+    processor = CSVProcessor("dummy", str(tmp_path / "out.parquet"))
+
+    paths = processor.save_results(SAVED_RESULTS)
+
+    assert paths == [tmp_path / "out.csv"]
+    # Nullable ints: no "445.0" in the CSV
+    assert (tmp_path / "out.csv").read_text().splitlines()[1:] == ["1;1;445;4450", "2;0;;"]
+    df = load_table(tmp_path / "out.csv", usecols=['product_id', 'power_watts'])
+    assert df['product_id'].tolist() == ['1', '2']
+    with pytest.raises(ValueError, match="Unknown output format"):
+        processor.save_results(SAVED_RESULTS, output_format="xlsx")
+
+    monkeypatch.setattr("src.loader.pyarrow_available", lambda: False)
+    with pytest.raises(ImportError, match="pyarrow"):
+        processor.save_results(SAVED_RESULTS, output_format="both")
+    assert not (tmp_path / "out.parquet").exists()
+
+
+def test_save_results_parquet(tmp_path):
+    pytest.importorskip("pyarrow")
+    processor = CSVProcessor("dummy", str(tmp_path / "out.csv"))
+
+    paths = processor.save_results(SAVED_RESULTS, output_format="both")
+
+    assert paths == [tmp_path / "out.csv", tmp_path / "out.parquet"]
+    df = load_table(tmp_path / "out.parquet", usecols=['product_id', 'power_watts'])
+    assert list(df.columns) == ['product_id', 'power_watts']
+    assert str(df['power_watts'].dtype) == 'Int64'
+    assert df['power_watts'].isna().tolist() == [False, True]
+
+
+def test_row_quantity_number_formats():
+    from src.processor import row_quantity
+    assert row_quantity({'quantity': '2.0'}) == 2
+    assert row_quantity({'quantity': '1.5'}) == 2
+    assert row_quantity({'quantity': '1.000'}) == 1000
+    assert row_quantity({'quantity': '1.234,5'}) == 1234
+    assert row_quantity({'quantity': '12,0'}) == 12
@@ -0,0 +1,61 @@
+from src.llm_client import UsageStats
+from src.metrics import MetricsRegistry
+from src.models import ClassificationResult
+from src.router import LLMRouter, FAILURE_THRESHOLD, parse_routes
+
+
+class FakeBackendClient:
+    def __init__(self, provider, model, fail=False):
+        self.provider = provider
+        self.model = model
+        self.fail = fail
+        self.usage = UsageStats()
+        self.metrics = MetricsRegistry()
+        self.calls = 0
+
+    def classify_batch(self, batch):
+        self.calls += 1
+        if self.fail:
+            raise Exception("503 Service Unavailable")
+        self.metrics.inc("cost_usd_total", 0.01, provider=self.provider, model=self.model)
+        return [ClassificationResult(product_id=str(item["product_id"]), product_name="Produkt", is_pv_module=False,
+                                     Confidence=0.9, Reasoning="Test", classified_by=self.model) for item in batch]
+
+
+def test_router_fails_over_and_benches_failing_backend():
+    assert parse_routes("openai:gpt-4o-mini, zhipuai:glm-4.5-air") == [("openai", "gpt-4o-mini"),
+                                                                       ("zhipuai", "glm-4.5-air")]
+    broken = FakeBackendClient("openai", "gpt-4o-mini", fail=True)
+    healthy = FakeBackendClient("zhipuai", "glm-4.5-air")
+    router = LLMRouter([broken, healthy], cost_weight=0.0, seed=1)
+    assert healthy.usage is router.usage
+
+    for num in range(20):
+        results = router.classify_batch([{"product_id": num}])
+        assert [r.classified_by for r in results] == ["glm-4.5-air"]
+
+    # The broken backend is out of rotation after FAILURE_THRESHOLD consecutive failures
+    assert broken.calls == FAILURE_THRESHOLD
+    assert healthy.calls == 20
+    stats = router.backends[1]
+    assert stats.rows == 20 and stats.failures == 0 and round(stats.cost_usd, 4) == 0.2
+
+
+def test_router_cache_finds_rows_stored_by_any_backend(tmp_path, monkeypatch):
+    from src.cache import ResultCache
+    from src.llm_client import LLMClient
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    cache = ResultCache(str(tmp_path / "cache.sqlite"))
+    primary, secondary = LLMClient(model="gpt-4o-mini", cache=cache), LLMClient(model="gpt-4o", cache=cache)
+    router = LLMRouter([primary, secondary])
+    rows = [{"product_id": "A", "supply_product_name": "Dachhaken"}, {"product_id": "B", "supply_product_name": "Kabel"}]
+    secondary._store_in_cache(rows[:1], [ClassificationResult(product_id="A", product_name="Dachhaken",
+                                                              is_pv_module=False, Confidence=0.9, Reasoning="Test")])
+
+    cached, pending = router.split_cached(rows)
+
+    assert [r.product_id for r in cached] == ["A"]
+    assert [r["product_id"] for r in pending] == ["B"]
+    assert (router.usage.cache_hits, router.usage.cache_misses) == (1, 1)
+    cache.close()
@@ -0,0 +1,37 @@
+from src.rules import RuleClassifier
+
+
+def test_rules_decide_obvious_rows():
+    rules = RuleClassifier()
+
+    service = rules.classify({"product_id": "1", "supply_product_name": "Gerüstbau Einfamilienhaus"})
+    assert service.is_pv_module is False
+    assert service.classified_by == "rules"
+    assert service.reasoning.startswith("Regelbasiert")
+
+    accessory = rules.classify({"product_id": "2", "supply_product_name": "Dachhaken Ziegel für PV"})
+    assert accessory.is_pv_module is False
+
+    module = rules.classify({"product_id": "3", "supply_product_name": "Trina TSM-445NEG9R.28 445Wp", "quantity": 20})
+    assert module.is_pv_module is True
+    assert (module.power_watts, module.quantity, module.total_power_watts) == (445, 20, 8900)
+    assert module.power_source == "module_wp"
+
+    kit = rules.classify({"product_id": "4", "supply_product_name": "Balkonkraftwerk 2,0 kWp"})
+    assert kit.is_pv_module is True
+    assert (kit.power_watts, kit.quantity, kit.power_source) == (2000, 1, "anlage_kwp")
+
+    unrelated = rules.classify({"product_id": "5", "supply_product_name": "Thermostatkopf weiß"})
+    assert unrelated.is_pv_module is False
+
+
+def test_rules_leave_ambiguous_rows_to_llm():
+    rules = RuleClassifier()
+    # Module with an explicit service in the name, and PV wording without a concrete product
+    assert rules.classify({"product_id": "1", "supply_product_name": "PV Module 440 Wp (inkl. Montage)"}) is None
+    assert rules.classify({"product_id": "2", "supply_product_name": "Teil einer PV-Anlage"}) is None
+    assert rules.classify({"product_id": "3", "supply_product_name": "Balkonkraftwerk mit Speicher"}) is None
+    # A service or accessory term that is not the head noun
+    assert rules.classify({"product_id": "4", "supply_product_name": "Solarmodul Jinko inkl. Versand"}) is None
+    assert rules.classify({"product_id": "5", "supply_product_name": "Jinko Tiger Neo mit Kabel"}) is None
+    assert rules.classify({"product_id": "6", "supply_product_name": "Tiger Neo 440W"}) is None
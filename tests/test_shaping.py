@@ -0,0 +1,31 @@
+from src.shaping import InputShaper, html_to_text
+
+
+def test_html_to_text():
+    assert html_to_text("<p>Trina 450W</p><p>- Modulleistung: 450Wp&nbsp;</p>").split() == \
+        ["Trina", "450W", "-", "Modulleistung:", "450Wp"]
+
+
+def test_shape_row():
+    row = {
+        "account_id": "0013V00000irocuQAA",
+        "net_price_per_unit": 77,
+        "product_id": "GNkWvNHa0AA",
+        "quantity": 52,
+        "supply_product_name": "Photovoltaikmodul",
+        "drafts_supply_product_name": "Photovoltaikmodul",
+        "drafts_description": "<p>Trina Vertex S+ 450W</p><p>- Modulleistung: 450Wp</p><p>- Doppelglas   </p>",
+        "product_text": "Photovoltaikmodul | Photovoltaikmodul",
+    }
+
+    shaped = InputShaper(max_chars=40).shape(row)
+
+    assert "account_id" not in shaped and "net_price_per_unit" not in shaped
+    assert shaped["product_id"] == "GNkWvNHa0AA"
+    assert shaped["quantity"] == 52
+    assert shaped["supply_product_name"] == "Photovoltaikmodul"
+    # Duplicates of earlier fields are removed
+    assert "drafts_supply_product_name" not in shaped
+    assert "product_text" not in shaped
+    assert shaped["drafts_description"].startswith("Trina Vertex S+ 450W - Modulleistung")
+    assert len(shaped["drafts_description"]) <= 41
@@ -0,0 +1,22 @@
+from src.similarity import SimilarityIndex, similarity_text
+
+
+def test_near_duplicate_reuses_label_and_extracts_own_power():
+    index = SimilarityIndex()
+    index.add([{"product_name": "Trina Vertex S+ 445W Full Black"}, {"product_name": "Montageschiene Alu 2,4m"}],
+              [{"is_pv_module": True, "Confidence": 0.98}, {"is_pv_module": False, "Confidence": 0.99}])
+    assert similarity_text({"product_name": "Trina  Vertex S+ 445 Wp"}) == "trina vertex s+ 445wp"
+
+    records = [
+        {"product_id": "1", "product_name": "Trina Vertex S+ 450 Wp Full Black", "position_item_quantity": 20},
+        {"product_id": "2", "product_name": "Montageschiene Alu 2,4 m"},
+        {"product_id": "3", "product_name": "Fronius Symo 10.0-3-M Wechselrichter"},
+    ]
+    reused, pending = index.split(records, threshold=0.8)
+
+    assert [item["product_id"] for item in pending] == ["3"]
+    by_id = {r.product_id: r for r in reused}
+    # Label from the neighbour, power from the row's own name
+    assert by_id["1"].is_pv_module and by_id["1"].power_watts == 450 and by_id["1"].total_power_watts == 9000
+    assert not by_id["2"].is_pv_module and by_id["2"].power_watts is None
+    assert {r.classified_by for r in reused} == {"similarity"}
@@ -0,0 +1,16 @@
+from src.streaming import ResultArrayParser
+
+
+def test_parser_emits_objects_as_they_close():
+    parser = ResultArrayParser("results")
+    text = '{"results": [{"product_id": "1", "Reasoning": "Text mit } und \\" drin"}, {"product_id": "2", "x": [1]}, {"product_id": "3"'
+
+    emitted = []
+    for i in range(0, len(text), 7):
+        emitted.extend(parser.feed(text[i:i + 7]))
+
+    assert [o["product_id"] for o in emitted] == ["1", "2"]
+    assert emitted[0]["Reasoning"] == 'Text mit } und " drin'
+    assert not parser.closed
+    assert parser.feed("}]}") == [{"product_id": "3"}]
+    assert parser.closed
@@ -0,0 +1,22 @@
+from src.metrics import MetricsRegistry
+from src.transport import TransportConfig, _ConnectionTrace
+
+
+def test_pool_sized_from_concurrency_and_trace_metrics():
+    config = TransportConfig.for_concurrency(20, http2=True, read_timeout=None)
+    assert config.max_connections == 25 and config.max_keepalive_connections == 25
+    assert config.http2 is True and config.read_timeout == 1200.0
+    # Room for a hedge next to every primary request
+    assert TransportConfig.for_concurrency(20, hedged=True).max_connections == 50
+
+    metrics = MetricsRegistry()
+    new_connection = _ConnectionTrace(metrics, {"model": "m"})
+    for event in ("connection.connect_tcp.started", "connection.connect_tcp.complete",
+                  "connection.start_tls.started", "http11.send_request_headers.started"):
+        new_connection.event(event)
+    reused = _ConnectionTrace(metrics, {"model": "m"})
+    reused.event("http11.send_request_headers.started")
+
+    assert metrics.histogram_summary("pool_wait_seconds")["count"] == 2
+    assert metrics.histogram_summary("connect_seconds")["count"] == 1
+    assert 'pv_classifier_connections_opened_total{model="m"} 1' in metrics.to_prometheus()